@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Throughput and agreement of the CPU embedding backends against the fp32 torch baseline.
+
+Chunks of a synthetic codebase are embedded with each backend (src.embeddings.load_embedding_model,
+cache off): the load time, documents/s through embed_documents_bucketed and the single-query latency
+are reported, together with how closely the vectors follow fp32 torch: the mean and minimum cosine
+similarity of each chunk's vector to its baseline vector, and the overlap of the top-k chunks each
+query retrieves (the part that decides whether retrieval quality holds).
+
+    python benchmarks/embedding_backends.py --backends torch torch-int8 onnx onnx-int8 --threads 8
+    python benchmarks/embedding_backends.py --backends torch torch-int8 --workers 8
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.pipeline import NL_QUERIES, benchmark_config
+from benchmarks.synthetic_codebase import generate_codebase
+from user_interface.config import config
+
+
+def chunk_texts(count: int, seed: int) -> list:
+    from src.convert import iter_documents, iter_source_files
+    from src.splitter import iter_split_records
+    generate_codebase(config.DEFAULT_CODEBASE_PATH, max(count // 4, 20), seed=seed)
+    documents = iter_documents(iter_source_files(config.DEFAULT_CODEBASE_PATH))
+    texts = []
+    for records, _, _ in iter_split_records(documents, config.CHUNK_SIZE, config.CHUNK_OVERLAP, True, workers=1):
+        texts.extend(text for text, _ in records)
+    random.Random(seed).shuffle(texts)
+    return texts[:count]
+
+
+def run_backend(backend: str, threads: int, workers: int, texts: list, queries: list) -> dict:
+    from src.embeddings import EmbeddingPool, embed_documents_bucketed, load_embedding_model
+    start = time.perf_counter()
+    if workers > 1:
+        embeddings = EmbeddingPool(workers, backend, threads=threads, suppress_output=True)
+    else:
+        embeddings = load_embedding_model(backend, threads=threads, suppress_output=True)
+    # The warm-up starts the pool's workers, so their model loads count as load time.
+    embeddings.embed_documents(texts[:8 * workers])
+    embeddings.embed_query(queries[0])
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = embed_documents_bucketed(embeddings, texts)
+    embed_seconds = time.perf_counter() - start
+
+    query_vectors = []
+    start = time.perf_counter()
+    for query in queries:
+        query_vectors.append(embeddings.embed_query(query))
+    query_seconds = (time.perf_counter() - start) / len(queries)
+    if workers > 1:
+        embeddings.close()
+    return {"load_seconds": load_seconds, "docs_per_s": len(texts) / embed_seconds,
+            "query_ms": query_seconds * 1000, "vectors": vectors, "query_vectors": query_vectors}
+
+
+def agreement(result: dict, baseline: dict, k: int) -> dict:
+    import numpy as np
+
+    def normalized(vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    docs, base_docs = normalized(result["vectors"]), normalized(baseline["vectors"])
+    cosine = (docs * base_docs).sum(axis=1)
+    top = np.argsort(-normalized(result["query_vectors"]) @ docs.T, axis=1)[:, :k]
+    base_top = np.argsort(-normalized(baseline["query_vectors"]) @ base_docs.T, axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(top.tolist(), base_top.tolist())]
+    return {"cosine_mean": float(cosine.mean()), "cosine_min": float(cosine.min()),
+            "topk_overlap": float(np.mean(overlap))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends with the fp32 torch baseline.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8"],
+                        help="Backends to compare; torch (fp32) is always run first as the baseline.")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of chunks to embed.")
+    parser.add_argument("--queries", type=int, default=100, help="Number of queries for latency and top-k overlap.")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Intra-op threads per backend (default EMBEDDING_THREADS).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Embedding worker processes per backend (1 = in-process); the baseline uses the same.")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours compared per query.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic codebase.")
+    parser.add_argument("--workdir", default=None, help="Parent directory for the temporary files.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    # The model locations come from the user's config; everything else from the benchmark config.
+    model_path, onnx_path = config.EMBEDDING_MODEL_PATH, config.EMBEDDING_ONNX_PATH
+    threads = config.EMBEDDING_THREADS if args.threads is None else args.threads
+    workdir = tempfile.mkdtemp(prefix="codebaserag_embed_", dir=args.workdir)
+    try:
+        bench_config = benchmark_config(workdir, "memory", embedding_cache=False)
+        bench_config.EMBEDDING_MODEL_PATH = model_path
+        bench_config.EMBEDDING_ONNX_PATH = onnx_path
+        config._set(bench_config)
+        texts = chunk_texts(args.texts, args.seed)
+        rng = random.Random(args.seed)
+        queries = [f"{rng.choice(NL_QUERIES)} ({i})" for i in range(args.queries)]
+        print(f"Embedding {len(texts)} chunks and {len(queries)} queries on {os.cpu_count()} CPUs "
+              f"({args.workers} worker(s), {threads or 'default'} threads).")
+
+        backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+        results = {}
+        print(f"{'backend':>10s} {'load s':>7s} {'docs/s':>8s} {'speedup':>8s} {'query ms':>9s} "
+              f"{'cos mean':>9s} {'cos min':>8s} {'top-k':>6s}")
+        for backend in backends:
+            result = run_backend(backend, threads, args.workers, texts, queries)
+            baseline = results.get("torch", result)
+            result.update(agreement(result, baseline, args.k))
+            result["speedup"] = result["docs_per_s"] / baseline["docs_per_s"]
+            results[backend] = result
+            print(f"{backend:>10s} {result['load_seconds']:7.1f} {result['docs_per_s']:8.1f} "
+                  f"{result['speedup']:7.2f}x {result['query_ms']:9.1f} {result['cosine_mean']:9.4f} "
+                  f"{result['cosine_min']:8.4f} {result['topk_overlap']:6.0%}")
+
+        if args.output:
+            summary = {backend: {key: value for key, value in result.items() if "vectors" not in key}
+                       for backend, result in results.items()}
+            with open(args.output, "w") as f:
+                json.dump({"texts": len(texts), "queries": len(queries), "threads": threads,
+                           "workers": args.workers, "k": args.k,
+                           "results": summary}, f, indent=2)
+            print(f"Results written to {args.output}.")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmark on synthetic codebases.
+
+For each size, a synthetic codebase is generated and pushed through the staged pipeline
+(convert_files_to_txt, load_documents, split_documents), then embedded and upserted into an embedded
+Qdrant (memory or local mode), and finally queried through QueryEngine with a fake LLM. Every stage
+records its wall time, throughput and the process's peak RSS so far. Results are written as JSON and
+can be compared against a stored baseline; a stage slower than the baseline by more than the
+threshold fails the run.
+
+    python benchmarks/pipeline.py --files 1000 10000 --output results.json
+    python benchmarks/pipeline.py --files 1000 --baseline baseline.json --threshold 0.2
+    python benchmarks/pipeline.py --files 1000 --save-baseline baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_codebase import generate_codebase
+from user_interface.config import AppConfig, config
+
+COLLECTION_NAME = "benchmark"
+EMBEDDING_DIM = 768  # all-mpnet-base-v2
+NL_QUERIES = ("how are records merged into the store", "where is the query cache configured",
+              "what parses a token stream", "how does batch scoring work")
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far (Linux/macOS), or the current RSS elsewhere.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in KiB on Linux and in bytes on macOS.
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class StageTimer:
+    """Collects {stage: seconds, items, items_per_s, peak_rss_mb} records."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, unit: str):
+        record = {"unit": unit, "items": 0}
+        start = time.perf_counter()
+        yield record
+        record["seconds"] = time.perf_counter() - start
+        record["items_per_s"] = record["items"] / record["seconds"] if record["seconds"] > 0 else 0.0
+        record["peak_rss_mb"] = peak_rss_mb()
+        self.stages[name] = record
+        print(f"  {name:10s} {record['seconds']:8.2f}s  {record['items']:8d} {unit:7s} "
+              f"{record['items_per_s']:10.1f}/s  peak RSS {record['peak_rss_mb']:.0f} MB")
+
+    def add(self, name: str, unit: str, seconds: float, items: int):
+        self.stages[name] = {"unit": unit, "items": items, "seconds": seconds,
+                             "items_per_s": items / seconds if seconds > 0 else 0.0, "peak_rss_mb": peak_rss_mb()}
+        print(f"  {name:10s} {seconds:8.2f}s  {items:8d} {unit:7s} {self.stages[name]['items_per_s']:10.1f}/s  "
+              f"peak RSS {self.stages[name]['peak_rss_mb']:.0f} MB")
+
+
+def benchmark_config(workdir: str, qdrant_mode: str, embedding_cache: bool, split_workers: int = 1) -> AppConfig:
+    """
+    A self-contained configuration rooted in workdir, so no config.ini is needed.
+    """
+    bench_config = AppConfig(
+        DEFAULT_CODEBASE_PATH=os.path.join(workdir, "codebase"),
+        DEFAULT_COLLECTION_NAME=COLLECTION_NAME,
+        DEFAULT_LLM_MODEL="fake",
+        DEFAULT_QDRANT_STORAGE_FOLDER=os.path.join(workdir, "qdrant_storage"),
+        QDRANT_MODE=qdrant_mode,
+        EMBEDDING_CACHE_ENABLED=embedding_cache,
+        QUERY_CACHE_DISK=False,
+        SPLIT_WORKERS=split_workers,
+    )
+    bench_config.compute_optional()
+    return bench_config
+
+
+def make_embeddings(kind: str):
+    if kind == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=EMBEDDING_DIM)
+    from src.embeddings import get_embeddings
+    return get_embeddings(suppress_output=True)
+
+
+def query_set(chunks_store: str, count: int, seed: int = 0) -> list:
+    """
+    Half identifier queries (names defined in the first chunks of the store), half natural-language queries.
+    """
+    from src.chunk_store import ChunkStore
+    from src.splitter import source_language
+    from src.symbol_index import extract_symbols
+    rng = random.Random(seed)
+    names = []
+    with ChunkStore(chunks_store) as store:
+        for i in range(min(len(store), 500)):
+            doc = store.document(i)
+            names += [name for name in extract_symbols(doc.page_content, source_language(doc.metadata["source"]))
+                      if "_" in name]
+    queries = []
+    for i in range(count):
+        if i % 2 == 0 and names:
+            queries.append(f"what does `{rng.choice(names)}` do")
+        else:
+            queries.append(f"{rng.choice(NL_QUERIES)} ({i})")
+    return queries
+
+
+def run_size(files: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"codebaserag_bench_{files}_", dir=args.workdir)
+    bench_config = benchmark_config(workdir, args.qdrant, args.embedding_cache, args.split_workers)
+    config._set(bench_config)
+
+    # Imported after the configuration is in place; modules read config at call time.
+    from langchain_core.language_models import FakeListLLM
+    from src.chunk_store import ChunkStore
+    from src.convert import convert_files_to_txt, iter_source_files
+    from src.embeddings import embed_documents_bucketed
+    from src.loader import load_documents
+    from src.push_to_qdrant import batched, build_points, ensure_collection
+    from src.qdrant_utils import close_local_clients, get_qdrant_client
+    from src.query_cache import bump_collection_version
+    from src.query_engine import QueryEngine
+    from src.splitter import split_documents
+
+    timer = StageTimer()
+    print(f"Benchmarking {files} files in {workdir} (Qdrant: {args.qdrant}, embeddings: {args.embeddings})")
+    try:
+        start = time.perf_counter()
+        counts = generate_codebase(bench_config.DEFAULT_CODEBASE_PATH, files, seed=args.seed)
+        print(f"  generated  {time.perf_counter() - start:8.2f}s  "
+              f"{sum(c['bytes'] for c in counts.values()) / (1024 * 1024):.1f} MB")
+
+        # Stage output is silenced so the table stays readable.
+        with timer.stage("convert", "files") as record, contextlib.redirect_stdout(io.StringIO()):
+            convert_files_to_txt(bench_config.DEFAULT_CODEBASE_PATH, bench_config.DEFAULT_CONVERTED_PATH)
+            # Files actually converted; a generated language the convert step skipped would not count.
+            record["items"] = sum(1 for _ in iter_source_files(bench_config.DEFAULT_CONVERTED_PATH))
+        with timer.stage("load", "docs") as record, contextlib.redirect_stdout(io.StringIO()):
+            load_documents(bench_config.DEFAULT_CONVERTED_PATH, bench_config.DEFAULT_DOCS_STORE)
+            with ChunkStore(bench_config.DEFAULT_DOCS_STORE) as store:
+                record["items"] = len(store)
+        with timer.stage("split", "chunks") as record, contextlib.redirect_stdout(io.StringIO()):
+            split_documents(bench_config.DEFAULT_DOCS_STORE, bench_config.DEFAULT_CHUNKS_STORE,
+                            bench_config.CHUNK_SIZE, bench_config.CHUNK_OVERLAP,
+                            bench_config.LANGUAGE_AWARE_SPLITTING)
+            with ChunkStore(bench_config.DEFAULT_CHUNKS_STORE) as store:
+                record["items"] = len(store)
+
+        embeddings = make_embeddings(args.embeddings)
+        client = get_qdrant_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            ensure_collection(client, COLLECTION_NAME, embeddings)
+        # Embedding and upsert alternate per batch; each is timed on its own.
+        embed_seconds = upsert_seconds = 0.0
+        chunks = 0
+        with ChunkStore(bench_config.DEFAULT_CHUNKS_STORE) as store:
+            for batch in batched(store.iter_point_chunks(), bench_config.INGEST_BATCH_SIZE):
+                start = time.perf_counter()
+                vectors = embed_documents_bucketed(embeddings, [doc.page_content for _, doc in batch])
+                embed_seconds += time.perf_counter() - start
+                start = time.perf_counter()
+                points = build_points(batch, vectors)
+                for i in range(0, len(points), bench_config.UPSERT_BATCH_SIZE):
+                    client.upsert(collection_name=COLLECTION_NAME, points=points[i:i + bench_config.UPSERT_BATCH_SIZE])
+                upsert_seconds += time.perf_counter() - start
+                chunks += len(batch)
+        timer.add("embed", "chunks", embed_seconds, chunks)
+        timer.add("upsert", "chunks", upsert_seconds, chunks)
+        bump_collection_version(COLLECTION_NAME)
+
+        llm = FakeListLLM(responses=["This is a benchmark answer."])
+        engine = QueryEngine("localhost", 0, COLLECTION_NAME, "fake", suppress_output=True,
+                             embeddings=embeddings, llm=llm)
+        queries = query_set(bench_config.DEFAULT_CHUNKS_STORE, args.queries, args.seed)
+        latencies = []
+        with timer.stage("query", "queries") as record:
+            for query in queries:
+                start = time.perf_counter()
+                engine.ask(query)
+                latencies.append(time.perf_counter() - start)
+            record["items"] = len(queries)
+        latencies.sort()
+        if latencies:
+            timer.stages["query"]["p50_ms"] = latencies[len(latencies) // 2] * 1000
+            timer.stages["query"]["p99_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"  query p50 {timer.stages['query']['p50_ms']:.1f} ms, p99 {timer.stages['query']['p99_ms']:.1f} ms")
+        QueryEngine.release_clients()
+        close_local_clients()
+        return {"files": files, "files_by_extension": counts, "stages": timer.stages}
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Return a description of every stage whose time exceeds the baseline by more than threshold.
+    """
+    regressions = []
+    for size, result in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if base is None:
+            print(f"No baseline for {size} files; skipping comparison.")
+            continue
+        for stage, record in result["stages"].items():
+            base_record = base["stages"].get(stage)
+            if base_record is None or base_record["seconds"] <= 0:
+                continue
+            ratio = record["seconds"] / base_record["seconds"]
+            marker = "REGRESSION" if ratio > 1 + threshold else "ok"
+            print(f"  {size:>7s} files {stage:10s} {base_record['seconds']:8.2f}s -> {record['seconds']:8.2f}s "
+                  f"({ratio - 1:+.1%})  {marker}")
+            if ratio > 1 + threshold:
+                regressions.append(f"{stage} at {size} files ({ratio - 1:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic codebases.")
+    parser.add_argument("--files", type=int, nargs="+", default=[1000],
+                        help="Codebase sizes in files, e.g. 1000 10000 100000.")
+    parser.add_argument("--queries", type=int, default=50, help="Number of queries to time per size.")
+    parser.add_argument("--embeddings", choices=("fake", "real"), default="fake",
+                        help="'fake' uses deterministic hash vectors; 'real' loads the configured model.")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Keep the on-disk embedding cache enabled (off by default so runs are comparable).")
+    parser.add_argument("--qdrant", choices=("memory", "local"), default="memory", help="Embedded Qdrant mode.")
+    parser.add_argument("--split-workers", type=int, default=1,
+                        help="Split processes (1 = in-process, 0 = one per CPU core); see benchmarks/split_scaling.py.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic codebase and queries.")
+    parser.add_argument("--workdir", default=None, help="Parent directory for the temporary files.")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated files after the run.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default=None, help="Compare against this results file.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown per stage relative to the baseline (0.2 = 20%%).")
+    parser.add_argument("--save-baseline", default=None, help="Also write the results to this baseline file.")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "embeddings": args.embeddings,
+        "qdrant": args.qdrant,
+        "split_workers": args.split_workers,
+        "sizes": {str(files): run_size(files, args) for files in args.files},
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {path}.")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Compare Qdrant collection settings on real vectors: memory footprint, search latency and recall.
+
+Vectors are copied from an existing collection into one temporary collection per setting
+(quantization, on-disk storage, HNSW m/ef_construct and search-time ef). Each collection is queried
+with a sample of the stored vectors; latency is reported as p50/p99 and recall@k against exact search.
+
+    python benchmarks/qdrant_settings.py --collection my_code --limit 20000 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_interface.config import config
+from qdrant_client import models
+from src.qdrant_utils import collection_params, get_qdrant_client, search_params
+
+# name -> (collection_params() overrides, search_params() overrides)
+SETTINGS = {
+    "float32": ({"quantization": "none"}, {"quantization": "none"}),
+    "float32_ef128": ({"quantization": "none"}, {"quantization": "none", "hnsw_ef": 128}),
+    "float32_m8": ({"quantization": "none", "hnsw_m": 8}, {"quantization": "none"}),
+    "float32_on_disk": ({"quantization": "none", "vectors_on_disk": True, "payload_on_disk": True},
+                        {"quantization": "none"}),
+    "scalar": ({"quantization": "scalar"}, {"quantization": "scalar", "rescore": False}),
+    "scalar_rescore": ({"quantization": "scalar", "vectors_on_disk": True},
+                       {"quantization": "scalar", "rescore": True}),
+    "binary_rescore": ({"quantization": "binary", "vectors_on_disk": True},
+                       {"quantization": "binary", "rescore": True, "oversampling": 3.0}),
+}
+
+
+def estimate_ram_bytes(count: int, dim: int, params: dict) -> int:
+    """
+    Rough resident size of vectors, quantized vectors and the HNSW graph (payload excluded).
+    Qdrant does not report per-collection memory, so this is derived from the settings.
+    """
+    vectors_config = params["vectors_config"]
+    ram = 0 if vectors_config.on_disk else count * dim * 4
+    quantization = params["quantization_config"]
+    if isinstance(quantization, models.ScalarQuantization) and quantization.scalar.always_ram:
+        ram += count * dim
+    elif isinstance(quantization, models.BinaryQuantization) and quantization.binary.always_ram:
+        ram += count * dim // 8
+    # Layer 0 links (2 * m) plus upper layers, as 4-byte point offsets.
+    ram += count * params["hnsw_config"].m * 2 * 4 * 11 // 10
+    return ram
+
+
+def load_vectors(client, collection_name: str, limit: int):
+    """
+    Scroll up to limit points with their vectors (payload is not needed).
+    """
+    points = []
+    offset = None
+    while len(points) < limit:
+        batch, offset = client.scroll(collection_name=collection_name, limit=min(1000, limit - len(points)),
+                                      offset=offset, with_vectors=True, with_payload=False)
+        points.extend(batch)
+        if offset is None:
+            break
+    return points
+
+
+def wait_for_indexing(client, collection_name: str, timeout: float = 600.0):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        info = client.get_collection(collection_name=collection_name)
+        if info.status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    print(f"Warning: {collection_name} is still optimizing after {timeout:.0f}s.")
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run_setting(client, name: str, points, queries, k: int, source_collection: str, dim: int) -> dict:
+    create_overrides, search_overrides = SETTINGS[name]
+    params = collection_params(dim, **create_overrides)
+    bench_collection = f"{source_collection}__bench_{name}"
+    if client.collection_exists(bench_collection):
+        client.delete_collection(bench_collection)
+    # A low indexing threshold makes Qdrant build the HNSW graph even for small samples.
+    client.create_collection(collection_name=bench_collection,
+                             optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1), **params)
+    try:
+        for i in range(0, len(points), 256):
+            client.upsert(collection_name=bench_collection, points=[
+                models.PointStruct(id=point.id, vector=point.vector) for point in points[i:i + 256]
+            ])
+        wait_for_indexing(client, bench_collection)
+
+        params_search = search_params(**search_overrides)
+        exact = models.SearchParams(exact=True)
+        latencies = []
+        recall_hits = 0
+        for vector in queries:
+            start = time.perf_counter()
+            response = client.query_points(collection_name=bench_collection, query=vector, limit=k,
+                                           search_params=params_search)
+            latencies.append(time.perf_counter() - start)
+            truth = client.query_points(collection_name=bench_collection, query=vector, limit=k, search_params=exact)
+            recall_hits += len({p.id for p in response.points} & {p.id for p in truth.points})
+        return {
+            "estimated_ram_mb": estimate_ram_bytes(len(points), dim, params) / (1024 * 1024),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            f"recall@{k}": recall_hits / (len(queries) * k),
+        }
+    finally:
+        client.delete_collection(bench_collection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report memory footprint and search latency per collection setting.")
+    parser.add_argument("--collection", default=config.DEFAULT_COLLECTION_NAME,
+                        help="Collection to copy vectors from (default from config).")
+    parser.add_argument("--host", default=None, help="Qdrant server host (default from config).")
+    parser.add_argument("--port", type=int, default=None, help="Qdrant server port (default from config).")
+    parser.add_argument("--limit", type=int, default=20000, help="Number of vectors to copy.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query vectors.")
+    parser.add_argument("--k", type=int, default=config.RETRIEVER_K, help="Results per query (default from config).")
+    parser.add_argument("--only", nargs="*", default=None, choices=sorted(SETTINGS), help="Settings to run.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    client = get_qdrant_client(args.host, args.port)
+    points = load_vectors(client, args.collection, args.limit)
+    if not points:
+        print(f"Collection '{args.collection}' has no points to benchmark.")
+        sys.exit(1)
+    dim = len(points[0].vector)
+    queries = [point.vector for point in random.Random(0).sample(points, min(args.queries, len(points)))]
+    print(f"Benchmarking {len(points)} vectors of dimension {dim} from '{args.collection}' "
+          f"with {len(queries)} queries (k={args.k}).")
+
+    results = {}
+    print(f"{'setting':18s} {'RAM (est.)':>11s} {'p50':>9s} {'p99':>9s} {'recall':>8s}")
+    for name in SETTINGS:
+        if args.only and name not in args.only:
+            continue
+        result = results[name] = run_setting(client, name, points, queries, args.k, args.collection, dim)
+        print(f"{name:18s} {result['estimated_ram_mb']:9.1f}MB {result['p50_ms']:7.2f}ms {result['p99_ms']:7.2f}ms "
+              f"{result[f'recall@{args.k}']:8.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"collection": args.collection, "points": len(points), "dim": dim, "k": args.k,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Scaling of the split step with the number of worker processes.
+
+A synthetic codebase is generated and read into memory once; then the documents are split with each
+worker count (src.splitter.iter_split_records, symbol extraction included) and the throughput,
+speedup and parallel efficiency relative to in-process splitting are reported. Every run must
+produce exactly the same chunks in the same order.
+
+    python benchmarks/split_scaling.py --files 20000 --workers 1 2 4 8 16 32
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.pipeline import benchmark_config
+from benchmarks.synthetic_codebase import generate_codebase
+from user_interface.config import config
+
+
+def run_workers(documents, workers: int) -> dict:
+    from src.splitter import iter_split_records
+    digest = hashlib.sha256()
+    chunks = 0
+    start = time.perf_counter()
+    for records, point_ids, rows in iter_split_records(documents, config.CHUNK_SIZE, config.CHUNK_OVERLAP,
+                                                       True, with_symbols=True, workers=workers):
+        chunks += len(records)
+        for point_id in point_ids:
+            digest.update(point_id.encode("utf-8"))
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "chunks": chunks, "chunks_per_s": chunks / seconds, "digest": digest.hexdigest()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure split throughput per number of worker processes.")
+    parser.add_argument("--files", type=int, default=10000, help="Size of the synthetic codebase in files.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Worker counts to run; 1 is the in-process baseline.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic codebase.")
+    parser.add_argument("--workdir", default=None, help="Parent directory for the temporary files.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="codebaserag_split_", dir=args.workdir)
+    try:
+        config._set(benchmark_config(workdir, "memory", embedding_cache=False))
+        from src.convert import iter_documents, iter_source_files
+        generate_codebase(config.DEFAULT_CODEBASE_PATH, args.files, seed=args.seed)
+        documents = list(iter_documents(iter_source_files(config.DEFAULT_CODEBASE_PATH)))
+        size_mb = sum(len(doc.page_content) for doc in documents) / (1024 * 1024)
+        print(f"Splitting {len(documents)} documents ({size_mb:.1f} MB) on {os.cpu_count()} CPUs.")
+
+        results = {}
+        print(f"{'workers':>7s} {'seconds':>9s} {'chunks/s':>10s} {'speedup':>8s} {'efficiency':>10s}")
+        for workers in args.workers:
+            result = results[workers] = run_workers(documents, workers)
+            baseline = results.get(1, results[args.workers[0]])
+            result["speedup"] = baseline["seconds"] / result["seconds"]
+            result["efficiency"] = result["speedup"] / workers
+            print(f"{workers:7d} {result['seconds']:9.2f} {result['chunks_per_s']:10.0f} "
+                  f"{result['speedup']:7.2f}x {result['efficiency']:10.0%}")
+        if len({result["digest"] for result in results.values()}) > 1:
+            print("Error: worker counts produced different chunks.")
+            sys.exit(1)
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"files": args.files, "documents": len(documents), "mb": size_mb, "results": results},
+                          f, indent=2)
+            print(f"Results written to {args.output}.")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the menu, the CLI and every stage script.
+
+Each entry point is run in a fresh interpreter (so nothing is already imported) with --help, or
+imported when it has no argument parser, and the median wall time over several runs is compared
+against a per-entry budget. The run exits non-zero if any entry point is over budget, so it can
+gate a CI job.
+
+    python benchmarks/startup.py --repeat 5 --output startup.json
+    python benchmarks/startup.py --importtime src/loader.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (command after the interpreter, budget in seconds)
+ENTRY_POINTS = {
+    "menu": (["-c", "import main"], 0.5),
+    "launch_qdrant": (["src/launch_qdrant.py", "--help"], 0.5),
+    "convert": (["src/convert.py", "--help"], 0.5),
+    "loader": (["src/loader.py", "--help"], 1.0),
+    "splitter": (["src/splitter.py", "--help"], 2.0),
+    "push_to_qdrant": (["src/push_to_qdrant.py", "--help"], 2.5),
+    "incremental": (["src/incremental.py", "--help"], 2.5),
+    "pipeline": (["src/pipeline.py", "--help"], 2.5),
+    "cli": (["user_interface/cli.py", "--help"], 0.5),
+    "gradio_app": (["-c", "import user_interface.gradio_app"], 4.0),
+}
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def time_entry_point(args, repeat: int) -> dict:
+    """
+    Run the command `repeat` times in fresh interpreters and return its timings.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=REPO_ROOT, env=_env(),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "max_s": max(timings)}
+
+
+def import_offenders(args, top: int) -> list:
+    """
+    Run the command once with -X importtime and return the slowest imports as (cumulative_us, module).
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=REPO_ROOT, env=_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    offenders = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        offenders.append((int(cumulative), module.strip()))
+    offenders.sort(reverse=True)
+    return offenders[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of each entry point.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per entry point (median is reported).")
+    parser.add_argument("--only", nargs="*", default=None, help="Entry point names to run (default: all).")
+    parser.add_argument("--budget-file", default=None,
+                        help="JSON file of {entry point: seconds} overriding the built-in budgets.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--importtime", default=None, metavar="SCRIPT",
+                        help="Instead of timing, list the slowest imports of this script or entry point name.")
+    parser.add_argument("--top", type=int, default=15, help="Number of imports to list with --importtime.")
+    args = parser.parse_args()
+
+    if args.importtime:
+        command = ENTRY_POINTS[args.importtime][0] if args.importtime in ENTRY_POINTS else [args.importtime, "--help"]
+        for cumulative, module in import_offenders(command, args.top):
+            print(f"{cumulative / 1e6:8.3f}s  {module}")
+        return
+
+    budgets = {name: budget for name, (_, budget) in ENTRY_POINTS.items()}
+    if args.budget_file:
+        with open(args.budget_file, "r") as f:
+            budgets.update(json.load(f))
+
+    results = {}
+    over_budget = []
+    for name, (command, _) in ENTRY_POINTS.items():
+        if args.only and name not in args.only:
+            continue
+        result = time_entry_point(command, args.repeat)
+        result["budget_s"] = budgets[name]
+        results[name] = result
+        if "error" in result:
+            print(f"{name:16s} ERROR  {result['error']}")
+            over_budget.append(name)
+            continue
+        status = "ok" if result["median_s"] <= budgets[name] else "OVER"
+        if status == "OVER":
+            over_budget.append(name)
+        print(f"{name:16s} {result['median_s']:6.3f}s  (budget {budgets[name]:.1f}s)  {status}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}.")
+    if over_budget:
+        print(f"Over budget or failed: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Deterministic generator of synthetic multi-language codebases for the benchmarks.
+
+Files are spread over nested package directories and contain classes, functions and comments in
+each language src/splitter.py handles, with sizes drawn from a long-tailed distribution so that
+chunking sees both small files and files spanning many chunks.
+
+    python benchmarks/synthetic_codebase.py /tmp/synthetic_10k --files 10000
+"""
+import argparse
+import os
+import random
+
+# extension -> language key (as in EXTENSION_TO_LANGUAGE), weight in the generated mix
+LANGUAGE_MIX = {
+    ".py": ("python", 30),
+    ".cpp": ("cpp", 15),
+    ".h": ("cpp", 10),
+    ".java": ("java", 15),
+    ".cs": ("csharp", 10),
+    ".jl": ("julia", 5),
+    ".m": ("matlab", 5),
+    ".md": ("markdown", 10),
+}
+
+_WORDS = ("index", "buffer", "token", "record", "parse", "chunk", "vector", "query", "cache", "store",
+          "split", "merge", "load", "batch", "score", "graph", "node", "path", "config", "stream")
+FILES_PER_DIRECTORY = 100
+
+
+def _name(rng: random.Random, parts: int = 2) -> str:
+    return "_".join(rng.choice(_WORDS) for _ in range(parts)) + str(rng.randrange(1000))
+
+
+def _camel(name: str) -> str:
+    return "".join(part.capitalize() for part in name.split("_"))
+
+
+def _body_lines(rng: random.Random, indent: str, terminator: str = "") -> list:
+    lines = []
+    for _ in range(rng.randint(3, 12)):
+        a, b = _name(rng, 1), _name(rng, 1)
+        lines.append(f"{indent}{a} = {b} + {rng.randint(0, 99)}{terminator}")
+    return lines
+
+
+def python_unit(rng: random.Random, name: str) -> list:
+    lines = [f"class {_camel(name)}:", f'    """Synthetic class {name}."""', ""]
+    for _ in range(rng.randint(1, 4)):
+        method = _name(rng)
+        lines += [f"    def {method}(self, value):", "        # compute the result"]
+        lines += _body_lines(rng, "        ") + ["        return value", ""]
+    return lines
+
+
+def cpp_unit(rng: random.Random, name: str) -> list:
+    lines = [f"// {name}: synthetic class", f"class {_camel(name)} {{", "public:"]
+    for _ in range(rng.randint(1, 4)):
+        method = _name(rng)
+        lines += [f"    int {method}(int value) {{"] + _body_lines(rng, "        int ", ";")
+        lines += ["        return value;", "    }"]
+    return lines + ["};", ""]
+
+
+def java_unit(rng: random.Random, name: str, keyword: str = "public") -> list:
+    lines = ["/**", f" * Synthetic class {name}.", " */", f"{keyword} class {_camel(name)} {{"]
+    for _ in range(rng.randint(1, 4)):
+        method = _name(rng)
+        lines += [f"    public int {method}(int value) {{"] + _body_lines(rng, "        int ", ";")
+        lines += ["        return value;", "    }"]
+    return lines + ["}", ""]
+
+
+def julia_unit(rng: random.Random, name: str) -> list:
+    lines = [f"# {name}", f"struct {_camel(name)}", "    value::Int", "end", ""]
+    for _ in range(rng.randint(1, 4)):
+        lines += [f"function {_name(rng)}(value)"] + _body_lines(rng, "    ") + ["    return value", "end", ""]
+    return lines
+
+
+def matlab_unit(rng: random.Random, name: str) -> list:
+    lines = [f"%% {name}"]
+    for _ in range(rng.randint(1, 4)):
+        lines += [f"function result = {_name(rng)}(value)", "% compute the result"]
+        lines += _body_lines(rng, "    ", ";") + ["    result = value;", "end", ""]
+    return lines
+
+
+def markdown_unit(rng: random.Random, name: str) -> list:
+    lines = [f"## {_camel(name)}", ""]
+    for _ in range(rng.randint(2, 6)):
+        lines.append(" ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 20))) + ".")
+    return lines + ["", f"See `{name}` for details.", ""]
+
+
+UNIT_GENERATORS = {
+    "python": python_unit,
+    "cpp": cpp_unit,
+    "java": java_unit,
+    "csharp": lambda rng, name: java_unit(rng, name, keyword="public sealed"),
+    "julia": julia_unit,
+    "matlab": matlab_unit,
+    "markdown": markdown_unit,
+}
+
+
+def generate_file(rng: random.Random, language: str) -> str:
+    # Long-tailed unit count: most files are small, a few span many chunks.
+    units = min(40, int(rng.paretovariate(1.5)))
+    lines = []
+    for _ in range(units):
+        lines += UNIT_GENERATORS[language](rng, _name(rng))
+    return "\n".join(lines) + "\n"
+
+
+def generate_codebase(root: str, files: int, seed: int = 0) -> dict:
+    """
+    Write `files` synthetic source files under root; the same seed always produces the same tree.
+    Returns the number of files and bytes written per extension.
+    """
+    rng = random.Random(seed)
+    extensions = list(LANGUAGE_MIX)
+    weights = [LANGUAGE_MIX[ext][1] for ext in extensions]
+    counts = {}
+    for i in range(files):
+        ext = rng.choices(extensions, weights)[0]
+        directory = os.path.join(root, f"pkg{i // (FILES_PER_DIRECTORY * FILES_PER_DIRECTORY)}",
+                                 f"mod{(i // FILES_PER_DIRECTORY) % FILES_PER_DIRECTORY}")
+        os.makedirs(directory, exist_ok=True)
+        text = generate_file(rng, LANGUAGE_MIX[ext][0])
+        with open(os.path.join(directory, f"file{i}{ext}"), "w", encoding="utf-8") as f:
+            f.write(text)
+        stats = counts.setdefault(ext, {"files": 0, "bytes": 0})
+        stats["files"] += 1
+        stats["bytes"] += len(text)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic multi-language codebase.")
+    parser.add_argument("root", help="Directory to write the codebase into.")
+    parser.add_argument("--files", type=int, default=1000, help="Number of files to generate.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same codebase).")
+    args = parser.parse_args()
+
+    counts = generate_codebase(args.root, args.files, args.seed)
+    for ext, stats in sorted(counts.items()):
+        print(f"{ext:6s} {stats['files']:7d} files {stats['bytes'] / (1024 * 1024):8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
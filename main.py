@@ -1,15 +1,18 @@
 #!/usr/bin/env python3
 import subprocess
 import os
+import sys
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 import atexit
-import torch
 from user_interface.config import config, load_config_from_ini, overwrite_config_ini, display_current_config
 
 # Register an exit handler to free GPU memory.
 def free_gpu_memory():
-    print("Cleaning up GPU memory...")
-    torch.cuda.empty_cache()
+    # Only touch torch if a feature in this process already loaded it; importing it here costs seconds.
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        print("Cleaning up GPU memory...")
+        torch.cuda.empty_cache()
 
 atexit.register(free_gpu_memory)
 
@@ -17,8 +20,8 @@ def prepare_codebase():
     """
     Run the data preparation steps:
     1. Convert source files to text.
-    2. Load the converted text and pickle documents.
-    3. Split the documents into chunks.
+    2. Load the converted text into the document store.
+    3. Split the documents into the chunk store.
     """
     load_config_from_ini()
     try:
@@ -26,13 +29,13 @@ def prepare_codebase():
         print("Running conversion...")
         subprocess.run(["python", "src/convert.py", "--src", config.DEFAULT_CODEBASE_PATH, "--dst", config.DEFAULT_CONVERTED_PATH], check=True)
         print("Running loader...")
-        subprocess.run(["python", "src/loader.py", "--src", config.DEFAULT_CONVERTED_PATH, "--dst", config.DEFAULT_DOCS_PICKLE], check=True)
+        subprocess.run(["python", "src/loader.py", "--src", config.DEFAULT_CONVERTED_PATH, "--dst", config.DEFAULT_DOCS_STORE], check=True)
         print("Running splitter...")
         subprocess.run(
             [
                 "python", "src/splitter.py",
-                "--input", config.DEFAULT_DOCS_PICKLE,
-                "--output", config.DEFAULT_CHUNKS_PICKLE,
+                "--input", config.DEFAULT_DOCS_STORE,
+                "--output", config.DEFAULT_CHUNKS_STORE,
                 "--chunk_size", str(config.CHUNK_SIZE),
                 "--chunk_overlap", str(config.CHUNK_OVERLAP)
             ] + (["--language_splitting"] if config.LANGUAGE_AWARE_SPLITTING else []),
@@ -45,21 +48,77 @@ def prepare_codebase():
 
 def push_to_qdrant():
     """
-    Push the document chunks (pickle file) to Qdrant.
+    Push the document chunks (chunk store) to Qdrant.
     """
+    if config.QDRANT_MODE == "memory":
+        print("QDRANT_MODE is 'memory': a push subprocess would write to its own in-memory store. "
+              "Use option 6 (in-process ingest) instead.")
+        return
     try:
         print("\n--- Pushing to Qdrant ---")
-        subprocess.run(["python", "src/push_to_qdrant.py", config.DEFAULT_CHUNKS_PICKLE, "--collection_name", config.DEFAULT_COLLECTION_NAME], check=True)
+        subprocess.run(["python", "src/push_to_qdrant.py", config.DEFAULT_CHUNKS_STORE, "--collection_name", config.DEFAULT_COLLECTION_NAME], check=True)
         print("Documents successfully pushed to Qdrant.\n")
     except subprocess.CalledProcessError as e:
         print("An error occurred while pushing documents to Qdrant:", e)
         return
 
+def ingest_codebase():
+    """
+    Stream the codebase straight into Qdrant in this process (read, split, embed, upsert),
+    without the intermediate text copy and pickle files of the staged workflow.
+    """
+    print("\n--- Ingesting Codebase ---")
+    try:
+        from src.pipeline import ingest_codebase as run_ingest
+        run_ingest(config.DEFAULT_CODEBASE_PATH, config.DEFAULT_COLLECTION_NAME)
+        if config.QDRANT_MODE == "local":
+            # Release the embedded store so the GUI or a push subprocess can open it.
+            from src.qdrant_utils import close_local_clients
+            close_local_clients()
+        print("Ingest complete.\n")
+    except Exception as e:
+        print("An error occurred during ingest:", e)
+        return
+
+def reindex_incremental():
+    """
+    Re-index only the files that changed since the last incremental run and
+    delete the points of files that were removed from the codebase.
+    """
+    try:
+        print("\n--- Incremental Reindex ---")
+        subprocess.run(["python", "src/incremental.py", "--src", config.DEFAULT_CODEBASE_PATH,
+                        "--collection_name", config.DEFAULT_COLLECTION_NAME,
+                        "--manifest", config.DEFAULT_MANIFEST_FILE], check=True)
+        print("Incremental reindex complete.\n")
+    except subprocess.CalledProcessError as e:
+        print("An error occurred during incremental reindexing:", e)
+        return
+
+def watch_codebase():
+    """
+    Keep the collection in sync with the working tree until Ctrl+C, re-indexing changed files as they are saved.
+    """
+    print("\n--- Watching Codebase ---")
+    try:
+        from src.watch import watch_codebase as run_watch
+        run_watch(config.DEFAULT_CODEBASE_PATH, config.DEFAULT_COLLECTION_NAME, config.DEFAULT_MANIFEST_FILE)
+        if config.QDRANT_MODE == "local":
+            # Release the embedded store so the GUI or a push subprocess can open it.
+            from src.qdrant_utils import close_local_clients
+            close_local_clients()
+    except Exception as e:
+        print("An error occurred while watching the codebase:", e)
+        return
+
 def launch_qdrant(launch=True):
     """
     Launch or kill Qdrant using the dedicated script.
     If launch=True, run in detached mode (default). Otherwise, kill the container.
     """
+    if config.QDRANT_MODE != "server":
+        print(f"QDRANT_MODE is '{config.QDRANT_MODE}': Qdrant runs embedded in each process, no container is needed.\n")
+        return
     script_path = os.path.join("src", "launch_qdrant.py")
     try:
         if launch:
@@ -78,22 +137,61 @@ def launch_cli():
     The user can repeatedly enter queries until they type '/exit'.
     """
     print("\n--- Entering CLI Mode ---")
-    print("Type '/exit' to return to the main menu.\n")
-    # Import the query_index function (assuming defaults from config)
-    from user_interface.cli import query
+    print("Type '/exit' to return to the main menu, '/stats' to show cache hit rates, "
+          "'/metrics' to show stage latencies and token counts, or "
+          "'/filter path=... language=... extension=... symbol=...' to scope the search "
+          "('/filter' alone clears it), or '/collections name,glob*,...' to search several collections.\n")
+    # Build the query engine once; the embedding model, Qdrant client and chain are reused for every query.
+    from src.federated import FederatedQueryEngine, get_engine
+    from src.qdrant_utils import build_filter, describe_filter
+    engine = None
+    query_filter = None
+    collections = config.DEFAULT_COLLECTION_NAME
     while True:
         prompt = input("Enter your query: ").strip()
         if prompt == "/exit":
+            if config.QDRANT_MODE == "local":
+                # Let other processes (GUI, push, reindex) open the embedded store.
+                FederatedQueryEngine.release_clients()
             print("Exiting CLI mode...\n")
             break
+        if prompt == "/stats":
+            print(engine.format_cache_stats() if engine is not None else "No queries yet.", "\n")
+            continue
+        if prompt == "/metrics":
+            from src.tracing import metrics
+            print(metrics.render_prometheus())
+            continue
+        if prompt == "/filter" or prompt.startswith("/filter "):
+            try:
+                options = dict(option.split("=", 1) for option in prompt.split()[1:])
+                query_filter = build_filter(**options)
+            except (TypeError, ValueError):
+                print("Usage: /filter [path=dir,...] [language=python,...] [extension=py,...] [symbol=name,...]\n")
+                continue
+            print(f"Search filter: {describe_filter(query_filter)}\n")
+            continue
+        if prompt == "/collections" or prompt.startswith("/collections "):
+            collections = prompt[len("/collections"):].strip() or config.DEFAULT_COLLECTION_NAME
+            engine = None
+            print(f"Searching collections: {collections}\n")
+            continue
         try:
-            answer = query(prompt,
-                           config.DEFAULT_QDRANT_HOST,
-                           config.DEFAULT_QDRANT_PORT,
-                           config.DEFAULT_COLLECTION_NAME,
-                           config.DEFAULT_LLM_MODEL,
-                           suppress_output=True)
-            print("Answer:", answer, "\n")
+            if engine is None:
+                engine = get_engine(config.DEFAULT_QDRANT_HOST,
+                                    config.DEFAULT_QDRANT_PORT,
+                                    collections,
+                                    config.DEFAULT_LLM_MODEL,
+                                    suppress_output=True)
+            # Print tokens as they arrive so the answer starts appearing immediately.
+            print("Answer: ", end="", flush=True)
+            for token in engine.stream(prompt, query_filter):
+                print(token, end="", flush=True)
+            print("\n")
+            if engine.packer is not None:
+                print(engine.packer.format_last_report())
+            if isinstance(engine, FederatedQueryEngine):
+                print(engine.format_last_search())
             print("Type '/exit' to return to the main menu.\n")
         except Exception as e:
             print("Error processing query:", e)
@@ -122,6 +220,9 @@ def interactive_menu():
         print("2. Manage Qdrant (Launch/Kill)")
         print("3. Push to Qdrant")
         print("4. Use Interface (CLI/GUI)")
+        print("5. Incremental Reindex (changed files only)")
+        print("6. Ingest Codebase (streaming Prepare + Push, in-process)")
+        print("7. Watch Codebase (keep the collection in sync until Ctrl+C)")
         print("9. Display current config/Reload config from file")
         print("0. Exit")
         choice = input("Select an option: ").strip()
@@ -146,6 +247,12 @@ def interactive_menu():
                 launch_gui()
             else:
                 print("Invalid option for interface selection.")
+        elif choice == "5":
+            reindex_incremental()
+        elif choice == "6":
+            ingest_codebase()
+        elif choice == "7":
+            watch_codebase()
         elif choice == "9":
             sub_choice = input("Enter 'd' to display current config, or 'r' to reload config from another file: ").strip().lower()
             if sub_choice == "d":
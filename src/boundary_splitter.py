@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Regex-boundary splitter for languages langchain has no separators for (MATLAB, Julia, ...).
+
+A file is cut into units at every line matching the language's boundary pattern (a function, type or
+section start), and consecutive units are packed into chunks of at most chunk_size characters.
+A unit longer than chunk_size is cut at line breaks (or, for a single overlong line, mid-line), with
+chunk_overlap characters of context carried across each such cut. Chunks are slices of the original
+text located by offset, so a file is processed in one linear pass without rebuilding strings.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+
+from langchain_core.documents import Document
+
+# Language key -> pattern matched right after a line's indentation. Adding a language is one entry.
+BOUNDARY_PATTERNS = {
+    "matlab": r"(?:function|classdef)\b|%%",
+    "julia": r"(?:function|macro|(?:mutable\s+)?struct|(?:bare)?module|abstract\s+type|primitive\s+type)\b",
+}
+
+_NEWLINE = re.compile(r"\n")
+
+
+def line_starts(text: str) -> List[int]:
+    """
+    Character offset of the start of every line.
+    """
+    return [0] + [match.end() for match in _NEWLINE.finditer(text)]
+
+
+class BoundarySplitter:
+    """
+    Splits Documents at regex boundaries into Documents of at most chunk_size characters, with
+    "start_index", "start_line" and "end_line" (1-based, inclusive) metadata.
+    """
+
+    def __init__(self, boundary_pattern: str, chunk_size: int, chunk_overlap: int):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size}).")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.boundary_pattern = re.compile(rf"^[ \t]*(?:{boundary_pattern})", re.MULTILINE)
+
+    @classmethod
+    def for_language(cls, language: str, chunk_size: int, chunk_overlap: int) -> "BoundarySplitter":
+        return cls(BOUNDARY_PATTERNS[language], chunk_size, chunk_overlap)
+
+    def _cut(self, start: int, end: int, starts: List[int]) -> List[Tuple[int, int]]:
+        """
+        Cut an oversized unit into runs of at most chunk_size characters, preferring line breaks.
+        """
+        runs = []
+        run_start = start
+        while end - run_start > self.chunk_size:
+            limit = run_start + self.chunk_size
+            line = bisect_right(starts, limit) - 1
+            if starts[line] > run_start:
+                cut = starts[line]
+                # Overlap with whole lines that start within chunk_overlap of the cut.
+                first = bisect_left(starts, max(cut - self.chunk_overlap, run_start + 1))
+                next_start = starts[first] if starts[first] < cut else cut
+                # Drop the overlap when it would leave no room for the line after the cut.
+                line_end = starts[line + 1] if line + 1 < len(starts) else end
+                if line_end - next_start > self.chunk_size:
+                    next_start = cut
+            else:
+                # A single line longer than chunk_size: cut it mid-line.
+                cut = limit
+                next_start = max(cut - self.chunk_overlap, run_start + 1)
+            runs.append((run_start, cut))
+            run_start = next_start
+        runs.append((run_start, end))
+        return runs
+
+    def split_spans(self, text: str, starts: List[int] = None) -> List[Tuple[int, int]]:
+        """
+        Return the (start, end) character ranges of the chunks of text.
+        """
+        starts = line_starts(text) if starts is None else starts
+        unit_starts = [match.start() for match in self.boundary_pattern.finditer(text)]
+        if not unit_starts or unit_starts[0] != 0:
+            unit_starts.insert(0, 0)
+        unit_ends = unit_starts[1:] + [len(text)]
+
+        spans = []
+        chunk_start = chunk_end = None
+        for unit_start, unit_end in zip(unit_starts, unit_ends):
+            if chunk_start is not None and unit_end - chunk_start <= self.chunk_size:
+                chunk_end = unit_end
+                continue
+            if chunk_start is not None:
+                spans.append((chunk_start, chunk_end))
+            if unit_end - unit_start <= self.chunk_size:
+                chunk_start, chunk_end = unit_start, unit_end
+                continue
+            runs = self._cut(unit_start, unit_end, starts)
+            spans.extend(runs[:-1])
+            # The unit's tail can still share a chunk with the units that follow it.
+            chunk_start, chunk_end = runs[-1]
+        if chunk_start is not None:
+            spans.append((chunk_start, chunk_end))
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [doc.page_content for doc in self.split_documents([Document(page_content=text)])]
+
+    def split_documents(self, docs: List[Document]) -> List[Document]:
+        chunks = []
+        for doc in docs:
+            text = doc.page_content
+            starts = line_starts(text)
+            for start, end in self.split_spans(text, starts):
+                chunk = text[start:end]
+                stripped = chunk.lstrip("\r\n")
+                start += len(chunk) - len(stripped)
+                stripped = stripped.rstrip()
+                if not stripped.strip():
+                    continue
+                metadata = dict(doc.metadata)
+                metadata["start_index"] = start
+                metadata["start_line"] = bisect_right(starts, start)
+                metadata["end_line"] = bisect_right(starts, start + len(stripped) - 1)
+                chunks.append(Document(page_content=stripped, metadata=metadata))
+        return chunks
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+On-disk store for documents and chunks, replacing the pickled lists of langchain Documents.
+
+A store is a directory with:
+  text.bin      every record's text back to back (each record optionally zstd-compressed)
+  offsets.u64   count + 1 little-endian uint64 byte offsets into text.bin
+  ids.uuid      point IDs as 16 raw bytes per record
+  colN.i64      integer metadata columns (offsets, line numbers), one little-endian int64 per record
+  colN.u32      other metadata columns: per-record codes into a dictionary of distinct values
+  meta.json     record count, compression, column names, kinds and the value dictionaries
+
+Only low-cardinality values (such as the source path) are dictionary-encoded, so meta.json stays
+small however many records the store holds. Point IDs that are not UUIDs and integer columns that
+receive another type fall back to dictionary encoding.
+
+Files are memory-mapped on open, so a single record can be read without loading the rest and
+iteration materializes only one batch of Documents at a time.
+"""
+import argparse
+import json
+import mmap
+import os
+import pickle
+import shutil
+import sys
+import uuid
+from array import array
+
+from langchain_core.documents import Document
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+FORMAT_VERSION = 2
+READABLE_VERSIONS = (1, 2)
+MISSING = 0xFFFFFFFF  # code for "this record has no value in this column"
+INT_MISSING = -(1 << 63)  # the same for integer columns
+NO_UUID = bytes(16)  # and for point IDs
+
+# Fixed namespace so that the same (source, offset) pair always maps to the same point ID.
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://github.com/jefftam1234/CodeBaseRAG/chunks")
+
+
+def chunk_point_id(source: str, offset) -> str:
+    """
+    Derive a deterministic Qdrant point ID from a chunk's source path and offset,
+    so re-pushing the same chunk overwrites its point instead of duplicating it.
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}:{offset}"))
+
+
+def assign_point_ids(doc_chunks) -> list:
+    """
+    Return one point ID per chunk. The chunk's "start_index" metadata is used as the offset;
+    splitters that do not record it fall back to the chunk's ordinal within its source.
+    """
+    ordinals = {}
+    ids = []
+    for doc in doc_chunks:
+        source = doc.metadata["source"]
+        ordinal = ordinals.get(source, 0)
+        ordinals[source] = ordinal + 1
+        offset = doc.metadata.get("start_index", f"#{ordinal}")
+        ids.append(chunk_point_id(source, offset))
+    return ids
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError("zstd compression requires the 'zstandard' package (pip install zstandard).")
+
+
+def _dump_codes(codes: array, file_path: str):
+    if sys.byteorder != "little":
+        codes = array(codes.typecode, codes)
+        codes.byteswap()
+    with open(file_path, "wb") as f:
+        codes.tofile(f)
+
+
+class ChunkStoreWriter:
+    """
+    Append records one at a time and finalize the store on close().
+    Text is streamed to disk as it is added; only the offsets and column codes stay in memory.
+    """
+
+    def __init__(self, path: str, compression: str = "none", level: int = 3):
+        if compression not in ("none", "zstd"):
+            raise ValueError(f"Unknown chunk store compression '{compression}', expected 'none' or 'zstd'.")
+        if compression == "zstd":
+            _require_zstd()
+            self._compressor = zstandard.ZstdCompressor(level=level)
+        else:
+            self._compressor = None
+        self.path = path
+        self.compression = compression
+        self._tmp_path = path + ".tmp"
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+        os.makedirs(self._tmp_path)
+        self._text_file = open(os.path.join(self._tmp_path, "text.bin"), "wb")
+        self._offsets = array("Q", [0])
+        self._ids = _UuidColumn()
+        self._columns = {}
+        self._count = 0
+
+    def add(self, text: str, metadata: dict = None, point_id: str = None):
+        data = text.encode("utf-8")
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._text_file.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._ids = _append(self._ids, point_id, self._count)
+        for key, value in (metadata or {}).items():
+            column = self._columns.get(key)
+            if column is None:
+                column = _IntColumn() if _IntColumn.accepts(value) else _DictionaryColumn()
+            self._columns[key] = _append(column, value, self._count)
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def add_documents(self, docs, point_ids=None):
+        point_ids = point_ids if point_ids is not None else [None] * len(docs)
+        for point_id, doc in zip(point_ids, docs):
+            self.add(doc.page_content, doc.metadata, point_id)
+
+    def close(self):
+        self._text_file.close()
+        _dump_codes(self._offsets, os.path.join(self._tmp_path, "offsets.u64"))
+        ids = self._ids.dump(self._tmp_path, "ids", self._count)
+        columns = {key: column.dump(self._tmp_path, f"col{i}", self._count)
+                   for i, (key, column) in enumerate(self._columns.items())}
+        meta = {
+            "version": FORMAT_VERSION,
+            "count": self._count,
+            "compression": self.compression,
+            "ids": ids,
+            "columns": columns,
+        }
+        with open(os.path.join(self._tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # Swap the finished store into place so readers never see a half-written one.
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._text_file.close()
+            shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+
+def _append(column, value, row: int):
+    """
+    Append value to column, first re-encoding the column as a dictionary if it cannot hold the value.
+    Returns the column that now holds the values.
+    """
+    if value is not None and not column.accepts(value):
+        column = column.to_dictionary()
+    column.append(value, row)
+    return column
+
+
+class _DictionaryColumn:
+    """Dictionary-encoded column: distinct values in a list, one uint32 code per record."""
+
+    kind = "dict"
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+        self._codes = array("I")
+
+    @staticmethod
+    def accepts(value) -> bool:
+        return True
+
+    def append(self, value, row: int):
+        # Rows before this column's first value had no entry for it.
+        while len(self._codes) < row:
+            self._codes.append(MISSING)
+        if value is None:
+            self._codes.append(MISSING)
+            return
+        key = json.dumps(value, sort_keys=True)
+        code = self._index.get(key)
+        if code is None:
+            code = self._index[key] = len(self.values)
+            self.values.append(value)
+        self._codes.append(code)
+
+    def dump(self, directory: str, name: str, count: int) -> dict:
+        while len(self._codes) < count:
+            self._codes.append(MISSING)
+        file_name = f"{name}.u32"
+        _dump_codes(self._codes, os.path.join(directory, file_name))
+        return {"file": file_name, "kind": self.kind, "values": self.values}
+
+
+class _IntColumn:
+    """Integer column (offsets, line numbers): one int64 per record and nothing in meta.json."""
+
+    kind = "int"
+
+    def __init__(self):
+        self._values = array("q")
+
+    @staticmethod
+    def accepts(value) -> bool:
+        return type(value) is int and INT_MISSING < value < (1 << 63)
+
+    def append(self, value, row: int):
+        while len(self._values) < row:
+            self._values.append(INT_MISSING)
+        self._values.append(INT_MISSING if value is None else value)
+
+    def to_dictionary(self) -> _DictionaryColumn:
+        column = _DictionaryColumn()
+        for row, value in enumerate(self._values):
+            column.append(None if value == INT_MISSING else value, row)
+        return column
+
+    def dump(self, directory: str, name: str, count: int) -> dict:
+        while len(self._values) < count:
+            self._values.append(INT_MISSING)
+        file_name = f"{name}.i64"
+        _dump_codes(self._values, os.path.join(directory, file_name))
+        return {"file": file_name, "kind": self.kind}
+
+
+class _UuidColumn:
+    """UUID column (point IDs): 16 raw bytes per record, all zero for a missing ID."""
+
+    kind = "uuid"
+
+    def __init__(self):
+        self._data = bytearray()
+
+    @staticmethod
+    def accepts(value) -> bool:
+        # Only IDs that read back as the same string: canonical lower-case UUIDs.
+        try:
+            return isinstance(value, str) and str(uuid.UUID(value)) == value
+        except ValueError:
+            return False
+
+    def append(self, value, row: int):
+        if len(self._data) < 16 * row:
+            self._data.extend(bytes(16 * row - len(self._data)))
+        self._data.extend(NO_UUID if value is None else uuid.UUID(value).bytes)
+
+    def to_dictionary(self) -> _DictionaryColumn:
+        column = _DictionaryColumn()
+        for row in range(len(self._data) // 16):
+            column.append(_uuid_value(self._data, row), row)
+        return column
+
+    def dump(self, directory: str, name: str, count: int) -> dict:
+        if len(self._data) < 16 * count:
+            self._data.extend(bytes(16 * count - len(self._data)))
+        file_name = f"{name}.uuid"
+        with open(os.path.join(directory, file_name), "wb") as f:
+            f.write(self._data)
+        return {"file": file_name, "kind": self.kind}
+
+
+def _uuid_value(data, row: int):
+    value = bytes(data[16 * row:16 * row + 16])
+    return None if value == NO_UUID else str(uuid.UUID(bytes=value))
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a store written by ChunkStoreWriter.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") not in READABLE_VERSIONS:
+            raise ValueError(f"Unsupported chunk store version {meta.get('version')} in {path}.")
+        self._count = meta["count"]
+        self._decompressor = None
+        if meta["compression"] == "zstd":
+            _require_zstd()
+            self._decompressor = zstandard.ZstdDecompressor()
+        self._maps = []
+        self._views = []
+        self._text = self._map("text.bin", None)
+        self._offsets = self._map("offsets.u64", "Q")
+        if meta["version"] == 1:
+            # Version 1 dictionary-encoded the point IDs and every column.
+            self._ids = ("dict", self._map("ids.u32", "I"), meta["ids"])
+            self._columns = {
+                key: ("dict", self._map(column["file"], "I"), column["values"])
+                for key, column in meta["columns"].items()
+            }
+        else:
+            self._ids = self._open_column(meta["ids"])
+            self._columns = {key: self._open_column(column) for key, column in meta["columns"].items()}
+
+    def _open_column(self, column: dict):
+        """
+        (kind, data, dictionary) of a column described in meta.json.
+        """
+        typecode = {"dict": "I", "int": "q", "uuid": None}[column["kind"]]
+        return column["kind"], self._map(column["file"], typecode), column.get("values")
+
+    @staticmethod
+    def _value(column, i: int):
+        kind, data, values = column
+        if kind == "uuid":
+            return _uuid_value(data, i)
+        if kind == "int":
+            value = data[i]
+            return None if value == INT_MISSING else value
+        code = data[i]
+        return None if code == MISSING else values[code]
+
+    def _map(self, file_name: str, typecode):
+        with open(os.path.join(self.path, file_name), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                view = memoryview(b"")
+            else:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(mapped)
+                view = memoryview(mapped)
+                self._views.append(view)
+        if typecode is None:
+            return view
+        if sys.byteorder != "little":
+            # Rare big-endian hosts: fall back to a byte-swapped in-memory copy.
+            values = array(typecode, view.tobytes())
+            values.byteswap()
+            return values
+        view = view.cast(typecode)
+        self._views.append(view)
+        return view
+
+    def __len__(self):
+        return self._count
+
+    def text(self, i: int) -> str:
+        data = self._text[self._offsets[i]:self._offsets[i + 1]]
+        if self._decompressor is not None:
+            return self._decompressor.decompress(data).decode("utf-8")
+        return str(data, "utf-8")
+
+    def metadata(self, i: int) -> dict:
+        metadata = {}
+        for key, column in self._columns.items():
+            value = self._value(column, i)
+            if value is not None:
+                metadata[key] = value
+        return metadata
+
+    def point_id(self, i: int):
+        return self._value(self._ids, i)
+
+    def distinct(self, key: str) -> list:
+        """
+        The distinct values of a metadata column, e.g. every source in the store.
+        """
+        column = self._columns.get(key)
+        if column is None:
+            return []
+        kind, data, values = column
+        if kind == "dict":
+            # Every dictionary entry is referenced by at least one record.
+            return list(values)
+        return sorted({value for value in (self._value(column, i) for i in range(self._count)) if value is not None})
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.text(i), metadata=self.metadata(i))
+
+    def __getitem__(self, i: int) -> Document:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("chunk store index out of range")
+        return self.document(i)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self.document(i)
+
+    def iter_point_chunks(self):
+        """
+        Yield (point_id, Document) pairs one record at a time.
+        Records written without an ID get one derived from their source and record index.
+        """
+        for i in range(self._count):
+            doc = self.document(i)
+            point_id = self.point_id(i)
+            if point_id is None:
+                point_id = chunk_point_id(doc.metadata.get("source", self.path), f"#{i}")
+            yield point_id, doc
+
+    def iter_batches(self, batch_size: int):
+        """
+        Yield lists of (point_id, Document) pairs, at most batch_size long.
+        """
+        batch = []
+        for item in self.iter_point_chunks():
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        # Release the memoryviews (derived views first) before their backing maps.
+        self._text = self._offsets = self._ids = self._columns = None
+        for view in reversed(self._views):
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._views = []
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def is_chunk_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def iter_stored_documents(path: str):
+    """
+    Iterate over the Documents in either a chunk store directory or a legacy pickle file.
+    """
+    if is_chunk_store(path):
+        with ChunkStore(path) as store:
+            yield from store
+    else:
+        with open(path, "rb") as f:
+            yield from pickle.load(f)
+
+
+def export_pickle(store_path: str, pickle_file: str) -> int:
+    """
+    Write the store's contents as a pickled list of Documents, for tools that expect the old format.
+    """
+    with ChunkStore(store_path) as store:
+        documents = list(store)
+    with open(pickle_file, "wb") as f:
+        pickle.dump(documents, f)
+    return len(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a chunk store or export it as a pickle file.")
+    parser.add_argument("store", help="Path to the chunk store directory.")
+    parser.add_argument("--export_pickle", default=None, help="Write the store's Documents to this pickle file.")
+    parser.add_argument("--show", type=int, default=None, help="Print the record at this index.")
+    args = parser.parse_args()
+
+    with ChunkStore(args.store) as store:
+        print(f"{args.store}: {len(store)} records.")
+        if args.show is not None:
+            print(store.metadata(args.show))
+            print(store.text(args.show))
+    if args.export_pickle:
+        count = export_pickle(args.store, args.export_pickle)
+        print(f"Exported {count} records to {args.export_pickle}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Context assembly between retrieval and the LLM.
+
+Retrieved chunks are packed into as few prompt tokens as possible before the "stuff" prompt is built:
+adjacent or overlapping chunks of one file are merged (so the overlap region appears once),
+near-duplicate chunks are dropped, blank lines (and optionally full-line comments) are removed,
+and the result is cut at a token budget and/or a similarity score threshold.
+"""
+import threading
+from typing import List
+
+from langchain_core.documents import Document
+
+# Full-line comment prefixes and block comment delimiters per language key of EXTENSION_TO_LANGUAGE.
+LINE_COMMENTS = {
+    "python": ("#",),
+    "cpp": ("//",),
+    "java": ("//",),
+    "csharp": ("//",),
+    "julia": ("#",),
+    "matlab": ("%",),
+}
+BLOCK_COMMENTS = {
+    "cpp": ("/*", "*/"),
+    "java": ("/*", "*/"),
+    "csharp": ("/*", "*/"),
+    "julia": ("#=", "=#"),
+    "matlab": ("%{", "%}"),
+}
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+    """
+    Cheap token estimate for code; the Ollama tokenizer is not available before the request.
+    """
+    return int(-(-len(text) // chars_per_token))
+
+
+def _language(source: str) -> str:
+    # Imported lazily: the splitter module pulls in langchain's text splitters.
+    from src.splitter import source_language
+    return source_language(source)
+
+
+def clean_text(text: str, language: str = None, strip_comments: bool = False) -> str:
+    """
+    Drop blank lines and trailing whitespace; with strip_comments, also drop full-line and block comments.
+    Only comments that start a line are removed, so code with trailing comments is left intact.
+    """
+    line_prefixes = LINE_COMMENTS.get(language, ()) if strip_comments else ()
+    block = BLOCK_COMMENTS.get(language) if strip_comments else None
+    lines = []
+    in_block = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if in_block:
+            if block[1] in stripped:
+                in_block = False
+            continue
+        if not stripped:
+            continue
+        if block and stripped.startswith(block[0]):
+            in_block = block[1] not in stripped[len(block[0]):]
+            continue
+        if line_prefixes and stripped.startswith(line_prefixes) and not stripped.startswith("#include"):
+            continue
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def _line_set(text: str) -> frozenset:
+    return frozenset(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
+def merge_adjacent(docs: List[Document]) -> List[Document]:
+    """
+    Merge chunks of the same source whose character ranges touch or overlap.
+    Chunks without a "start_index" are left as they are. The merged chunk takes the rank of its
+    best-ranked part, so the result stays in retrieval order.
+    """
+    groups = {}
+    singles = []
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        source = doc.metadata.get("source")
+        if start is None or source is None:
+            singles.append((rank, doc))
+        else:
+            groups.setdefault(source, []).append((start, rank, doc))
+
+    merged = list(singles)
+    for source, parts in groups.items():
+        parts.sort(key=lambda part: part[0])
+        start, rank, doc = parts[0]
+        text, end, count = doc.page_content, start + len(doc.page_content), 1
+        metadata = dict(doc.metadata)
+        for next_start, next_rank, next_doc in parts[1:]:
+            next_end = next_start + len(next_doc.page_content)
+            if next_start <= end:
+                if next_end > end:
+                    text += next_doc.page_content[end - next_start:]
+                    end = next_end
+                rank = min(rank, next_rank)
+                count += 1
+                continue
+            merged.append((rank, Document(page_content=text, metadata=dict(metadata, merged_chunks=count))))
+            text, end, rank, count = next_doc.page_content, next_end, next_rank, 1
+            metadata = dict(next_doc.metadata)
+        merged.append((rank, Document(page_content=text, metadata=dict(metadata, merged_chunks=count))))
+    merged.sort(key=lambda item: item[0])
+    return [doc for _, doc in merged]
+
+
+class ContextPacker:
+    """
+    Packs retrieved Documents into a token-budgeted context and keeps running statistics
+    of how many prompt tokens packing saved.
+    """
+
+    def __init__(self, token_budget: int = 0, score_threshold: float = 0.0, strip_comments: bool = False,
+                 dedup_threshold: float = 0.9, chars_per_token: float = 4.0):
+        self.token_budget = token_budget
+        self.score_threshold = score_threshold
+        self.strip_comments = strip_comments
+        self.dedup_threshold = dedup_threshold
+        self.chars_per_token = chars_per_token
+        self.queries = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.last_report = None
+        self._lock = threading.Lock()
+
+    def _tokens(self, text: str) -> int:
+        return estimate_tokens(text, self.chars_per_token)
+
+    def pack(self, docs: List[Document]) -> List[Document]:
+        """
+        Return the packed documents, best-ranked first, within the token budget.
+        """
+        chunks_in = len(docs)
+        tokens_in = sum(self._tokens(doc.page_content) for doc in docs)
+        # Scores are only present on documents from vector search; the best hit is always kept.
+        if self.score_threshold > 0:
+            docs = [doc for i, doc in enumerate(docs)
+                    if i == 0 or doc.metadata.get("_score") is None or doc.metadata["_score"] >= self.score_threshold]
+
+        packed = []
+        kept_lines = []
+        used = 0
+        for doc in merge_adjacent(docs):
+            source = doc.metadata.get("source", "")
+            text = clean_text(doc.page_content, _language(source) if source else None, self.strip_comments)
+            if not text:
+                continue
+            lines = _line_set(text)
+            if any(_similarity(lines, kept) >= self.dedup_threshold for kept in kept_lines):
+                continue
+            tokens = self._tokens(text)
+            if self.token_budget and used + tokens > self.token_budget:
+                remaining = self.token_budget - used
+                # Keep a truncated block only if it still carries a useful amount of code.
+                if remaining < 64 and packed:
+                    break
+                text = text[:int(remaining * self.chars_per_token)].rsplit("\n", 1)[0] if remaining > 0 else ""
+                if not text:
+                    break
+                tokens = self._tokens(text)
+            packed.append(Document(page_content=text, metadata=doc.metadata))
+            kept_lines.append(lines)
+            used += tokens
+            if self.token_budget and used >= self.token_budget:
+                break
+
+        with self._lock:
+            self.queries += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += used
+            self.last_report = {"chunks_in": chunks_in, "blocks_out": len(packed),
+                                "tokens_in": tokens_in, "tokens_out": used}
+        return packed
+
+    def stats(self) -> dict:
+        saved = self.tokens_in - self.tokens_out
+        return {
+            "queries": self.queries,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_saved": saved,
+            "saved_rate": saved / self.tokens_in if self.tokens_in else 0.0,
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"context packing: {stats['tokens_saved']} of {stats['tokens_in']} estimated prompt tokens saved "
+                f"({stats['saved_rate']:.1%}) over {stats['queries']} queries")
+
+    def format_last_report(self) -> str:
+        report = self.last_report
+        if report is None:
+            return ""
+        saved = report["tokens_in"] - report["tokens_out"]
+        return (f"[context] {report['chunks_in']} chunks -> {report['blocks_out']} blocks, "
+                f"~{report['tokens_in']} -> ~{report['tokens_out']} tokens ({saved} saved)")
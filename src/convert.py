@@ -2,30 +2,64 @@
 import os
 import argparse
 from user_interface.config import config
+from src.tracing import span
 
-def convert_files_to_txt(src_dir, dst_dir, extensions=(".py", ".cpp", ".c", ".h", ".hpp", ".java", ".md", ".txt")):
-    if not os.path.exists(dst_dir):
-        os.makedirs(dst_dir)
+# Every extension with a splitter in src.splitter.EXTENSION_TO_LANGUAGE (".m" is MATLAB).
+SOURCE_EXTENSIONS = (".py", ".cpp", ".c", ".h", ".hpp", ".java", ".cs", ".jl", ".m", ".md", ".txt")
+
+
+def iter_source_files(src_dir, extensions=SOURCE_EXTENSIONS):
+    """
+    Yield the path of every file under src_dir whose name ends with one of the given extensions.
+    """
     for root, dirs, files in os.walk(src_dir):
         for file in files:
             if file.endswith(extensions):
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, src_dir)
-                new_root = os.path.join(dst_dir, os.path.dirname(rel_path))
-                os.makedirs(new_root, exist_ok=True)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = f.read()
-                except UnicodeDecodeError:
-                    try:
-                        with open(file_path, 'r', encoding='latin-1') as f:
-                            data = f.read()
-                    except UnicodeDecodeError:
-                        print("Failed to decode: " + file_path)
-                        continue
-                new_file_path = os.path.join(new_root, file + '.txt')
-                with open(new_file_path, 'w', encoding='utf-8') as f:
-                    f.write(data)
+                yield os.path.join(root, file)
+
+
+def read_source_file(file_path):
+    """
+    Read a source file as text, falling back to latin-1 when it is not valid UTF-8.
+    Returns None if the file cannot be decoded.
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        try:
+            with open(file_path, 'r', encoding='latin-1') as f:
+                return f.read()
+        except UnicodeDecodeError:
+            print("Failed to decode: " + file_path)
+            return None
+
+
+def iter_documents(file_paths):
+    """
+    Read each file lazily and yield it as a Document whose source is the file path.
+    """
+    from langchain_core.documents import Document
+    for file_path in file_paths:
+        text = read_source_file(file_path)
+        if text is None:
+            continue
+        yield Document(page_content=text, metadata={"source": file_path})
+
+
+def convert_files_to_txt(src_dir, dst_dir, extensions=SOURCE_EXTENSIONS):
+    if not os.path.exists(dst_dir):
+        os.makedirs(dst_dir)
+    for file_path in iter_source_files(src_dir, extensions):
+        rel_path = os.path.relpath(file_path, src_dir)
+        new_root = os.path.join(dst_dir, os.path.dirname(rel_path))
+        os.makedirs(new_root, exist_ok=True)
+        data = read_source_file(file_path)
+        if data is None:
+            continue
+        new_file_path = os.path.join(new_root, os.path.basename(file_path) + '.txt')
+        with open(new_file_path, 'w', encoding='utf-8') as f:
+            f.write(data)
     print("Conversion complete.")
 
 def main():
@@ -35,7 +69,8 @@ def main():
     parser.add_argument("--dst", type=str, default=config.DEFAULT_CONVERTED_PATH,
                         help="Destination directory for converted text files (default from config)")
     args = parser.parse_args()
-    convert_files_to_txt(args.src, args.dst)
+    with span("convert"):
+        convert_files_to_txt(args.src, args.dst)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed cache in front of an embedding model.
+
+Vectors are stored in SQLite as float32 blobs keyed by a hash of (model name, normalized text),
+so the same chunk is embedded once no matter how many times or into how many collections it is pushed.
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text before hashing so whitespace-only differences share one cache entry.
+    """
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed vector cache with least-recently-used eviction above max_bytes.
+    Safe to share between threads; several processes may use the same file (WAL mode).
+    """
+
+    def __init__(self, cache_file: str, max_bytes: int):
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_file, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # Running total of stored bytes; recomputed on open, then tracked as entries are added/evicted.
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> dict:
+        """
+        Return {key: vector} for the keys present in the cache and refresh their last-used time.
+        """
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = int(time.time())
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys) - set(found))
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Store {key: vector} and evict the least recently used entries if over the size cap.
+        """
+        if not items:
+            return
+        now = int(time.time())
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+            self._size_bytes += sum(len(blob) for _, blob, _ in rows)
+            if self._size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Trim to 90% of the cap so eviction does not run on every insert once the cache is full.
+        target = int(self.max_bytes * 0.9)
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        if total <= target or count == 0:
+            self._size_bytes = total
+            return
+        excess_rows = -(-(total - target) * count // total)  # ceil division by the average entry size
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess_rows,)
+        )
+        self._conn.commit()
+        self.evictions += excess_rows
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_mb": self._size_bytes / (1024 * 1024),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves vectors from an EmbeddingCache and only sends misses to the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+        # Embed each distinct missing text once, even if it appears several times in the batch.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries go through embed_query on the model (some models prefix queries differently),
+        # so they are cached under their own key space.
+        key = cache_key(self.model_name + ":query", text)
+        found = self.cache.get_many([key])
+        if key in found:
+            return found[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+    def close(self):
+        # The wrapped model may hold worker processes (EmbeddingPool); plain models have nothing to close.
+        close = getattr(self.embeddings, "close", None)
+        if close is not None:
+            close()
+        self.cache.close()
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return (f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.1%} hit rate), {stats['evictions']} evicted, {stats['size_mb']:.1f} MB.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the embedding cache.")
+    parser.add_argument("cache_file", help="Path to the SQLite cache file.")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached vector.")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.cache_file)
+    if args.clear:
+        conn.execute("DELETE FROM embeddings")
+        conn.commit()
+        conn.execute("VACUUM")
+        print(f"Cleared {args.cache_file}.")
+    count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+    print(f"{args.cache_file}: {count} vectors, {total / (1024 * 1024):.1f} MB.")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,360 @@
 #!/usr/bin/env python3
-from langchain_huggingface import HuggingFaceEmbeddings
-from user_interface.config import config
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from langchain_core.embeddings import Embeddings
+from user_interface.config import available_cpus, config
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
 
-def get_embeddings(suppress_output: bool = False):
-    # Use the default device from config (either 'cuda' or 'cpu')
-    device = config.DEFAULT_DEVICE
+EMBEDDING_MODEL_NAME = "all-mpnet-base-v2"
+
+# Embedding backends selectable with EMBEDDING_BACKEND. The int8 variants run on CPU only and produce
+# slightly different vectors, so each backend has its own key space in the embedding cache.
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Files written by export_onnx() into a local model directory.
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from a transformer exported to ONNX (see export_onnx), run with ONNX Runtime on CPU.
+    Tokenization, pooling and normalization follow the exported sentence-transformers model.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: int = 0, batch_size: int = None):
+        # Imported here so the torch backends do not require onnxruntime.
+        import onnxruntime
+        from tokenizers import Tokenizer
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.model_config = json.load(f)
+        model_file = os.path.join(model_dir, ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"{model_file} not found; create it with "
+                                    f"'python src/embeddings.py --export-onnx {model_dir}'.")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.model_config["max_length"])
+        self.tokenizer.enable_padding()
+        self.batch_size = config.EMBED_BATCH_SIZE if batch_size is None else batch_size
+
+    def _embed_batch(self, texts: List[str]):
+        import numpy as np
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        if self.model_config["pooling"] == "cls":
+            vectors = token_embeddings[:, 0]
+        else:
+            mask = inputs["attention_mask"][:, :, None].astype(token_embeddings.dtype)
+            vectors = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.model_config["normalize"]:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0]
+
+
+def export_onnx(output_dir: str = None, model_name: str = None, quantize: bool = True):
+    """
+    Export the sentence-transformers model (default: EMBEDDING_MODEL_PATH or EMBEDDING_MODEL_NAME) to
+    output_dir (default EMBEDDING_ONNX_PATH): model.onnx (fp32), model_int8.onnx (dynamic int8 weights),
+    the tokenizer and the pooling settings OnnxEmbeddings needs.
+    Requires torch, sentence-transformers and onnxruntime.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    output_dir = output_dir or config.EMBEDDING_ONNX_PATH
+    if not output_dir:
+        raise ValueError("Pass an output directory or set EMBEDDING_ONNX_PATH.")
+    model_name = model_name or model_source()
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    os.makedirs(output_dir, exist_ok=True)
+    model.tokenizer.save_pretrained(output_dir)
+
+    sample = model.tokenizer(["def export(model): return model"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "tokens"}
+    model_file = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(transformer, tuple(sample[name] for name in input_names), model_file,
+                          input_names=input_names, output_names=["token_embeddings"],
+                          dynamic_axes=dynamic_axes, opset_version=14)
+
+    pooling = model[1].get_pooling_mode_str() if len(model) > 1 else "mean"
+    model_config = {
+        "model_name": model_name,
+        "max_length": model.max_seq_length,
+        "pooling": "cls" if pooling == "cls" else "mean",
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(model_config, f, indent=2)
+    print(f"Exported {model_name} to {model_file}.")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_file, os.path.join(output_dir, ONNX_INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+        print(f"Wrote int8 model to {os.path.join(output_dir, ONNX_INT8_MODEL_FILE)}.")
+
+
+def model_source() -> str:
+    """
+    The sentence-transformers model to load: a local directory (EMBEDDING_MODEL_PATH) or the hub name.
+    """
+    return config.EMBEDDING_MODEL_PATH or EMBEDDING_MODEL_NAME
+
+
+def embedding_model_key(backend: str = None) -> str:
+    """
+    Name under which the backend's vectors are cached; fp32 torch keeps the plain model name.
+    """
+    backend = config.EMBEDDING_BACKEND if backend is None else backend
+    if backend.startswith("onnx"):
+        return f"{config.EMBEDDING_ONNX_PATH}:{backend}"
+    return model_source() if backend == "torch" else f"{model_source()}:{backend}"
+
+
+def load_embedding_model(backend: str = None, threads: int = None, suppress_output: bool = False) -> Embeddings:
+    """
+    Build the embedding model for a backend (default EMBEDDING_BACKEND), without the cache:
+      torch       fp32 sentence-transformers on DEFAULT_DEVICE
+      torch-int8  the same model with its Linear layers dynamically quantized to int8 (CPU)
+      onnx        ONNX Runtime on CPU from the model exported to EMBEDDING_ONNX_PATH
+      onnx-int8   the exported int8 model
+    threads (default EMBEDDING_THREADS, 0 = library default) sets the intra-op thread count.
+    """
+    backend = config.EMBEDDING_BACKEND if backend is None else backend
+    threads = config.EMBEDDING_THREADS if threads is None else threads
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}' (expected one of {', '.join(EMBEDDING_BACKENDS)}).")
+
+    if backend.startswith("onnx"):
+        if not config.EMBEDDING_ONNX_PATH:
+            raise ValueError("The onnx backends need EMBEDDING_ONNX_PATH set to a model exported with "
+                             "'python src/embeddings.py --export-onnx <dir>'.")
+        if not suppress_output:
+            print(f"Using ONNX Runtime embeddings from {config.EMBEDDING_ONNX_PATH} ({backend}).")
+        return OnnxEmbeddings(config.EMBEDDING_ONNX_PATH, quantized=backend == "onnx-int8", threads=threads)
+
+    # Imported here: sentence-transformers pulls in torch, which dominates start-up time.
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if threads:
+        torch.set_num_threads(threads)
+    # Use the default device from config ('cuda' or 'cpu'; 'auto' probes torch). int8 kernels are CPU-only.
+    device = "cpu" if backend == "torch-int8" else config.resolve_device()
     if not suppress_output:
-        print(f"Using device: {device}")
+        print(f"Using device: {device} ({backend})")
     embeddings = HuggingFaceEmbeddings(
         #model_name="BAAI/bge-base-en-v1.5",
-        model_name="all-mpnet-base-v2",
+        model_name=model_source(),
         #TODO: use https://huggingface.co/microsoft/unixcoder-base
-        model_kwargs={"device": device}
+        model_kwargs={"device": device},
+        encode_kwargs={"batch_size": config.EMBED_BATCH_SIZE}
     )
+    if backend == "torch-int8":
+        # Weights of every Linear layer become int8; activations are quantized per batch at run time.
+        torch.quantization.quantize_dynamic(embeddings._client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embeddings
+
+
+def embedding_workers(workers: int = None, backend: str = None) -> int:
+    """
+    Resolve a worker count (default EMBEDDING_WORKERS); 0 means one per CPU core available to this process.
+    The fp32 torch backend on a GPU always runs in-process.
+    """
+    workers = config.EMBEDDING_WORKERS if workers is None else workers
+    if workers <= 0:
+        workers = available_cpus()
+    backend = config.EMBEDDING_BACKEND if backend is None else backend
+    if workers > 1 and backend == "torch" and config.resolve_device() != "cpu":
+        print("EMBEDDING_WORKERS is ignored on a GPU; embedding in-process.")
+        return 1
+    return workers
+
+
+# Per-process state of an embedding worker, built once by _init_embedding_worker.
+_worker_state = {}
+
+
+def _init_embedding_worker(app_config, backend, threads):
+    # Spawned workers would otherwise load config.ini instead of the parent's (possibly overridden) config.
+    config._set(app_config)
+    # Set before torch or onnxruntime is imported, so their thread pools only use this worker's share of cores.
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    _worker_state["embeddings"] = load_embedding_model(backend, threads=threads, suppress_output=True)
+
+
+def _embed_task(texts):
+    import numpy as np
+    # A float32 array pickles as one buffer, far cheaper than nested lists of Python floats.
+    return np.asarray(_worker_state["embeddings"].embed_documents(texts), dtype=np.float32)
+
+
+class EmbeddingPool(Embeddings):
+    """
+    Embeddings computed by a pool of worker processes that each load the model once.
+    embed_documents() sorts the texts by length, deals them out to the workers in batches of at most
+    EMBED_BATCH_SIZE and returns the vectors in input order. Each worker gets EMBEDDING_THREADS intra-op
+    threads, or an equal share of the cores when that is 0. The pool starts on the first embed_documents()
+    call; embed_query() runs in this process on a model loaded on first use. The query engine asks
+    get_embeddings() for a single worker, so query processes never hold a pool.
+    """
+
+    def __init__(self, workers: int, backend: str = None, threads: int = None, batch_size: int = None,
+                 suppress_output: bool = False):
+        self.workers = workers
+        self.backend = config.EMBEDDING_BACKEND if backend is None else backend
+        threads = config.EMBEDDING_THREADS if threads is None else threads
+        self.threads = threads or max(1, available_cpus() // workers)
+        self.batch_size = config.EMBED_BATCH_SIZE if batch_size is None else batch_size
+        self.suppress_output = suppress_output
+        self._pool = None
+        self._query_model = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                if not self.suppress_output:
+                    print(f"Starting {self.workers} embedding workers ({self.backend}, {self.threads} threads each).")
+                # Spawned rather than forked: a fork of a process that already runs torch threads can hang.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_embedding_worker,
+                    initargs=(config._get(), self.backend, self.threads)
+                )
+            return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        # Smaller batches when there are too few texts to give every worker a full one.
+        batch_size = max(1, min(self.batch_size, -(-len(texts) // self.workers)))
+        shards = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+        pool = self._get_pool()
+        # Longest batches are submitted first, so the tail of the call is made of short, quick batches.
+        futures = [pool.submit(_embed_task, [texts[i] for i in shard]) for shard in shards]
+        vectors = [None] * len(texts)
+        for shard, future in zip(shards, futures):
+            for i, vector in zip(shard, future.result().tolist()):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            if self._query_model is None:
+                self._query_model = load_embedding_model(self.backend, suppress_output=self.suppress_output)
+        return self._query_model.embed_query(text)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+def get_embeddings(suppress_output: bool = False, use_cache: bool = None, backend: str = None,
+                   workers: int = None):
+    workers = embedding_workers(workers, backend)
+    if workers > 1:
+        embeddings = EmbeddingPool(workers, backend, suppress_output=suppress_output)
+    else:
+        embeddings = load_embedding_model(backend, suppress_output=suppress_output)
+    if use_cache is None:
+        use_cache = config.EMBEDDING_CACHE_ENABLED
+    if use_cache:
+        # Serve previously computed vectors from the on-disk cache; only misses reach the model.
+        cache = EmbeddingCache(config.DEFAULT_EMBEDDING_CACHE_FILE, config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024)
+        embeddings = CachedEmbeddings(embeddings, embedding_model_key(backend), cache)
     return embeddings
 
+def embed_documents_bucketed(embeddings, texts, batch_size: int = None):
+    """
+    Embed texts in batches of similar length to minimize padding, then return the vectors in the
+    original order. Character length is used as a cheap proxy for token length.
+    """
+    model = embeddings.embeddings if isinstance(embeddings, CachedEmbeddings) else embeddings
+    if isinstance(model, EmbeddingPool):
+        # The pool sorts and batches the texts itself; one call lets it keep every worker busy.
+        return embeddings.embed_documents(texts)
+    if batch_size is None:
+        batch_size = config.EMBED_BATCH_SIZE
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    vectors = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        for i, vector in zip(indices, embeddings.embed_documents([texts[i] for i in indices])):
+            vectors[i] = vector
+    return vectors
+
+def print_cache_stats(embeddings):
+    """
+    Print hit/miss statistics if the embeddings are backed by the cache.
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        print(embeddings.format_stats())
+
+def close_embeddings(embeddings):
+    """
+    Release what get_embeddings() opened: the worker processes of an EmbeddingPool and the cache file.
+    """
+    close = getattr(embeddings, "close", None)
+    if close is not None:
+        close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed a sample query, or export the model to ONNX.")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default=None,
+                        help="Embedding backend (default from config).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Embedding worker processes (default from config).")
+    parser.add_argument("--export-onnx", metavar="DIR", nargs="?", const="", default=None,
+                        help="Export the embedding model (fp32 and int8) for the onnx backends to DIR "
+                             "(default EMBEDDING_ONNX_PATH).")
+    parser.add_argument("--no-quantize", action="store_true",
+                        help="With --export-onnx, skip writing the int8 model.")
+    args = parser.parse_args()
+
+    if args.export_onnx is not None:
+        export_onnx(args.export_onnx or None, quantize=not args.no_quantize)
+        return
+    emb = get_embeddings(backend=args.backend, workers=args.workers)
+    try:
+        test_vec = emb.embed_query("Sample query for testing embeddings.")
+        print("Sample embedding vector:", test_vec)
+        print_cache_stats(emb)
+    finally:
+        close_embeddings(emb)
+
 if __name__ == "__main__":
-    emb = get_embeddings()
-    test_vec = emb.embed_query("Sample query for testing embeddings.")
-    print("Sample embedding vector:", test_vec)
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Federated search: answer one query from several Qdrant collections (e.g. one per service repo).
+
+Collections are given as a list or a comma-separated string of names and glob patterns ("svc-*").
+The query is embedded once, every collection is searched concurrently through its own QueryEngine
+retriever (so symbol lookup and the result cache still apply per collection) and the hits are merged
+into a single top-k by similarity score before the prompt is built. A collection that does not answer
+within FEDERATED_SEARCH_TIMEOUT seconds is left out of that query instead of stalling it.
+"""
+import asyncio
+import contextvars
+import fnmatch
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List
+from user_interface.config import config
+from src.query_engine import QueryEngine
+from src.tracing import span
+
+_GLOB_CHARS = "*?["
+
+
+def split_collections(collections) -> List[str]:
+    if isinstance(collections, str):
+        collections = collections.split(",")
+    return [name.strip() for name in collections if name and name.strip()]
+
+
+def is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in _GLOB_CHARS)
+
+
+def resolve_collections(client, collections) -> List[str]:
+    """
+    Expand names and glob patterns into collection names, in the given order and without duplicates.
+    Globs are matched against the collections on the server; plain names are kept as they are.
+    """
+    available = None
+    resolved = []
+    for pattern in split_collections(collections):
+        if is_glob(pattern):
+            if available is None:
+                available = sorted(collection.name for collection in client.get_collections().collections)
+            matches = fnmatch.filter(available, pattern)
+        else:
+            matches = [pattern]
+        resolved.extend(name for name in matches if name not in resolved)
+    if not resolved:
+        raise ValueError(f"No collection matches '{collections}'.")
+    return resolved
+
+
+def merge_results(results: List[list], k: int) -> list:
+    """
+    Merge per-collection results into one top-k list by descending similarity score.
+    Chunks without a score (symbol hits fetched by ID) are exact matches and rank first.
+    """
+    docs = [doc for result in results for doc in result]
+    # Stable sort: ties keep each collection's own order.
+    docs.sort(key=lambda doc: -doc.metadata.get("_score", float("inf")))
+    return docs[:k]
+
+
+def _count(search: dict, status: str) -> int:
+    return sum(1 for result in search.values() if result["status"] == status)
+
+
+def get_engine(host: str, port: int, collections, model: str, suppress_output: bool = False) -> QueryEngine:
+    """
+    The engine for a collection spec: a QueryEngine for a single collection name, otherwise a
+    FederatedQueryEngine over every collection the names and globs resolve to.
+    """
+    patterns = split_collections(collections)
+    if len(patterns) == 1 and not is_glob(patterns[0]):
+        return QueryEngine.get(host, port, patterns[0], model, suppress_output=suppress_output)
+    names = resolve_collections(QueryEngine._shared_client(host, int(port)), patterns)
+    if len(names) == 1:
+        return QueryEngine.get(host, port, names[0], model, suppress_output=suppress_output)
+    return FederatedQueryEngine.get(host, port, names, model, suppress_output=suppress_output)
+
+
+class FederatedQueryEngine(QueryEngine):
+    """
+    A QueryEngine over several collections. ask(), stream(), aask() and astream() work as for a single
+    collection; only retrieval fans out. Each collection is served by its shared QueryEngine, so the
+    embedding model, Qdrant client and caches are reused. last_search holds the status, latency and
+    number of chunks of each collection for the most recently finished query; it is replaced as a whole,
+    never updated in place, since one engine serves concurrent requests.
+    """
+
+    _engines = {}
+    _lock = threading.Lock()
+    _executor = None
+
+    def __init__(self, host: str, port: int, collection_names: List[str], model: str,
+                 suppress_output: bool = False, timeout: float = None):
+        self.engines = [QueryEngine.get(host, port, name, model, suppress_output=suppress_output)
+                        for name in collection_names]
+        first = self.engines[0]
+        self.host = host
+        self.port = port
+        self.collection_names = list(collection_names)
+        self.collection_name = ",".join(collection_names)
+        self.model = model
+        self.timeout = config.FEDERATED_SEARCH_TIMEOUT if timeout is None else timeout
+        self.k = config.RETRIEVER_K
+        # Every engine shares the embeddings, result cache, LLM and prompt; stats and prompts use the first.
+        self.embeddings = first.embeddings
+        self.client = first.client
+        self.retriever = first.retriever
+        self.symbol_retriever = first.symbol_retriever
+        self.packer = first.packer
+        self.llm = first.llm
+        self.qa_chain = first.qa_chain
+        self.last_search = {}
+
+    @classmethod
+    def get(cls, host: str, port: int, collection_names: List[str], model: str,
+            suppress_output: bool = False) -> "FederatedQueryEngine":
+        key = (host, int(port), tuple(collection_names), model)
+        with cls._lock:
+            engine = cls._engines.get(key)
+            if engine is None:
+                engine = cls._engines[key] = cls(host, int(port), collection_names, model, suppress_output)
+            return engine
+
+    @classmethod
+    def release_clients(cls):
+        with cls._lock:
+            cls._engines.clear()
+        QueryEngine.release_clients()
+
+    @classmethod
+    def _pool(cls) -> ThreadPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="federated-search")
+            return cls._executor
+
+    @staticmethod
+    def _search_one(engine: QueryEngine, query: str, query_filter):
+        started = time.perf_counter()
+        with span("collection_search", collection=engine.collection_name) as current:
+            docs = engine.retriever.invoke(query, query_filter=query_filter)
+            current.set(chunks=len(docs))
+        return docs, time.perf_counter() - started
+
+    @staticmethod
+    async def _asearch_one(engine: QueryEngine, query: str, query_filter):
+        started = time.perf_counter()
+        with span("collection_search", collection=engine.collection_name) as current:
+            docs = await engine.retriever.ainvoke(query, query_filter=query_filter)
+            current.set(chunks=len(docs))
+        return docs, time.perf_counter() - started
+
+    def _merge(self, outcomes):
+        """
+        Merge (collection name, (docs, seconds) | exception) outcomes.
+        Returns the merged docs and this query's per-collection status, which is then published as last_search.
+        """
+        results = []
+        search = {}
+        for name, outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                status = "timeout" if isinstance(outcome, (TimeoutError, asyncio.TimeoutError)) else f"error: {outcome}"
+                search[name] = {"status": status}
+                continue
+            docs, seconds = outcome
+            search[name] = {"status": "ok", "seconds": seconds, "chunks": len(docs)}
+            results.append(docs)
+        self.last_search = search
+        return merge_results(results, self.k), search
+
+    def retrieve(self, query: str, query_filter=None):
+        with span("retrieve", collections=len(self.engines), filtered=query_filter is not None) as current:
+            # Embedded once here; the per-collection searches hit the shared query embedding cache.
+            with span("embed_query"):
+                self.embeddings.embed_query(query)
+            pool = self._pool()
+            # Each search runs in a copy of this context, so its spans nest under this retrieve span.
+            futures = [pool.submit(contextvars.copy_context().run, self._search_one, engine, query, query_filter)
+                       for engine in self.engines]
+            wait(futures, timeout=self.timeout or None)
+            outcomes = []
+            for engine, future in zip(self.engines, futures):
+                # A timed-out search keeps running in its thread, but this query no longer waits for it.
+                if not future.done():
+                    outcome = TimeoutError()
+                else:
+                    outcome = future.exception() or future.result()
+                outcomes.append((engine.collection_name, outcome))
+            docs, search = self._merge(outcomes)
+            current.set(chunks=len(docs), timeouts=_count(search, "timeout"))
+        return self._pack(docs)
+
+    async def aretrieve(self, query: str, query_filter=None):
+        with span("retrieve", collections=len(self.engines), filtered=query_filter is not None) as current:
+            with span("embed_query"):
+                await asyncio.to_thread(self.embeddings.embed_query, query)
+            timeout = self.timeout or None
+            results = await asyncio.gather(
+                *(asyncio.wait_for(self._asearch_one(engine, query, query_filter), timeout)
+                  for engine in self.engines),
+                return_exceptions=True
+            )
+            docs, search = self._merge(list(zip(self.collection_names, results)))
+            current.set(chunks=len(docs), timeouts=_count(search, "timeout"))
+        return self._pack(docs)
+
+    def format_last_search(self, search: dict = None) -> str:
+        """
+        One line per collection with the latency and chunk count of the last query (or of search).
+        """
+        search = self.last_search if search is None else search
+        lines = []
+        for name, result in search.items():
+            if result["status"] == "ok":
+                lines.append(f"{name}: {result['seconds'] * 1000:.0f} ms, {result['chunks']} chunks")
+            else:
+                lines.append(f"{name}: {result['status']}")
+        return "\n".join(lines)
+
+    def format_cache_stats(self) -> str:
+        stats = super().format_cache_stats()
+        search = self.last_search
+        return f"{stats}\n{self.format_last_search(search)}" if search else stats
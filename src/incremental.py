@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+import argparse
+import os
+from user_interface.config import config
+from src.convert import SOURCE_EXTENSIONS, iter_source_files
+from src.embeddings import close_embeddings, get_embeddings, print_cache_stats
+from src.manifest import FileManifest
+from src.pipeline import ingest_files
+from src.push_to_qdrant import delete_points_for_sources, ensure_collection
+from src.qdrant_utils import get_qdrant_client
+from src.query_cache import bump_collection_version
+from src.splitter import build_splitters
+from src.symbol_index import SymbolIndex
+from src.tracing import span
+
+
+def apply_changes(client, collection_name: str, embeddings, splitters, symbol_index, manifest: FileManifest,
+                  codebase_path: str, current: dict, changed, removed, files_per_batch: int = 200) -> int:
+    """
+    Delete the points of removed files and re-index changed files in batches of files_per_batch,
+    saving the manifest after each step so an interrupted run resumes where it stopped.
+    current holds the scanned manifest entries of (at least) the changed files.
+    Returns the number of chunks upserted.
+    """
+    if removed:
+        removed_sources = [os.path.join(codebase_path, rel_path) for rel_path in removed]
+        with span("delete_points", files=len(removed_sources)):
+            delete_points_for_sources(client, collection_name, removed_sources)
+        if symbol_index is not None:
+            symbol_index.remove_sources(removed_sources)
+        for rel_path in removed:
+            manifest.entries.pop(rel_path, None)
+        manifest.save()
+        print(f"Deleted points of {len(removed)} removed files.")
+
+    pushed_chunks = 0
+    for i in range(0, len(changed), files_per_batch):
+        batch = changed[i:i + files_per_batch]
+        sources = [os.path.join(codebase_path, rel_path) for rel_path in batch]
+        # Drop the old chunks first: a file that shrank produces fewer chunks than before.
+        with span("delete_points", files=len(sources)):
+            delete_points_for_sources(client, collection_name, sources)
+
+        pushed_chunks += ingest_files(sources, client, collection_name, embeddings, splitters,
+                                      symbol_index=symbol_index, codebase_root=codebase_path)
+        if symbol_index is not None:
+            symbol_index.flush()
+
+        # Record progress per batch so an interrupted run resumes where it stopped.
+        for rel_path in batch:
+            manifest.entries[rel_path] = current[rel_path]
+        manifest.save()
+        print(f"Re-indexed {min(i + files_per_batch, len(changed))}/{len(changed)} changed files.")
+    return pushed_chunks
+
+
+def reindex_incremental(
+    codebase_path: str,
+    collection_name: str,
+    manifest_file: str,
+    host: str = None,
+    port: int = None,
+    chunk_size: int = None,
+    chunk_overlap: int = None,
+    language_splitting: bool = None,
+    files_per_batch: int = 200,
+    rebuild: bool = False
+):
+    """
+    Bring a collection up to date with the codebase by re-indexing only what changed:
+    files whose content hash differs from the manifest are re-split, re-embedded and upserted,
+    and points belonging to deleted files are removed from the collection.
+    With rebuild=True every file is re-indexed; files deleted since the last run are still removed.
+    """
+    host = config.DEFAULT_QDRANT_HOST if host is None else host
+    port = config.DEFAULT_QDRANT_PORT if port is None else port
+    chunk_size = config.CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    if language_splitting is None:
+        language_splitting = config.LANGUAGE_AWARE_SPLITTING
+
+    with span("reindex", collection=collection_name) as trace:
+        codebase_path = os.path.abspath(codebase_path)
+        # The stored manifest is loaded even for a rebuild: it is the only record of files deleted since.
+        manifest = FileManifest(manifest_file).load()
+        with span("scan"):
+            current = manifest.scan(codebase_path, iter_source_files(codebase_path, SOURCE_EXTENSIONS))
+            changed, removed = manifest.diff(current)
+        if rebuild:
+            changed = sorted(current)
+        trace.set(changed=len(changed), removed=len(removed))
+        print(f"Scanned {len(current)} files: {len(changed)} new or changed, {len(removed)} removed.")
+        if not changed and not removed:
+            print(f"Collection '{collection_name}' is already up to date.")
+            return
+
+        with span("load_embeddings"):
+            embeddings = get_embeddings()
+        try:
+            client = get_qdrant_client(host, port)
+            ensure_collection(client, collection_name, embeddings)
+            splitters = build_splitters(chunk_size, chunk_overlap, language_splitting)
+            symbol_index = SymbolIndex(config.DEFAULT_SYMBOL_INDEX_FILE) if config.SYMBOL_INDEX_ENABLED else None
+
+            pushed_chunks = apply_changes(client, collection_name, embeddings, splitters, symbol_index, manifest,
+                                          codebase_path, current, changed, removed, files_per_batch)
+
+            if symbol_index is not None:
+                symbol_index.close()
+            print(f"Upserted {pushed_chunks} chunks from {len(changed)} files into collection '{collection_name}' on {host}:{port}.")
+            # Invalidate cached query results for this collection.
+            bump_collection_version(collection_name)
+            print_cache_stats(embeddings)
+        finally:
+            close_embeddings(embeddings)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Incrementally re-index the codebase: only changed files are re-embedded and upserted."
+    )
+    parser.add_argument("--src", default=config.DEFAULT_CODEBASE_PATH,
+                        help="Codebase directory (default from config).")
+    parser.add_argument("--collection_name", default=config.DEFAULT_COLLECTION_NAME,
+                        help="Name of the collection (default from config).")
+    parser.add_argument("--manifest", default=config.DEFAULT_MANIFEST_FILE,
+                        help="Path to the file-hash manifest (default from config).")
+    parser.add_argument("--host", default=None, help="Qdrant server host (default from config).")
+    parser.add_argument("--port", type=int, default=None, help="Qdrant server port (default from config).")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Re-index every file, not only the changed ones.")
+    args = parser.parse_args()
+
+    reindex_incremental(
+        args.src,
+        collection_name=args.collection_name,
+        manifest_file=args.manifest,
+        host=args.host,
+        port=args.port,
+        rebuild=args.rebuild
+    )
+
+
+if __name__ == "__main__":
+    main()
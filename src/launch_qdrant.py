@@ -10,7 +10,7 @@ class QdrantManager:
     CONTAINER_ID_FILE = config.DEFAULT_CONTAINER_ID_FILE
 
     @staticmethod
-    def launch(port, storage_folder, detach=True):
+    def launch(port, storage_folder, detach=True, grpc_port=None):
         # Ensure the designated storage folder exists
         storage_folder = os.path.abspath(storage_folder)
         if not os.path.exists(storage_folder):
@@ -21,8 +21,11 @@ class QdrantManager:
         command = ["docker", "run"]
         if detach:
             command.append("-d")
+        if grpc_port is None:
+            grpc_port = config.DEFAULT_QDRANT_GRPC_PORT
         command.extend([
             "-p", f"{port}:6333",
+            "-p", f"{grpc_port}:6334",
             "-v", f"{storage_folder}:/qdrant/storage",
             "qdrant/qdrant"
         ])
@@ -93,6 +96,12 @@ def parse_args():
         default=config.DEFAULT_QDRANT_PORT,
         help=f"Qdrant host port (default: {config.DEFAULT_QDRANT_PORT})"
     )
+    launch_parser.add_argument(
+        "--grpc-port",
+        type=int,
+        default=config.DEFAULT_QDRANT_GRPC_PORT,
+        help=f"Qdrant gRPC host port (default: {config.DEFAULT_QDRANT_GRPC_PORT})"
+    )
     launch_parser.add_argument(
         "--storage-folder",
         type=str,
@@ -112,6 +121,6 @@ def parse_args():
 if __name__ == "__main__":
     args = parse_args()
     if args.command == "launch":
-        QdrantManager.launch(args.port, args.storage_folder, detach=args.detach)
+        QdrantManager.launch(args.port, args.storage_folder, detach=args.detach, grpc_port=args.grpc_port)
     elif args.command == "kill":
         QdrantManager.kill()
@@ -7,15 +7,51 @@ import requests
 import subprocess
 import time
 import signal
+import threading
 import psutil
-from typing import Optional, List
+from typing import AsyncIterator, Iterator, Optional, List
 
 from langchain.llms.base import LLM
+from langchain_core.outputs import GenerationChunk
 from pydantic import Field, PrivateAttr, model_validator
 from user_interface.config import config
+from src.tracing import record_ollama_response
 import ollama
 
 
+def ollama_base_url() -> str:
+    """
+    The configured Ollama host as a URL; a bare "host:port" gets an http:// scheme.
+    """
+    host = config.DEFAULT_OLLAMA_HOST.rstrip("/")
+    return host if "://" in host else f"http://{host}"
+
+
+def ollama_server_ready(timeout: float = 1.0) -> bool:
+    """
+    Return True if an Ollama server answers on the configured host.
+    """
+    try:
+        return requests.get(f"{ollama_base_url()}/api/version", timeout=timeout).ok
+    except requests.RequestException:
+        return False
+
+
+def wait_for_ollama_server(timeout: float, initial_delay: float = 0.05, max_delay: float = 1.0) -> bool:
+    """
+    Poll the server with exponential backoff until it answers or timeout seconds have passed.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if ollama_server_ready():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
 
 def kill_process_tree(pid, sig=signal.SIGTERM):
     try:
@@ -42,6 +78,10 @@ class OllamaLLM(LLM):
     _suppress_print: bool = False
     # Private attribute to hold the server process
     _server_process: Optional[subprocess.Popen] = PrivateAttr(None)
+    # Ollama clients for the configured host; the async one is created on first async use
+    # so it binds to the running event loop
+    _client: Optional[ollama.Client] = PrivateAttr(None)
+    _async_client: Optional[ollama.AsyncClient] = PrivateAttr(None)
 
     @model_validator(mode="after")
     def print_model(self) -> "OllamaLLM":
@@ -49,10 +89,60 @@ class OllamaLLM(LLM):
             print(f"OllamaLLM instance created with model: {self.model}")
         return self
 
+    def _get_client(self) -> ollama.Client:
+        if self._client is None:
+            self._client = ollama.Client(host=ollama_base_url())
+        return self._client
+
     def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
-        response = ollama.generate(model=self.model, prompt=prompt)
+        response = self._get_client().generate(model=self.model, prompt=prompt, keep_alive=config.OLLAMA_KEEP_ALIVE)
+        record_ollama_response(response)
+        return response.get('response', '').strip()
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[GenerationChunk]:
+        """
+        Yield the completion token by token as Ollama produces it.
+        """
+        options = {"stop": stop} if stop else None
+        parts = self._get_client().generate(model=self.model, prompt=prompt, stream=True, options=options,
+                                            keep_alive=config.OLLAMA_KEEP_ALIVE)
+        for part in parts:
+            # The last part carries the token counts and durations of the whole generation.
+            if part.get('done'):
+                record_ollama_response(part)
+            chunk = GenerationChunk(text=part.get('response', ''))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _get_async_client(self) -> ollama.AsyncClient:
+        if self._async_client is None:
+            self._async_client = ollama.AsyncClient(host=ollama_base_url())
+        return self._async_client
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        options = {"stop": stop} if stop else None
+        response = await self._get_async_client().generate(model=self.model, prompt=prompt, options=options,
+                                                           keep_alive=config.OLLAMA_KEEP_ALIVE)
+        record_ollama_response(response)
         return response.get('response', '').strip()
 
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs) -> AsyncIterator[GenerationChunk]:
+        """
+        Async counterpart of _stream, so generation does not block the event loop.
+        """
+        options = {"stop": stop} if stop else None
+        parts = await self._get_async_client().generate(model=self.model, prompt=prompt, stream=True, options=options,
+                                                        keep_alive=config.OLLAMA_KEEP_ALIVE)
+        async for part in parts:
+            if part.get('done'):
+                record_ollama_response(part)
+            chunk = GenerationChunk(text=part.get('response', ''))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
     @property
     def _identifying_params(self):
         return {"model": self.model}
@@ -66,7 +156,9 @@ class OllamaLLM(LLM):
         """
         Returns the singleton instance of OllamaLLM.
         If no instance exists, it is created using the provided model (or the default from config).
-        If start_server is True, it will start the Ollama server in a separate process group.
+        If start_server is True, it reuses a server already listening on DEFAULT_OLLAMA_HOST, or starts
+        one in a separate process group and waits until it answers. The model is then prewarmed in the
+        background so the first query does not pay for loading it.
         """
         if not hasattr(cls, "_instance") or cls._instance is None:
             if model is None:
@@ -74,17 +166,23 @@ class OllamaLLM(LLM):
             cls._suppress_print = not verbose
             instance = cls(model=model)
             if start_server:
-                print("Starting Ollama server...")
-                instance._server_process = subprocess.Popen(
-                    ["ollama", "serve"],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    preexec_fn=os.setsid  # Start in a new process group
-                )
-                # Allow the server time to start
-                time.sleep(5)
-                # Register cleanup handler to terminate the process group on exit.
+                if ollama_server_ready():
+                    print(f"Reusing Ollama server at {ollama_base_url()}.")
+                else:
+                    print("Starting Ollama server...")
+                    instance._server_process = subprocess.Popen(
+                        ["ollama", "serve"],
+                        # Nobody reads the server's output; a full pipe would eventually block it.
+                        stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL,
+                        preexec_fn=os.setsid  # Start in a new process group
+                    )
+                    # Wait only until the server answers, not a fixed amount of time.
+                    if not wait_for_ollama_server(config.OLLAMA_STARTUP_TIMEOUT):
+                        print(f"Ollama server did not answer within {config.OLLAMA_STARTUP_TIMEOUT}s.")
+                # Register cleanup handler to unload the model and terminate our server (if any) on exit.
                 atexit.register(cls.cleanup_instance)
+                instance.prewarm(background=True)
             cls._instance = instance
         return cls._instance
 
@@ -92,13 +190,30 @@ class OllamaLLM(LLM):
     def get_llm(cls, model: Optional[str] = None, verbose: bool = True, start_server: bool = True):
         return cls.get_instance(model=model, verbose=verbose, start_server=start_server)
 
+    def prewarm(self, background: bool = False):
+        """
+        Load the model into the server with keep_alive, so the first real query lands on a loaded model.
+        A generate request without a prompt only loads the model.
+        """
+        def load():
+            try:
+                self._get_client().generate(model=self.model, keep_alive=config.OLLAMA_KEEP_ALIVE)
+                if not getattr(self.__class__, "_suppress_print", False):
+                    print(f"Model {self.model} loaded (keep_alive={config.OLLAMA_KEEP_ALIVE}).")
+            except Exception as e:
+                print(f"Error prewarming model {self.model}:", e)
+
+        if background:
+            threading.Thread(target=load, daemon=True).start()
+        else:
+            load()
+
     def unload_model(self) -> bool:
         """
         Instructs the Ollama server to unload this model by setting keep_alive to 0.
         Returns True if the request was successful.
         """
-        host_url = config.DEFAULT_OLLAMA_HOST
-        url = f"{host_url}/api/generate"
+        url = f"{ollama_base_url()}/api/generate"
         payload = {"model": self.model, "keep_alive": 0}
         try:
             response = requests.post(url, json=payload)
@@ -149,8 +264,10 @@ if __name__ == "__main__":
         OllamaLLM.list_installed_llms()
     elif args.prompt:
         llm = OllamaLLM.get_llm(args.model, verbose=not args.quiet)
-        response = llm.invoke(args.prompt)
-        print("Response:", response)
+        print("Response: ", end="", flush=True)
+        for token in llm.stream(args.prompt):
+            print(token, end="", flush=True)
+        print()
     else:
         parser.print_help()
     OllamaLLM.cleanup_instance()
\ No newline at end of file
@@ -1,27 +1,34 @@
 #!/usr/bin/env python3
 import argparse
-import pickle
 from user_interface.config import config
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from src.chunk_store import ChunkStoreWriter, export_pickle
+from src.convert import iter_documents, iter_source_files
+from src.tracing import span
 
-def load_documents(src_dir, output_file):
-    # Use glob to only load .txt files
-    loader = DirectoryLoader(src_dir, glob="**/*.txt", show_progress=True, loader_cls=TextLoader)
-    documents = loader.load()
-    with open(output_file, "wb") as f:
-        pickle.dump(documents, f)
-    print(f"Loaded {len(documents)} documents and saved to {output_file}.")
+def load_documents(src_dir, output_store, pickle_file=None):
+    # Only load the converted .txt files; each one is written to the store as soon as it is read.
+    with ChunkStoreWriter(output_store, compression=config.CHUNK_STORE_COMPRESSION) as writer:
+        for doc in iter_documents(iter_source_files(src_dir, extensions=(".txt",))):
+            writer.add(doc.page_content, doc.metadata)
+        count = len(writer)
+    print(f"Loaded {count} documents and saved to {output_store}.")
+    if pickle_file:
+        export_pickle(output_store, pickle_file)
+        print(f"Exported documents to {pickle_file}.")
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Load documents from a directory and save to a pickle file."
+        description="Load documents from a directory and save them to a document store."
     )
     parser.add_argument("--src", type=str, default=config.DEFAULT_CONVERTED_PATH,
                         help="Source directory of converted text files (default from config)")
-    parser.add_argument("--dst", type=str, default=config.DEFAULT_DOCS_PICKLE,
-                        help="Output pickle file (default from config)")
+    parser.add_argument("--dst", type=str, default=config.DEFAULT_DOCS_STORE,
+                        help="Output document store directory (default from config)")
+    parser.add_argument("--export_pickle", type=str, default=None,
+                        help="Also write the documents to this pickle file (compatibility export)")
     args = parser.parse_args()
-    load_documents(args.src, args.dst)
+    with span("load"):
+        load_documents(args.src, args.dst, args.export_pickle)
 
 if __name__ == "__main__":
     main()
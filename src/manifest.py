@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+from typing import List
+
+
+def relative_path(path: str, root: str) -> str:
+    """
+    A path relative to the codebase root with "/" separators, as stored in the "rel_path" payload field.
+    Absolute paths outside root keep their full path, without the leading "/".
+    """
+    root = os.path.abspath(root)
+    if os.path.isabs(path):
+        abs_path = os.path.abspath(path)
+        if abs_path == root or abs_path.startswith(root + os.sep):
+            path = os.path.relpath(abs_path, root)
+    path = path.replace("\\", "/").strip("/")
+    while path.startswith("./"):
+        path = path[2:]
+    return "" if path == "." else path
+
+
+def path_prefixes(rel_path: str) -> List[str]:
+    """
+    Every ancestor directory of rel_path and rel_path itself: "src/a/b.py" -> ["src", "src/a", "src/a/b.py"].
+    """
+    parts = rel_path.split("/")
+    return ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Return the SHA-256 hex digest of a file's contents, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """
+    A JSON manifest mapping each source file (relative to the codebase root) to its
+    size, modification time and content hash.
+
+    Files whose size and mtime are unchanged since the last scan are not re-hashed,
+    so a scan of a large, mostly unchanged tree costs little more than an os.walk.
+    """
+
+    def __init__(self, manifest_file: str):
+        self.manifest_file = manifest_file
+        self.entries = {}
+
+    def load(self) -> "FileManifest":
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_file)), exist_ok=True)
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, indent=1, sort_keys=True)
+        # Atomic replace so an interrupted run never leaves a truncated manifest behind.
+        os.replace(tmp_file, self.manifest_file)
+
+    def scan(self, root: str, file_paths) -> dict:
+        """
+        Build the current manifest entries for the given files under root.
+        Hashes are reused from the stored manifest when size and mtime match.
+        """
+        current = {}
+        for file_path in file_paths:
+            rel_path = os.path.relpath(file_path, root)
+            stat = os.stat(file_path)
+            previous = self.entries.get(rel_path)
+            if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+                current[rel_path] = previous
+            else:
+                current[rel_path] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": hash_file(file_path),
+                }
+        return current
+
+    def diff(self, current: dict):
+        """
+        Compare scanned entries against the stored manifest.
+        Returns (changed, removed): relative paths that are new or whose content hash
+        changed, and relative paths that are no longer present.
+        """
+        changed = sorted(
+            rel_path for rel_path, entry in current.items()
+            if self.entries.get(rel_path, {}).get("sha256") != entry["sha256"]
+        )
+        removed = sorted(set(self.entries) - set(current))
+        return changed, removed
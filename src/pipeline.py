@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+In-process streaming ingest: discover -> read -> split -> embed -> upsert.
+
+Every stage is a generator, so at most one file's text and one batch of chunks are held in memory
+at a time, and nothing is written to disk besides the vectors in Qdrant.
+"""
+import argparse
+import os
+import time
+from user_interface.config import config
+from src.chunk_store import assign_point_ids
+from src.convert import SOURCE_EXTENSIONS, iter_documents, iter_source_files
+from src.embeddings import close_embeddings, get_embeddings, print_cache_stats
+from src.push_to_qdrant import ensure_collection, upsert_chunks
+from src.qdrant_utils import get_qdrant_client
+from src.query_cache import bump_collection_version
+from src.splitter import build_splitters, source_language, split_document
+from src.symbol_index import SymbolIndex
+from src.tracing import span
+
+
+def iter_chunks(documents, splitters, symbol_index=None):
+    """
+    Split each document as it arrives and yield (point_id, chunk) pairs.
+    With a symbol index, the identifiers each chunk defines are recorded as well.
+    """
+    for doc in documents:
+        chunks = split_document(doc, splitters)
+        point_ids = assign_point_ids(chunks)
+        if symbol_index is not None and chunks:
+            source = chunks[0].metadata["source"]
+            symbol_index.add_source(source, point_ids, chunks, source_language(source))
+        yield from zip(point_ids, chunks)
+
+
+def ingest_files(file_paths, client, collection_name: str, embeddings, splitters,
+                 batch_size: int = None, symbol_index=None, codebase_root: str = None) -> int:
+    """
+    Stream the given files through read, split, embed and upsert.
+    Payload paths are stored relative to codebase_root (default DEFAULT_CODEBASE_PATH).
+    Returns the number of chunks upserted.
+    """
+    point_chunks = iter_chunks(iter_documents(file_paths), splitters, symbol_index)
+    return upsert_chunks(client, collection_name, embeddings, point_chunks, batch_size, codebase_root)
+
+
+def ingest_codebase(
+    codebase_path: str,
+    collection_name: str,
+    host: str = None,
+    port: int = None,
+    chunk_size: int = None,
+    chunk_overlap: int = None,
+    language_splitting: bool = None,
+    batch_size: int = None
+) -> int:
+    """
+    Index a whole codebase into a collection in a single streaming pass.
+    """
+    host = config.DEFAULT_QDRANT_HOST if host is None else host
+    port = config.DEFAULT_QDRANT_PORT if port is None else port
+    chunk_size = config.CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    if language_splitting is None:
+        language_splitting = config.LANGUAGE_AWARE_SPLITTING
+
+    if not collection_name:
+        raise ValueError("You must specify a collection_name for your codebase.")
+
+    start = time.perf_counter()
+    with span("ingest", collection=collection_name) as current:
+        with span("load_embeddings"):
+            embeddings = get_embeddings()
+        try:
+            client = get_qdrant_client(host, port)
+            with span("ensure_collection"):
+                ensure_collection(client, collection_name, embeddings)
+            splitters = build_splitters(chunk_size, chunk_overlap, language_splitting)
+
+            codebase_path = os.path.abspath(codebase_path)
+            file_paths = iter_source_files(codebase_path, SOURCE_EXTENSIONS)
+            symbol_index = SymbolIndex(config.DEFAULT_SYMBOL_INDEX_FILE) if config.SYMBOL_INDEX_ENABLED else None
+            total = ingest_files(file_paths, client, collection_name, embeddings, splitters, batch_size, symbol_index,
+                                 codebase_path)
+            if symbol_index is not None:
+                symbol_index.close()
+            # Invalidate cached query results for this collection.
+            bump_collection_version(collection_name)
+            current.set(chunks=total)
+            elapsed = time.perf_counter() - start
+            print(f"Ingested {total} chunks into collection '{collection_name}' on {host}:{port} in {elapsed:.1f}s.")
+            print_cache_stats(embeddings)
+        finally:
+            # Stops embedding worker processes, which would otherwise outlive the run in the menu process.
+            close_embeddings(embeddings)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream the codebase into Qdrant in one process (read, split, embed, upsert)."
+    )
+    parser.add_argument("--src", default=config.DEFAULT_CODEBASE_PATH,
+                        help="Codebase directory (default from config).")
+    parser.add_argument("--collection_name", default=config.DEFAULT_COLLECTION_NAME,
+                        help="Name of the collection (default from config).")
+    parser.add_argument("--host", default=None, help="Qdrant server host (default from config).")
+    parser.add_argument("--port", type=int, default=None, help="Qdrant server port (default from config).")
+    parser.add_argument("--batch_size", type=int, default=config.INGEST_BATCH_SIZE,
+                        help="Chunks embedded and upserted per batch (default from config).")
+    args = parser.parse_args()
+
+    ingest_codebase(
+        args.src,
+        collection_name=args.collection_name,
+        host=args.host,
+        port=args.port,
+        batch_size=args.batch_size
+    )
+
+
+if __name__ == "__main__":
+    main()
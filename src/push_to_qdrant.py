@@ -1,13 +1,239 @@
 #!/usr/bin/env python3
 import argparse
-import pickle
+import os
+import queue
+import threading
+import time
 from user_interface.config import config
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, models
 from langchain_qdrant import QdrantVectorStore
-from src.embeddings import get_embeddings
+from src.chunk_store import ChunkStore, assign_point_ids, is_chunk_store, iter_stored_documents
+from src.embeddings import close_embeddings, embed_documents_bucketed, get_embeddings, print_cache_stats
+from src.qdrant_utils import (collection_params, ensure_payload_indexes, get_qdrant_client, is_local_mode,
+                              payload_key)
+from src.query_cache import bump_collection_version
+from src.splitter import payload_fields
+from src.tracing import add_span, span
+
+def ensure_collection(client: QdrantClient, collection_name: str, embeddings):
+    """
+    Create the collection if it does not exist yet, sized to the embedding model's output and
+    with the configured quantization, on-disk storage and HNSW settings, and make sure the
+    payload indexes used by filtered search exist.
+    """
+    try:
+        client.get_collection(collection_name=collection_name)
+        print(f"Collection '{collection_name}' exists.")
+    except Exception:
+        print(f"Collection '{collection_name}' does not exist, creating it...")
+        # Create a dummy vector to determine the dimension of embeddings.
+        dummy_vector = embeddings.embed_query("dummy")
+        vector_dim = len(dummy_vector)
+        client.create_collection(collection_name=collection_name, **collection_params(vector_dim))
+        print(f"Collection '{collection_name}' created successfully "
+              f"(quantization: {config.QDRANT_QUANTIZATION}, vectors on disk: {config.QDRANT_VECTORS_ON_DISK}).")
+    # Also added to collections created before filtered search existed.
+    ensure_payload_indexes(client, collection_name)
+
+
+def delete_points_for_sources(client: QdrantClient, collection_name: str, sources: list, batch_size: int = 256):
+    """
+    Delete every point whose metadata.source is one of the given paths.
+    """
+    for i in range(0, len(sources), batch_size):
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[
+                    models.FieldCondition(key=payload_key("source"),
+                                          match=models.MatchAny(any=sources[i:i + batch_size]))
+                ])
+            )
+        )
+
+
+def indexed_sources(client: QdrantClient, collection_name: str, batch_size: int = 1024) -> set:
+    """
+    The distinct metadata.source values of the points in a collection.
+    """
+    sources = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, limit=batch_size, offset=offset,
+                                       with_payload=[payload_key("source")], with_vectors=False)
+        for point in points:
+            source = (point.payload or {}).get(QdrantVectorStore.METADATA_KEY, {}).get("source")
+            if source is not None:
+                sources.add(source)
+        if offset is None:
+            return sources
+
+
+def delete_stale_points(client: QdrantClient, collection_name: str, sources: list, codebase_root: str = None) -> int:
+    """
+    Prepare a full push of sources: delete their existing points, since edited files get chunks at new
+    offsets (and so new IDs), and the points of files under codebase_root (default DEFAULT_CODEBASE_PATH)
+    that are no longer part of the push. Points of other roots sharing the collection are kept.
+    Returns the number of deleted files.
+    """
+    root = os.path.abspath(config.DEFAULT_CODEBASE_PATH if codebase_root is None else codebase_root)
+    pushed = {os.path.abspath(source) for source in sources}
+    removed = [source for source in indexed_sources(client, collection_name)
+               if os.path.abspath(source) not in pushed and os.path.abspath(source).startswith(root + os.sep)]
+    delete_points_for_sources(client, collection_name, list(sources) + removed)
+    return len(removed)
+
+
+class PipelinedUploader:
+    """
+    Upload point batches on background worker threads while the caller keeps embedding.
+    The queue is bounded, so at most queue_size batches wait in memory; submit() blocks when it is full.
+    """
+
+    def __init__(self, client: QdrantClient, collection_name: str, workers: int = None, queue_size: int = None):
+        self.client = client
+        self.collection_name = collection_name
+        self.uploaded = 0
+        # Summed over all workers, so it can exceed wall-clock time.
+        self.upload_seconds = 0.0
+        self._error = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=config.UPLOAD_QUEUE_SIZE if queue_size is None else queue_size)
+        workers = config.UPLOAD_WORKERS if workers is None else workers
+        if is_local_mode():
+            # The embedded store is not safe for concurrent writers; upload from a single thread.
+            workers = 1
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self):
+        while True:
+            points = self._queue.get()
+            try:
+                if points is None:
+                    return
+                # After a failure or cancel, keep draining the queue so nobody blocks on it forever.
+                if self._error is None and not self._cancelled:
+                    start = time.perf_counter()
+                    self.client.upsert(collection_name=self.collection_name, points=points)
+                    with self._lock:
+                        self.uploaded += len(points)
+                        self.upload_seconds += time.perf_counter() - start
+            except Exception as e:
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                self._queue.task_done()
+
+    def submit(self, points: list):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(points)
+
+    def close(self, cancel: bool = False):
+        """
+        Wait for every queued batch to be uploaded and re-raise the first upload error, if any.
+        With cancel=True, batches still queued are dropped and upload errors are not raised.
+        """
+        self._cancelled = cancel
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._error is not None and not cancel:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # If the producer failed (e.g. while embedding), its exception propagates instead of an upload error.
+        self.close(cancel=exc_type is not None)
+
+
+def upsert_chunks(client: QdrantClient, collection_name: str, embeddings, point_chunks, batch_size: int = None,
+                  codebase_root: str = None) -> int:
+    """
+    Embed (point_id, chunk) pairs in batches of batch_size and hand the points to a PipelinedUploader,
+    so embedding of the next batch overlaps with the upload of the previous ones.
+    Payload paths are stored relative to codebase_root (default DEFAULT_CODEBASE_PATH).
+    point_chunks may be any iterable; memory is bounded by one embedding batch plus the upload queue.
+    Returns the number of chunks upserted.
+    """
+    if batch_size is None:
+        batch_size = config.INGEST_BATCH_SIZE
+    total = 0
+    embed_seconds = 0.0
+    # Time spent waiting for point_chunks (reading and splitting upstream) and on a full upload queue.
+    produce_seconds = 0.0
+    submit_seconds = 0.0
+    start_all = time.perf_counter()
+    with PipelinedUploader(client, collection_name) as uploader:
+        produced = time.perf_counter()
+        for batch in batched(point_chunks, batch_size):
+            start = time.perf_counter()
+            produce_seconds += start - produced
+            # Length-bucketed embedding of the whole batch; vectors come back in the batch's order.
+            vectors = embed_documents_bucketed(embeddings, [doc.page_content for _, doc in batch])
+            embedded = time.perf_counter()
+            embed_seconds += embedded - start
+            points = build_points(batch, vectors, codebase_root)
+            for i in range(0, len(points), config.UPSERT_BATCH_SIZE):
+                uploader.submit(points[i:i + config.UPSERT_BATCH_SIZE])
+            total += len(batch)
+            produced = time.perf_counter()
+            submit_seconds += produced - embedded
+    elapsed = time.perf_counter() - start_all
+    # Stages overlap, so they are recorded as accumulated durations rather than one span per batch.
+    add_span("read_split", produce_seconds)
+    add_span("embed", embed_seconds, chunks=total)
+    add_span("upload_wait", submit_seconds)
+    add_span("upsert", uploader.upload_seconds, points=uploader.uploaded)
+    if total:
+        print(f"Embedded {total} chunks in {embed_seconds:.1f}s "
+              f"({total / max(embed_seconds, 1e-9):.1f} chunks/s); "
+              f"embed + upload took {elapsed:.1f}s ({total / max(elapsed, 1e-9):.1f} chunks/s).")
+    return total
+
+
+def build_points(point_chunks, vectors, codebase_root: str = None) -> list:
+    """
+    Build Qdrant points with the payload layout QdrantVectorStore reads back at query time.
+    The metadata gains the filterable payload_fields(), with paths relative to codebase_root
+    (default DEFAULT_CODEBASE_PATH).
+    """
+    return [
+        models.PointStruct(
+            id=point_id,
+            vector=vector,
+            payload={
+                QdrantVectorStore.CONTENT_KEY: doc.page_content,
+                QdrantVectorStore.METADATA_KEY: {**doc.metadata, **payload_fields(doc, codebase_root)},
+            }
+        )
+        for (point_id, doc), vector in zip(point_chunks, vectors)
+    ]
+
+
+def batched(iterable, batch_size: int):
+    """
+    Yield successive lists of at most batch_size items from any iterable.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
 def push_documents_to_qdrant(
-    pickle_file: str,
+    chunks_path: str,
     collection_name: str,
     host: str = None,
     port: int = None
@@ -20,54 +246,63 @@ def push_documents_to_qdrant(
     if not collection_name:
         raise ValueError("You must specify a collection_name for your codebase.")
 
-    # Load the pickled document chunks
-    with open(pickle_file, "rb") as f:
-        doc_chunks = pickle.load(f)
-    print(f"Loaded {len(doc_chunks)} document chunks from {pickle_file}.")
+    with span("push", collection=collection_name) as current:
+        total = _push_documents(chunks_path, collection_name, host, port)
+        current.set(chunks=total)
+
 
+def _push_documents(chunks_path: str, collection_name: str, host: str, port: int) -> int:
     # Instantiate the embedding model (using the function from embeddings.py)
-    embeddings = get_embeddings()
+    with span("load_embeddings"):
+        embeddings = get_embeddings()
+    try:
+        return _push_chunks(chunks_path, collection_name, host, port, embeddings)
+    finally:
+        close_embeddings(embeddings)
 
-    # Create a Qdrant client connecting to your Qdrant server
-    client = QdrantClient(host=host, port=port)
 
-    # Check if the collection exists; if not, create it
-    try:
-        client.get_collection(collection_name=collection_name)
-        print(f"Collection '{collection_name}' exists.")
-    except Exception:
-        print(f"Collection '{collection_name}' does not exist, creating it...")
-        # Create a dummy vector to determine the dimension of embeddings.
-        dummy_vector = embeddings.embed_query("dummy")
-        vector_dim = len(dummy_vector)
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config={"size": vector_dim, "distance": "Cosine"}
-        )
-        print(f"Collection '{collection_name}' created successfully.")
+def _delete_stale_points(client: QdrantClient, collection_name: str, sources: list):
+    with span("delete_points", files=len(sources)):
+        removed = delete_stale_points(client, collection_name, sources)
+    if removed:
+        print(f"Deleted points of {removed} files no longer in the codebase.")
 
-    # Initialize the QdrantVectorStore
-    qdrant_store = QdrantVectorStore(
-        client=client,
-        collection_name=collection_name,
-        embedding=embeddings
-    )
 
-    # Prepare texts and metadata from the document chunks
-    texts = [doc.page_content for doc in doc_chunks]
-    metadatas = [doc.metadata for doc in doc_chunks]
+def _push_chunks(chunks_path: str, collection_name: str, host: str, port: int, embeddings) -> int:
+    # Create a Qdrant client connecting to your Qdrant server (gRPC when available)
+    client = get_qdrant_client(host, port)
+
+    # Check if the collection exists; if not, create it
+    with span("ensure_collection"):
+        ensure_collection(client, collection_name, embeddings)
 
-    # Add the texts (and metadata) to the Qdrant store
-    qdrant_store.add_texts(texts=texts, metadatas=metadatas)
-    print(f"Pushed {len(doc_chunks)} document chunks to collection '{collection_name}' on {host}:{port}.")
+    # Embed and upsert in batches under deterministic IDs, after dropping the points of every pushed file
+    # (their chunks may have moved) and of files deleted from the codebase since the last push.
+    if is_chunk_store(chunks_path):
+        # Chunks are read from the memory-mapped store one batch at a time.
+        with ChunkStore(chunks_path) as store:
+            print(f"Opened chunk store {chunks_path} with {len(store)} document chunks.")
+            _delete_stale_points(client, collection_name, store.distinct("source"))
+            total = upsert_chunks(client, collection_name, embeddings, store.iter_point_chunks())
+    else:
+        # Legacy pickle of Documents.
+        doc_chunks = list(iter_stored_documents(chunks_path))
+        print(f"Loaded {len(doc_chunks)} document chunks from {chunks_path}.")
+        _delete_stale_points(client, collection_name, sorted({doc.metadata["source"] for doc in doc_chunks}))
+        total = upsert_chunks(client, collection_name, embeddings, zip(assign_point_ids(doc_chunks), doc_chunks))
+    print(f"Pushed {total} document chunks to collection '{collection_name}' on {host}:{port}.")
+    # Invalidate cached query results for this collection.
+    bump_collection_version(collection_name)
+    print_cache_stats(embeddings)
+    return total
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Push document chunks (from a pickle file) to a Qdrant collection."
+        description="Push document chunks (from a chunk store or pickle file) to a Qdrant collection."
     )
     # Use nargs="?" to make the positional argument optional.
-    parser.add_argument("pickle_file", nargs="?", default=config.DEFAULT_CHUNKS_PICKLE,
-                        help="Path to the pickle file (default from config).")
+    parser.add_argument("chunks_path", nargs="?", default=config.DEFAULT_CHUNKS_STORE,
+                        help="Path to the chunk store directory or a legacy pickle file (default from config).")
     parser.add_argument("--collection_name", default=config.DEFAULT_COLLECTION_NAME,
                         help="Name of the collection (default from config).")
     parser.add_argument("--host", default=None, help="Qdrant server host (default from config).")
@@ -75,7 +310,7 @@ def main():
 
     args = parser.parse_args()
     push_documents_to_qdrant(
-        args.pickle_file,
+        args.chunks_path,
         collection_name=args.collection_name,
         host=args.host,
         port=args.port
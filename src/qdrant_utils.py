@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+import os
+import socket
+import threading
+import time
+from typing import Any, List, Optional
+from user_interface.config import config
+from src.manifest import relative_path
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_qdrant import QdrantVectorStore
+
+
+# Embedded clients by storage path. Qdrant's local mode allows one client per folder, so each
+# process shares a single instance and other processes wait for it to be closed.
+_local_clients = {}
+_local_lock = threading.Lock()
+
+
+def is_local_mode() -> bool:
+    """
+    True when Qdrant runs embedded in this process ("local" on disk or "memory") instead of as a server.
+    """
+    return config.QDRANT_MODE in ("local", "memory")
+
+
+def _open_local_client(path: str, timeout: float) -> QdrantClient:
+    """
+    Open an embedded client on path, waiting up to timeout seconds while another process holds the folder.
+    """
+    if path == ":memory:":
+        return QdrantClient(location=":memory:")
+    os.makedirs(path, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    waiting = False
+    while True:
+        try:
+            return QdrantClient(path=path)
+        except RuntimeError as e:
+            if "already accessed" not in str(e) or time.monotonic() >= deadline:
+                raise RuntimeError(
+                    f"Local Qdrant storage '{path}' is in use by another process (CLI, GUI or ingest). "
+                    f"Close it or raise QDRANT_LOCAL_LOCK_TIMEOUT."
+                ) from e
+            if not waiting:
+                print(f"Waiting for another process to release local Qdrant storage '{path}'...")
+                waiting = True
+            time.sleep(0.5)
+
+
+def get_local_client(path: str = None) -> QdrantClient:
+    """
+    Return this process's embedded client for path (default from config), opening it on first use.
+    """
+    if path is None:
+        path = ":memory:" if config.QDRANT_MODE == "memory" else config.DEFAULT_QDRANT_LOCAL_PATH
+    with _local_lock:
+        client = _local_clients.get(path)
+        if client is None:
+            client = _local_clients[path] = _open_local_client(path, config.QDRANT_LOCAL_LOCK_TIMEOUT)
+        return client
+
+
+def close_local_clients():
+    """
+    Close the embedded clients of this process so other processes can open the storage folder.
+    In-memory collections are lost.
+    """
+    with _local_lock:
+        for client in _local_clients.values():
+            client.close()
+        _local_clients.clear()
+
+
+def grpc_port_open(host: str, grpc_port: int, timeout: float = 0.5) -> bool:
+    """
+    Return True if something accepts TCP connections on the gRPC port.
+    """
+    try:
+        with socket.create_connection((host, grpc_port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def get_qdrant_client(host: str = None, port: int = None, prefer_grpc: bool = None,
+                      grpc_port: int = None) -> QdrantClient:
+    """
+    Create a QdrantClient for the configured server.
+    gRPC is used when preferred and the server's gRPC port is reachable; otherwise HTTP.
+    In local or memory mode the process's embedded client is returned and host/port are ignored.
+    """
+    if is_local_mode():
+        return get_local_client()
+    host = config.DEFAULT_QDRANT_HOST if host is None else host
+    port = config.DEFAULT_QDRANT_PORT if port is None else port
+    prefer_grpc = config.QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc
+    grpc_port = config.DEFAULT_QDRANT_GRPC_PORT if grpc_port is None else grpc_port
+    if prefer_grpc and grpc_port_open(host, grpc_port):
+        return QdrantClient(host=host, port=port, grpc_port=grpc_port, prefer_grpc=True)
+    return QdrantClient(host=host, port=port)
+
+
+def get_async_qdrant_client(host: str = None, port: int = None, prefer_grpc: bool = None,
+                            grpc_port: int = None) -> Optional[AsyncQdrantClient]:
+    """
+    Async counterpart of get_qdrant_client(). Create it inside the event loop that will use it.
+    Returns None in local or memory mode: the embedded store allows a single client per process,
+    so async callers run the sync client in a worker thread instead.
+    """
+    if is_local_mode():
+        return None
+    host = config.DEFAULT_QDRANT_HOST if host is None else host
+    port = config.DEFAULT_QDRANT_PORT if port is None else port
+    prefer_grpc = config.QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc
+    grpc_port = config.DEFAULT_QDRANT_GRPC_PORT if grpc_port is None else grpc_port
+    if prefer_grpc and grpc_port_open(host, grpc_port):
+        return AsyncQdrantClient(host=host, port=port, grpc_port=grpc_port, prefer_grpc=True)
+    return AsyncQdrantClient(host=host, port=port)
+
+
+def collection_params(vector_dim: int, quantization: str = None, vectors_on_disk: bool = None,
+                      payload_on_disk: bool = None, hnsw_m: int = None, hnsw_ef_construct: int = None,
+                      quantization_always_ram: bool = None) -> dict:
+    """
+    Keyword arguments for create_collection(): cosine vectors of vector_dim with the configured
+    storage (on_disk vectors/payload), HNSW graph (m, ef_construct) and quantization settings.
+    """
+    quantization = config.QDRANT_QUANTIZATION if quantization is None else quantization
+    vectors_on_disk = config.QDRANT_VECTORS_ON_DISK if vectors_on_disk is None else vectors_on_disk
+    payload_on_disk = config.QDRANT_PAYLOAD_ON_DISK if payload_on_disk is None else payload_on_disk
+    hnsw_m = config.QDRANT_HNSW_M if hnsw_m is None else hnsw_m
+    hnsw_ef_construct = config.QDRANT_HNSW_EF_CONSTRUCT if hnsw_ef_construct is None else hnsw_ef_construct
+    if quantization_always_ram is None:
+        quantization_always_ram = config.QDRANT_QUANTIZATION_ALWAYS_RAM
+
+    if quantization == "scalar":
+        quantization_config = models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=quantization_always_ram))
+    elif quantization == "binary":
+        quantization_config = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=quantization_always_ram))
+    elif quantization == "none":
+        quantization_config = None
+    else:
+        raise ValueError(f"Unknown quantization '{quantization}', expected 'none', 'scalar' or 'binary'.")
+
+    return {
+        "vectors_config": models.VectorParams(size=vector_dim, distance=models.Distance.COSINE,
+                                              on_disk=vectors_on_disk),
+        "hnsw_config": models.HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct),
+        "quantization_config": quantization_config,
+        "on_disk_payload": payload_on_disk,
+    }
+
+
+# Fields stored under the payload's metadata key at ingest and indexed for filtered search.
+PAYLOAD_INDEXES = {
+    "source": models.PayloadSchemaType.KEYWORD,
+    "rel_path": models.PayloadSchemaType.KEYWORD,
+    "path_prefixes": models.PayloadSchemaType.KEYWORD,
+    "language": models.PayloadSchemaType.KEYWORD,
+    "extension": models.PayloadSchemaType.KEYWORD,
+    "symbols": models.PayloadSchemaType.KEYWORD,
+}
+
+
+def payload_key(field: str) -> str:
+    return f"{QdrantVectorStore.METADATA_KEY}.{field}"
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str):
+    """
+    Create the payload indexes filtered search relies on, leaving existing ones alone.
+    Embedded Qdrant filters by scanning and has no payload indexes.
+    """
+    if is_local_mode():
+        return
+    existing = client.get_collection(collection_name=collection_name).payload_schema or {}
+    for field, schema in PAYLOAD_INDEXES.items():
+        if payload_key(field) not in existing:
+            client.create_payload_index(collection_name=collection_name, field_name=payload_key(field),
+                                        field_schema=schema)
+
+
+def _filter_values(values) -> List[str]:
+    if values is None:
+        return []
+    if isinstance(values, str):
+        values = values.split(",")
+    return [value.strip() for value in values if value and value.strip()]
+
+
+def build_filter(path=None, language=None, extension=None, symbol=None) -> Optional[models.Filter]:
+    """
+    A Qdrant filter restricting search to chunks under the given directories or files (relative to the
+    codebase root), languages, file extensions and/or chunks defining the given symbols. Each argument
+    is a string, a comma-separated string or a list. Values of one field are OR-ed and fields are AND-ed.
+    Returns None when no filter is given.
+    """
+    paths = [relative_path(value, config.DEFAULT_CODEBASE_PATH) for value in _filter_values(path)]
+    fields = {
+        # The codebase root itself ("" or ".") matches everything.
+        "path_prefixes": [] if "" in paths else paths,
+        "language": [value.lower() for value in _filter_values(language)],
+        "extension": [value.lower().lstrip(".") for value in _filter_values(extension)],
+        "symbols": _filter_values(symbol),
+    }
+    conditions = [models.FieldCondition(key=payload_key(field), match=models.MatchAny(any=values))
+                  for field, values in fields.items() if values]
+    return models.Filter(must=conditions) if conditions else None
+
+
+def describe_filter(query_filter: Optional[models.Filter]) -> str:
+    """
+    Short "field=value|value ..." description of a build_filter() filter, for display.
+    """
+    if query_filter is None:
+        return "none"
+    return " ".join(f"{condition.key.split('.', 1)[-1]}={'|'.join(condition.match.any)}"
+                    for condition in query_filter.must)
+
+
+def search_params(hnsw_ef: int = None, quantization: str = None, rescore: bool = None,
+                  oversampling: float = None):
+    """
+    Search-time parameters: HNSW ef (0 = server default) and, for quantized collections,
+    rescoring of the oversampled candidates with the original vectors. None when nothing is set.
+    """
+    hnsw_ef = config.QDRANT_HNSW_EF if hnsw_ef is None else hnsw_ef
+    quantization = config.QDRANT_QUANTIZATION if quantization is None else quantization
+    rescore = config.QDRANT_SEARCH_RESCORE if rescore is None else rescore
+    oversampling = config.QDRANT_SEARCH_OVERSAMPLING if oversampling is None else oversampling
+    quantization_params = None
+    if quantization != "none":
+        quantization_params = models.QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+    if not hnsw_ef and quantization_params is None:
+        return None
+    return models.SearchParams(hnsw_ef=hnsw_ef or None, quantization=quantization_params)
+
+
+def points_to_documents(points, collection_name: str) -> List[Document]:
+    """
+    Convert scored points into Documents, with the same metadata QdrantVectorStore adds on retrieval.
+    """
+    docs = []
+    for point in points:
+        payload = point.payload or {}
+        metadata = dict(payload.get(QdrantVectorStore.METADATA_KEY) or {})
+        metadata["_id"] = point.id
+        metadata["_collection_name"] = collection_name
+        # Search results carry a similarity score; points fetched by ID do not.
+        if getattr(point, "score", None) is not None:
+            metadata["_score"] = point.score
+        docs.append(Document(page_content=payload.get(QdrantVectorStore.CONTENT_KEY, ""), metadata=metadata))
+    return docs
+
+
+def _in_id_order(points, ids):
+    # retrieve() does not promise to return points in the requested order.
+    by_id = {str(point.id): point for point in points}
+    return [by_id[point_id] for point_id in ids if point_id in by_id]
+
+
+def _ids_filter(ids: List[str], query_filter: models.Filter) -> models.Filter:
+    return models.Filter(must=[models.HasIdCondition(has_id=ids), query_filter])
+
+
+def retrieve_documents(client: QdrantClient, collection_name: str, ids: List[str],
+                       query_filter: models.Filter = None) -> List[Document]:
+    """
+    Fetch points by ID (in the given order) as Documents; IDs missing from the collection are skipped,
+    as are points not matching query_filter.
+    """
+    if query_filter is None:
+        points = client.retrieve(collection_name=collection_name, ids=ids, with_payload=True)
+    else:
+        points, _ = client.scroll(collection_name=collection_name, scroll_filter=_ids_filter(ids, query_filter),
+                                  limit=len(ids), with_payload=True)
+    return points_to_documents(_in_id_order(points, ids), collection_name)
+
+
+async def aretrieve_documents(client: AsyncQdrantClient, collection_name: str, ids: List[str],
+                              query_filter: models.Filter = None) -> List[Document]:
+    if query_filter is None:
+        points = await client.retrieve(collection_name=collection_name, ids=ids, with_payload=True)
+    else:
+        points, _ = await client.scroll(collection_name=collection_name,
+                                        scroll_filter=_ids_filter(ids, query_filter), limit=len(ids),
+                                        with_payload=True)
+    return points_to_documents(_in_id_order(points, ids), collection_name)
+
+
+def search_documents(client: QdrantClient, collection_name: str, vector: List[float], k: int,
+                     params: models.SearchParams = None, query_filter: models.Filter = None) -> List[Document]:
+    """
+    Top-k vector search returning Documents with their similarity score in metadata["_score"].
+    Uses the configured search_params() unless params are given. query_filter is applied by Qdrant
+    during the search, so a scoped query only visits matching points.
+    """
+    response = client.query_points(collection_name=collection_name, query=vector, limit=k, with_payload=True,
+                                   query_filter=query_filter,
+                                   search_params=search_params() if params is None else params)
+    return points_to_documents(response.points, collection_name)
+
+
+async def asearch_documents(client: AsyncQdrantClient, collection_name: str, vector: List[float],
+                            k: int, params: models.SearchParams = None,
+                            query_filter: models.Filter = None) -> List[Document]:
+    response = await client.query_points(collection_name=collection_name, query=vector, limit=k, with_payload=True,
+                                         query_filter=query_filter,
+                                         search_params=search_params() if params is None else params)
+    return points_to_documents(response.points, collection_name)
+
+
+class SearchRetriever(BaseRetriever):
+    """
+    Adapts a pair of search callables (query, query_filter -> documents) to the retriever interface.
+    A Qdrant filter can be passed as invoke(query, query_filter=...).
+    """
+
+    search: Any
+    asearch: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None, query_filter=None) -> List[Document]:
+        return self.search(query, query_filter=query_filter)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None, query_filter=None) -> List[Document]:
+        if self.asearch is None:
+            return self.search(query, query_filter=query_filter)
+        return await self.asearch(query, query_filter=query_filter)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+In-process caches for the query path: query embeddings and top-k retrieval results.
+
+Retrieval results are keyed by collection, k, normalized query text and the collection's version
+marker. Every push bumps the marker, so results cached before a re-push are never served again.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from user_interface.config import config
+from src.tracing import record
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+def collection_version_file(collection_name: str) -> str:
+    return os.path.join(config.DEFAULT_COLLECTION_VERSION_FOLDER, f"{collection_name}.version")
+
+
+def bump_collection_version(collection_name: str) -> str:
+    """
+    Write a new version marker for the collection; called after every push so cached results expire.
+    """
+    version = uuid.uuid4().hex
+    version_file = collection_version_file(collection_name)
+    os.makedirs(os.path.dirname(version_file), exist_ok=True)
+    tmp_file = version_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write(version)
+    os.replace(tmp_file, version_file)
+    return version
+
+
+def get_collection_version(collection_name: str) -> str:
+    try:
+        with open(collection_version_file(collection_name), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with hit/miss counters.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+class QueryEmbeddingCache(Embeddings):
+    """
+    Keeps recent query vectors in memory; document embedding passes straight through.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = None):
+        self.embeddings = embeddings
+        self.cache = LRUCache(config.QUERY_CACHE_SIZE if max_entries is None else max_entries)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+
+class ResultCache:
+    """
+    Top-k retrieval results keyed by (collection, version, k, normalized query, scope), where the scope
+    identifies the search filter the results were retrieved with.
+    With a cache_file, results also persist in SQLite across processes and restarts.
+    """
+
+    def __init__(self, max_entries: int = None, cache_file: str = None):
+        self.memory = LRUCache(config.QUERY_CACHE_SIZE if max_entries is None else max_entries)
+        self.disk_hits = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        if cache_file:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+            self._conn = sqlite3.connect(cache_file, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, collection TEXT NOT NULL, version TEXT NOT NULL, docs TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_collection ON results(collection)")
+            self._conn.commit()
+
+    @staticmethod
+    def _key(collection_name: str, version: str, k: int, query: str, scope: str = "") -> str:
+        parts = [collection_name, version, k, normalize_query(query)]
+        # Unfiltered keys are unchanged, so existing cache files stay valid.
+        if scope:
+            parts.append(scope)
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def get(self, collection_name: str, k: int, query: str, scope: str = "", version: str = None):
+        """
+        Cached results for the query at version (default: the collection's current version), or None.
+        """
+        if version is None:
+            version = get_collection_version(collection_name)
+        key = self._key(collection_name, version, k, query, scope)
+        docs = self.memory.get(key)
+        if docs is None and self._conn is not None:
+            with self._lock:
+                row = self._conn.execute("SELECT docs FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                docs = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.loads(row[0])]
+                self.memory.put(key, docs)
+                self.disk_hits += 1
+        return docs
+
+    def put(self, collection_name: str, k: int, query: str, docs: List[Document], scope: str = "",
+            version: str = None):
+        """
+        Store results under version. Pass the version read before retrieving: a push finishing during
+        the search must not file pre-push results under the new version.
+        """
+        current = get_collection_version(collection_name)
+        if version is None:
+            version = current
+        elif version != current:
+            # The collection changed during the search: the results are stale already, and storing them
+            # would also purge the current version's entries from disk below.
+            return
+        key = self._key(collection_name, version, k, query, scope)
+        self.memory.put(key, docs)
+        if self._conn is not None:
+            payload = json.dumps([{"page_content": d.page_content, "metadata": d.metadata} for d in docs])
+            with self._lock:
+                # Results from older versions of this collection can never be served again.
+                self._conn.execute("DELETE FROM results WHERE collection = ? AND version <> ?",
+                                   (collection_name, version))
+                self._conn.execute("INSERT OR REPLACE INTO results (key, collection, version, docs) VALUES (?, ?, ?, ?)",
+                                   (key, collection_name, version, payload))
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        return stats
+
+
+def filter_scope(query_filter) -> str:
+    """
+    Cache scope of a Qdrant filter: its canonical JSON, or "" without a filter.
+    """
+    return "" if query_filter is None else query_filter.model_dump_json(exclude_none=True)
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever that answers repeated queries from a ResultCache before searching Qdrant.
+    Results retrieved with a query_filter are cached under that filter.
+    """
+
+    retriever: BaseRetriever
+    result_cache: Any
+    collection_name: str
+    k: int
+    # Optional coroutine function (query, query_filter -> documents) used on the async path
+    # instead of retriever.ainvoke.
+    async_search: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None, query_filter=None) -> List[Document]:
+        scope = filter_scope(query_filter)
+        # Read once: the results are cached under the version the search started from.
+        version = get_collection_version(self.collection_name)
+        docs = self.result_cache.get(self.collection_name, self.k, query, scope, version)
+        record(cache_hit=docs is not None)
+        if docs is None:
+            docs = self.retriever.invoke(query, query_filter=query_filter)
+            self.result_cache.put(self.collection_name, self.k, query, docs, scope, version)
+        return docs
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None, query_filter=None) -> List[Document]:
+        scope = filter_scope(query_filter)
+        version = get_collection_version(self.collection_name)
+        docs = self.result_cache.get(self.collection_name, self.k, query, scope, version)
+        record(cache_hit=docs is not None)
+        if docs is None:
+            if self.async_search is not None:
+                docs = await self.async_search(query, query_filter=query_filter)
+            else:
+                docs = await self.retriever.ainvoke(query, query_filter=query_filter)
+            self.result_cache.put(self.collection_name, self.k, query, docs, scope, version)
+        return docs
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+import asyncio
+import threading
+import time
+from typing import AsyncIterator, Iterator
+from user_interface.config import config
+from langchain_core.prompts import format_document
+from langchain.chains import RetrievalQA
+from src.context_packer import ContextPacker
+from src.embedding_cache import CachedEmbeddings
+from src.embeddings import get_embeddings
+from src.llm import OllamaLLM
+from src.qdrant_utils import (SearchRetriever, aretrieve_documents, asearch_documents, close_local_clients,
+                              get_async_qdrant_client, get_qdrant_client, retrieve_documents, search_documents)
+from src.query_cache import CachedRetriever, QueryEmbeddingCache, ResultCache
+from src.symbol_index import SymbolIndex, SymbolRetriever
+from src.tracing import span
+
+
+class QueryEngine:
+    """
+    Long-lived query resources for one (host, port, collection, model) combination.
+
+    The embedding model, Qdrant client, vector store, retriever and RetrievalQA chain are built once
+    and reused for every query. Use QueryEngine.get() to share engines between the CLI and the GUI.
+    """
+
+    _engines = {}
+    _embeddings = None
+    _clients = {}
+    _result_cache = None
+    _symbol_index = None
+    _lock = threading.Lock()
+
+    def __init__(self, host: str, port: int, collection_name: str, model: str, suppress_output: bool = False,
+                 embeddings=None, llm=None):
+        """
+        embeddings and llm replace the shared embedding model and the Ollama LLM (benchmarks, tests).
+        """
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.model = model
+
+        # The embedding weights and the client are shared by every engine in the process.
+        if embeddings is not None:
+            self.embeddings = QueryEmbeddingCache(embeddings)
+        else:
+            self.embeddings = self._shared_embeddings(suppress_output)
+        self.client = self._shared_client(host, port)
+        # Checked here rather than through QdrantVectorStore, whose validation embeds a dummy document.
+        if not self.client.collection_exists(collection_name):
+            raise ValueError(f"Collection '{collection_name}' does not exist; push or ingest the codebase first.")
+        # Searches the client directly so results carry their similarity score for the context packer.
+        retriever = SearchRetriever(search=self._search, asearch=self._asearch)
+        async_search = self._asearch
+        # Queries naming an indexed identifier fetch its chunks by ID instead of searching vectors.
+        self.symbol_retriever = None
+        if config.SYMBOL_INDEX_ENABLED:
+            self.symbol_retriever = SymbolRetriever(
+                retriever=retriever,
+                symbol_index=self._shared_symbol_index(),
+                fetch=self._fetch,
+                afetch=self._afetch,
+                async_search=self._asearch,
+                k=config.RETRIEVER_K,
+                fuse=config.SYMBOL_INDEX_FUSION
+            )
+            retriever = self.symbol_retriever
+            async_search = self.symbol_retriever.ainvoke
+        # Repeated queries are answered from the result cache until the collection is re-pushed.
+        self.retriever = CachedRetriever(
+            retriever=retriever,
+            result_cache=self._shared_result_cache(),
+            collection_name=collection_name,
+            k=config.RETRIEVER_K,
+            async_search=async_search
+        )
+        # Created on first async query, inside the event loop that uses it.
+        self.async_client = None
+        # Merges, dedups and trims the retrieved chunks before they are stuffed into the prompt.
+        self.packer = None
+        if config.CONTEXT_PACKING_ENABLED:
+            self.packer = ContextPacker(
+                token_budget=config.CONTEXT_TOKEN_BUDGET,
+                score_threshold=config.CONTEXT_SCORE_THRESHOLD,
+                strip_comments=config.CONTEXT_STRIP_COMMENTS,
+                dedup_threshold=config.CONTEXT_DEDUP_THRESHOLD,
+                chars_per_token=config.CONTEXT_CHARS_PER_TOKEN
+            )
+
+        # The singleton owns the Ollama server; a different model reuses that server.
+        if llm is None:
+            llm = OllamaLLM.get_instance(model, verbose=not suppress_output)
+            if llm.model != model:
+                llm = OllamaLLM(model=model)
+        self.llm = llm
+
+        self.qa_chain = RetrievalQA.from_chain_type(
+            llm=self.llm,
+            chain_type="stuff",
+            retriever=self.retriever,
+            return_source_documents=False
+        )
+
+    @classmethod
+    def get(cls, host: str, port: int, collection_name: str, model: str,
+            suppress_output: bool = False) -> "QueryEngine":
+        """
+        Return the engine for this key, building it on first use.
+        """
+        key = (host, int(port), collection_name, model)
+        with cls._lock:
+            engine = cls._engines.get(key)
+            if engine is None:
+                with span("engine_init", collection=collection_name, model=model):
+                    engine = cls._engines[key] = cls(host, int(port), collection_name, model, suppress_output)
+            return engine
+
+    @classmethod
+    def release_clients(cls):
+        """
+        Drop every engine and close the Qdrant clients and symbol index they share, releasing the
+        embedded store's folder lock for other processes. The embedding model stays loaded.
+        """
+        with cls._lock:
+            cls._engines.clear()
+            cls._clients.clear()
+            close_local_clients()
+            if cls._symbol_index is not None:
+                cls._symbol_index.close()
+                cls._symbol_index = None
+
+    @classmethod
+    def _shared_embeddings(cls, suppress_output: bool):
+        if cls._embeddings is None:
+            with span("load_embeddings"):
+                # Queries embed one text at a time: never start an EmbeddingPool in a CLI or GUI process.
+                cls._embeddings = QueryEmbeddingCache(get_embeddings(suppress_output=suppress_output, workers=1))
+        return cls._embeddings
+
+    @classmethod
+    def _shared_result_cache(cls) -> ResultCache:
+        if cls._result_cache is None:
+            cache_file = config.DEFAULT_QUERY_CACHE_FILE if config.QUERY_CACHE_DISK else None
+            cls._result_cache = ResultCache(cache_file=cache_file)
+        return cls._result_cache
+
+    @classmethod
+    def _shared_symbol_index(cls) -> SymbolIndex:
+        if cls._symbol_index is None:
+            cls._symbol_index = SymbolIndex(config.DEFAULT_SYMBOL_INDEX_FILE)
+        return cls._symbol_index
+
+    @classmethod
+    def _shared_client(cls, host: str, port: int):
+        if (host, port) not in cls._clients:
+            cls._clients[(host, port)] = get_qdrant_client(host, port)
+        return cls._clients[(host, port)]
+
+    def retrieve(self, query: str, query_filter=None):
+        """
+        Retrieve the chunks for a query and pack them into the context that is sent to the LLM.
+        query_filter (see src.qdrant_utils.build_filter) restricts the search to matching chunks.
+        """
+        with span("retrieve", filtered=query_filter is not None) as current:
+            docs = self.retriever.invoke(query, query_filter=query_filter)
+            current.set(chunks=len(docs))
+        return self._pack(docs)
+
+    async def aretrieve(self, query: str, query_filter=None):
+        with span("retrieve", filtered=query_filter is not None) as current:
+            docs = await self.retriever.ainvoke(query, query_filter=query_filter)
+            current.set(chunks=len(docs))
+        return self._pack(docs)
+
+    def _pack(self, docs):
+        if self.packer is None:
+            return docs
+        with span("pack_context") as current:
+            docs = self.packer.pack(docs)
+            report = self.packer.last_report
+            current.set(blocks=report["blocks_out"], tokens_in=report["tokens_in"], tokens_out=report["tokens_out"])
+        return docs
+
+    def ask(self, query: str, query_filter=None) -> str:
+        with span("query", collection=self.collection_name, model=self.model):
+            prompt = self.build_prompt(query, self.retrieve(query, query_filter))
+            with span("generate"):
+                return self.llm.invoke(prompt)
+
+    def build_prompt(self, query: str, docs) -> str:
+        """
+        Format the retrieved documents and the question exactly as the chain's "stuff" step would.
+        """
+        with span("build_prompt") as current:
+            combine = self.qa_chain.combine_documents_chain
+            context = combine.document_separator.join(format_document(doc, combine.document_prompt) for doc in docs)
+            prompt = combine.llm_chain.prompt.format(**{combine.document_variable_name: context, "question": query})
+            current.set(prompt_chars=len(prompt))
+        return prompt
+
+    def stream(self, query: str, query_filter=None) -> Iterator[str]:
+        """
+        Answer the query like ask(), but yield the answer token by token as the LLM generates it.
+        """
+        with span("query", collection=self.collection_name, model=self.model):
+            prompt = self.build_prompt(query, self.retrieve(query, query_filter))
+            with span("generate") as current:
+                started = time.perf_counter()
+                for i, token in enumerate(self.llm.stream(prompt)):
+                    if i == 0:
+                        current.set(first_token_s=round(time.perf_counter() - started, 6))
+                    yield token
+
+    def _search(self, query: str, query_filter=None):
+        with span("embed_query"):
+            vector = self.embeddings.embed_query(query)
+        with span("qdrant_search") as current:
+            docs = search_documents(self.client, self.collection_name, vector, config.RETRIEVER_K,
+                                    query_filter=query_filter)
+            current.set(hits=len(docs))
+        return docs
+
+    async def _asearch(self, query: str, query_filter=None):
+        """
+        Async retrieval: embed the query off the event loop, then search with AsyncQdrantClient.
+        Embedded Qdrant has no async client; the in-process search runs in a worker thread.
+        """
+        if self.async_client is None:
+            self.async_client = get_async_qdrant_client(self.host, self.port)
+        if self.async_client is None:
+            return await asyncio.to_thread(self._search, query, query_filter)
+        with span("embed_query"):
+            vector = await asyncio.to_thread(self.embeddings.embed_query, query)
+        with span("qdrant_search") as current:
+            docs = await asearch_documents(self.async_client, self.collection_name, vector, config.RETRIEVER_K,
+                                           query_filter=query_filter)
+            current.set(hits=len(docs))
+        return docs
+
+    def _fetch(self, point_ids, query_filter=None):
+        with span("qdrant_fetch", points=len(point_ids)):
+            return retrieve_documents(self.client, self.collection_name, point_ids, query_filter)
+
+    async def _afetch(self, point_ids, query_filter=None):
+        if self.async_client is None:
+            self.async_client = get_async_qdrant_client(self.host, self.port)
+        if self.async_client is None:
+            return await asyncio.to_thread(self._fetch, point_ids, query_filter)
+        with span("qdrant_fetch", points=len(point_ids)):
+            return await aretrieve_documents(self.async_client, self.collection_name, point_ids, query_filter)
+
+    async def aask(self, query: str, query_filter=None) -> str:
+        with span("query", collection=self.collection_name, model=self.model):
+            prompt = self.build_prompt(query, await self.aretrieve(query, query_filter))
+            with span("generate"):
+                return await self.llm.ainvoke(prompt)
+
+    async def astream(self, query: str, query_filter=None) -> AsyncIterator[str]:
+        """
+        Async streaming answer: retrieval and generation both yield to the event loop, so one
+        request's search can run while another request is generating.
+        """
+        with span("query", collection=self.collection_name, model=self.model):
+            prompt = self.build_prompt(query, await self.aretrieve(query, query_filter))
+            with span("generate") as current:
+                started = time.perf_counter()
+                first = True
+                async for token in self.llm.astream(prompt):
+                    if first:
+                        current.set(first_token_s=round(time.perf_counter() - started, 6))
+                        first = False
+                    yield token
+
+    def cache_stats(self) -> dict:
+        """
+        Hit/miss statistics of the query embedding, retrieval result and on-disk embedding caches,
+        and of symbol index lookups.
+        """
+        stats = {
+            "query_embeddings": self.embeddings.cache.stats(),
+            "retrieval_results": self.retriever.result_cache.stats(),
+        }
+        if isinstance(self.embeddings.embeddings, CachedEmbeddings):
+            stats["embedding_cache"] = self.embeddings.embeddings.stats()
+        if self.symbol_retriever is not None:
+            stats["symbol_lookups"] = self.symbol_retriever.stats()
+        return stats
+
+    def format_cache_stats(self) -> str:
+        lines = []
+        for name, stats in self.cache_stats().items():
+            lines.append(f"{name}: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+        if self.packer is not None:
+            lines.append(self.packer.format_stats())
+        return "\n".join(lines)
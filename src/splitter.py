@@ -1,72 +1,31 @@
 #!/usr/bin/env python3
 import argparse
-import pickle
-import re, os
-from user_interface.config import config
+import os
+import re
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from user_interface.config import available_cpus, config
+from src.boundary_splitter import BOUNDARY_PATTERNS, BoundarySplitter, line_starts
+from src.chunk_store import ChunkStoreWriter, assign_point_ids, export_pickle, iter_stored_documents
+from src.manifest import path_prefixes, relative_path
+from src.symbol_index import SymbolIndex, extract_symbols, symbol_rows
+from src.tracing import span
 from langchain.text_splitter import RecursiveCharacterTextSplitter, Language
 from langchain.text_splitter import MarkdownTextSplitter
+from langchain_core.documents import Document
 
+# Parallel splitting sends documents to the workers in tasks of about this many characters.
+SPLIT_TASK_CHARS = 512 * 1024
 
-class MatlabSplitter:
-    def __init__(self, chunk_size: int, chunk_overlap: int):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        # Define a regex pattern that captures MATLAB function declarations, class definitions, subroutines, or script sections.
-        self.boundary_pattern = re.compile(r"^\s*(function|classdef|sub|%%)\b", re.IGNORECASE)
-
-    def split_documents(self, docs: list) -> list:
-        chunks = []
-        for doc in docs:
-            lines = doc.page_content.splitlines()
-            current_chunk = ""
-            for line in lines:
-                if self.boundary_pattern.match(line) and current_chunk.strip():
-                    if len(current_chunk) >= self.chunk_size:
-                        chunks.append(current_chunk)
-                        # Start new chunk: include overlap.
-                        current_chunk = current_chunk[-self.chunk_overlap:] + "\n" + line
-                        continue
-                    else:
-                        chunks.append(current_chunk)
-                        current_chunk = line
-                else:
-                    current_chunk += "\n" + line
-            if current_chunk.strip():
-                chunks.append(current_chunk)
-        return chunks
-
-
-class JuliaSplitter:
-    def __init__(self, chunk_size: int, chunk_overlap: int):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        # Define a regex pattern for Julia boundaries: functions, struct, module, abstract type, etc.
-        self.boundary_pattern = re.compile(r"^\s*(function|struct|module|abstract type)\b", re.IGNORECASE)
-
-    def split_documents(self, docs: list) -> list:
-        chunks = []
-        for doc in docs:
-            lines = doc.page_content.splitlines()
-            current_chunk = ""
-            for line in lines:
-                if self.boundary_pattern.match(line) and current_chunk.strip():
-                    if len(current_chunk) >= self.chunk_size:
-                        chunks.append(current_chunk)
-                        current_chunk = current_chunk[-self.chunk_overlap:] + "\n" + line
-                        continue
-                    else:
-                        chunks.append(current_chunk)
-                        current_chunk = line
-                else:
-                    current_chunk += "\n" + line
-            if current_chunk.strip():
-                chunks.append(current_chunk)
-        return chunks
+# Objective-C shares the ".m" extension with MATLAB; such files fall back to the generic splitter.
+_OBJECTIVE_C = re.compile(r"^\s*(#import\b|@interface\b|@implementation\b)", re.MULTILINE)
 
 
 # Mapping from file extension (without dot) to language key.
 # For any file extension that is not recognized, we'll use "markdown".
 EXTENSION_TO_LANGUAGE = {
+    "py": "python",
     "cpp": "cpp",
     "c": "cpp",
     "hpp": "cpp",
@@ -84,84 +43,277 @@ EXTENSION_TO_LANGUAGE = {
 
 
 def get_language_splitter(language, chunk_size, chunk_overlap):
+    # add_start_index records each chunk's character offset, which is used to derive stable point IDs.
     if language == "python":
         return RecursiveCharacterTextSplitter.from_language(
-            language=Language.PYTHON, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            language=Language.PYTHON, chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     elif language == "markdown":
-        return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     elif language == "cpp":
         return RecursiveCharacterTextSplitter.from_language(
-            language=Language.CPP, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            language=Language.CPP, chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     elif language == "java":
         return RecursiveCharacterTextSplitter.from_language(
-            language=Language.JAVA, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    elif language == "julia":
-        return JuliaSplitter(chunk_size, chunk_overlap)
-    elif language == "matlab":
-        return MatlabSplitter(chunk_size, chunk_overlap)
+            language=Language.JAVA, chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    elif language in BOUNDARY_PATTERNS:
+        # MATLAB, Julia and other languages split at regex boundaries (see src/boundary_splitter.py).
+        return BoundarySplitter.for_language(language, chunk_size, chunk_overlap)
     elif language == "csharp":
         return RecursiveCharacterTextSplitter.from_language(
-            language=Language.CSHARP, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            language=Language.CSHARP, chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     else:
         # If for some reason, it still falls through, use Markdown as a fallback.
-        return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return MarkdownTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
 
 
-def split_documents(input_file, output_file, chunk_size, chunk_overlap, language_splitting):
-    with open(input_file, "rb") as f:
-        documents = pickle.load(f)
-
+def build_splitters(chunk_size, chunk_overlap, language_splitting):
+    """
+    Build the splitter table used by split_document(), keyed by language.
+    """
     if language_splitting:
         # Build a dictionary of splitters for each supported language in your config.
         # Here, config.CODEBASE_LANGUAGES is expected to be a list of language keys,
         # e.g. ["cpp", "java", "python", "matlab", "csharp", "julia", "markdown"]
         splitters = {lang: get_language_splitter(lang, chunk_size, chunk_overlap) for lang in config.CODEBASE_LANGUAGES}
         # Add a default fallback splitter.
-        splitters["default"] = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        splitters["default"] = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     else:
-        generic_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        generic_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
         splitters = {"default": generic_splitter}
+    return splitters
+
+
+def normalize_source(source):
+    """
+    Map a loaded document's source back to the original file: drop the ".txt" suffix added by
+    the conversion step and, when the file lives in the converted tree, point it at the codebase.
+    """
+    abs_source = os.path.abspath(source)
+    converted_root = os.path.abspath(config.DEFAULT_CONVERTED_PATH)
+    codebase_root = os.path.abspath(config.DEFAULT_CODEBASE_PATH)
+    if abs_source.startswith(converted_root + os.sep):
+        rel_path = os.path.relpath(abs_source, converted_root)
+        if rel_path.endswith(".txt"):
+            rel_path = rel_path[:-len(".txt")]
+        return os.path.join(codebase_root, rel_path)
+    if abs_source.startswith(codebase_root + os.sep):
+        # Already an original file; nothing was appended to it.
+        return source
+    base, ext = os.path.splitext(source)
+    if ext.lower() == ".txt" and os.path.splitext(base)[1]:
+        return base
+    return source
+
+
+def source_language(source):
+    """
+    Map a (normalized) source path to its language key via its file extension.
+    """
+    ext = os.path.splitext(source)[1].lstrip(".").lower()
+    return EXTENSION_TO_LANGUAGE.get(ext, "default")
+
+
+def add_line_numbers(text, chunks):
+    """
+    Set 1-based "start_line" and "end_line" metadata on chunks that have a "start_index" but no line
+    numbers yet. Line starts are computed once per file and looked up by bisection.
+    """
+    starts = None
+    for chunk in chunks:
+        start = chunk.metadata.get("start_index")
+        if start is None or start < 0 or "start_line" in chunk.metadata:
+            continue
+        if starts is None:
+            starts = line_starts(text)
+        chunk.metadata["start_line"] = bisect_right(starts, start)
+        chunk.metadata["end_line"] = bisect_right(starts, start + max(len(chunk.page_content) - 1, 0))
+    return chunks
+
+
+def filter_fields(source, language, codebase_root=None):
+    """
+    The per-file payload fields search can be filtered on (see src.qdrant_utils.build_filter):
+    path relative to codebase_root (default DEFAULT_CODEBASE_PATH), its path prefixes, language and extension.
+    """
+    rel_path = relative_path(source, config.DEFAULT_CODEBASE_PATH if codebase_root is None else codebase_root)
+    return {
+        "rel_path": rel_path,
+        "path_prefixes": path_prefixes(rel_path),
+        "language": language,
+        "extension": os.path.splitext(source)[1].lstrip(".").lower(),
+    }
+
+
+def payload_fields(chunk, codebase_root=None) -> dict:
+    """
+    The filterable payload fields of a chunk: its file's filter_fields() and the symbols it defines.
+    They only go into the Qdrant payload (see push_to_qdrant.build_points); the chunk store does not keep them.
+    """
+    source = chunk.metadata["source"]
+    language = source_language(source)
+    fields = filter_fields(source, language, codebase_root)
+    fields["symbols"] = extract_symbols(chunk.page_content, language)
+    return fields
+
+
+def split_document(doc, splitters):
+    """
+    Split a single document with the splitter matching its file extension.
+    Every chunk gets the normalized source and, where its offset is known, start/end line numbers.
+    """
+    # doc.metadata["source"] may be the original file or a converted "/path/to/file.ext.txt"
+    source = normalize_source(doc.metadata["source"])
+
+    # Map file extension to language key
+    lang_key = source_language(source)
+    if lang_key == "matlab" and _OBJECTIVE_C.search(doc.page_content):
+        lang_key = "default"
+    splitter = splitters.get(lang_key, splitters["default"])
+    chunks = add_line_numbers(doc.page_content, splitter.split_documents([doc]))
+    for chunk in chunks:
+        chunk.metadata["source"] = source
+    return chunks
 
-    doc_chunks = []
+
+def split_records(doc, splitters, with_symbols: bool = False):
+    """
+    Split one document into (chunk records, point IDs, symbol rows). Chunk records are plain
+    (text, metadata) tuples: cheap to send between processes and written to the chunk store as they are.
+    """
+    chunks = split_document(doc, splitters)
+    point_ids = assign_point_ids(chunks)
+    rows = []
+    if with_symbols and chunks:
+        source = chunks[0].metadata["source"]
+        rows = symbol_rows(source, point_ids, chunks, source_language(source))
+    return [(chunk.page_content, chunk.metadata) for chunk in chunks], point_ids, rows
+
+
+def split_workers(workers: int = None) -> int:
+    """
+    Resolve a worker count; 0 means one per CPU core available to this process.
+    """
+    workers = config.SPLIT_WORKERS if workers is None else workers
+    if workers > 0:
+        return workers
+    return available_cpus()
+
+
+# Per-process state of a split worker, built once by _init_split_worker.
+_worker_state = {}
+
+
+def _init_split_worker(app_config, chunk_size, chunk_overlap, language_splitting, with_symbols):
+    # Spawned workers would otherwise load config.ini instead of the parent's (possibly overridden) config.
+    config._set(app_config)
+    _worker_state["splitters"] = build_splitters(chunk_size, chunk_overlap, language_splitting)
+    _worker_state["with_symbols"] = with_symbols
+
+
+def _split_task(docs):
+    splitters = _worker_state["splitters"]
+    with_symbols = _worker_state["with_symbols"]
+    return [split_records(Document(page_content=text, metadata=metadata), splitters, with_symbols)
+            for text, metadata in docs]
+
+
+def _split_tasks(documents):
+    """
+    Group documents into tasks of about SPLIT_TASK_CHARS characters, so large and small files balance.
+    """
+    task, size = [], 0
     for doc in documents:
-        # Assume doc.metadata["source"] is like "/path/to/file.ext.txt"
-        source = doc.metadata["source"]
-        # Remove the appended ".txt"
-        base, ext1 = os.path.splitext(source)
-        if ext1.lower() == ".txt":
-            base, ext2 = os.path.splitext(base)
-            ext = ext2.lstrip(".").lower()
-        else:
-            ext = ext1.lstrip(".").lower()
+        task.append((doc.page_content, doc.metadata))
+        size += len(doc.page_content)
+        if size >= SPLIT_TASK_CHARS:
+            yield task
+            task, size = [], 0
+    if task:
+        yield task
+
+
+def iter_split_records(documents, chunk_size, chunk_overlap, language_splitting, with_symbols: bool = False,
+                       workers: int = None):
+    """
+    Yield split_records() for each document, in input order.
+    With more than one worker, documents are split in a process pool whose workers build their
+    splitters once. At most a few tasks per worker are in flight, so memory stays bounded however
+    many documents the input yields.
+    """
+    workers = split_workers(workers)
+    if workers <= 1:
+        splitters = build_splitters(chunk_size, chunk_overlap, language_splitting)
+        for doc in documents:
+            yield split_records(doc, splitters, with_symbols)
+        return
+
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_split_worker,
+        initargs=(config._get(), chunk_size, chunk_overlap, language_splitting, with_symbols)
+    )
+    pending = deque()
+    try:
+        for task in _split_tasks(documents):
+            pending.append(pool.submit(_split_task, task))
+            # Results are consumed in submission order; the read-ahead keeps workers busy behind a slow task.
+            if len(pending) >= 4 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
 
-        # Map file extension to language key
-        lang_key = EXTENSION_TO_LANGUAGE.get(ext, "default")
-        splitter = splitters.get(lang_key, splitters["default"])
-        doc_chunks.extend(splitter.split_documents([doc]))
 
-    for doc in doc_chunks:
-        doc.metadata["source"] = doc.metadata["source"].replace(".txt", "")
+def split_documents(input_path, output_store, chunk_size, chunk_overlap, language_splitting, pickle_file=None,
+                    workers=None):
+    workers = split_workers(workers)
+    symbol_index = SymbolIndex(config.DEFAULT_SYMBOL_INDEX_FILE) if config.SYMBOL_INDEX_ENABLED else None
 
-    with open(output_file, "wb") as f:
-        pickle.dump(doc_chunks, f)
-    print(f"Split into {len(doc_chunks)} chunks and saved to {output_file}.")
+    # Documents are read from the input store (or a legacy pickle) and their chunks streamed to the output store.
+    with ChunkStoreWriter(output_store, compression=config.CHUNK_STORE_COMPRESSION) as writer:
+        records = iter_split_records(iter_stored_documents(input_path), chunk_size, chunk_overlap,
+                                     language_splitting, with_symbols=symbol_index is not None, workers=workers)
+        for chunks, point_ids, rows in records:
+            for (text, metadata), point_id in zip(chunks, point_ids):
+                writer.add(text, metadata, point_id)
+            if symbol_index is not None and chunks:
+                symbol_index.add_rows(chunks[0][1]["source"], rows)
+        count = len(writer)
+    print(f"Split into {count} chunks with {workers} worker(s) and saved to {output_store}.")
+    if symbol_index is not None:
+        stats = symbol_index.stats()
+        symbol_index.close()
+        print(f"Indexed {stats['symbols']} symbols from {stats['sources']} files in {config.DEFAULT_SYMBOL_INDEX_FILE}.")
+    if pickle_file:
+        export_pickle(output_store, pickle_file)
+        print(f"Exported chunks to {pickle_file}.")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Split documents into chunks.")
-    parser.add_argument("--input", type=str, default=config.DEFAULT_DOCS_PICKLE,
-                        help="Input pickle file (default from config)")
-    parser.add_argument("--output", type=str, default=config.DEFAULT_CHUNKS_PICKLE,
-                        help="Output pickle file (default from config)")
+    parser.add_argument("--input", type=str, default=config.DEFAULT_DOCS_STORE,
+                        help="Input document store or legacy pickle file (default from config)")
+    parser.add_argument("--output", type=str, default=config.DEFAULT_CHUNKS_STORE,
+                        help="Output chunk store directory (default from config)")
     parser.add_argument("--chunk_size", type=int, default=config.CHUNK_SIZE,
                         help="Chunk size (default from config)")
     parser.add_argument("--chunk_overlap", type=int, default=config.CHUNK_OVERLAP,
                         help="Chunk overlap (default from config)")
     parser.add_argument("--language_splitting", action="store_true", default=config.LANGUAGE_AWARE_SPLITTING,
                         help="Enable language-aware splitting (default from config)")
+    parser.add_argument("--export_pickle", type=str, default=None,
+                        help="Also write the chunks to this pickle file (compatibility export)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Split processes (default from config; 0 = one per CPU core, 1 = in-process)")
     args = parser.parse_args()
 
-    split_documents(args.input, args.output, args.chunk_size, args.chunk_overlap, args.language_splitting)
+    with span("split") as current:
+        current.set(workers=split_workers(args.workers))
+        split_documents(args.input, args.output, args.chunk_size, args.chunk_overlap, args.language_splitting,
+                        pickle_file=args.export_pickle, workers=args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Exact-match index from defined identifiers (functions, classes, structs, ...) to chunk point IDs.
+
+The splitting stage records, for every chunk, the symbols it defines. Queries that name an identifier,
+such as "what does `split_documents` do", are answered by fetching those chunks from Qdrant by ID
+instead of running a vector search. Point IDs are derived from the chunk's source and offset, so one
+index serves every collection the chunks were pushed to.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import record
+
+# C-family function definitions: a return type, a (possibly qualified) name and "(", with "{" before any ";".
+_C_FUNCTION = r"^[ \t]*(?:[\w:<>\[\],.*&~]+[ \t]+)+[*&]*((?:\w+::)*~?[A-Za-z_]\w*)[ \t]*\("
+_C_KEYWORDS = {"if", "for", "while", "switch", "return", "sizeof", "catch", "else", "new", "delete",
+               "throw", "case", "using", "typedef", "do"}
+
+# Definition patterns per language key of EXTENSION_TO_LANGUAGE; group 1 is the defined name.
+# Patterns marked as functions only count when a body ("{") follows before a ";".
+SYMBOL_PATTERNS = {
+    "python": [
+        (r"^[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+([A-Za-z_]\w*)", False),
+        (r"^([A-Za-z_]\w*)[ \t]*(?::[^=\n]*)?=(?!=)", False),
+    ],
+    "cpp": [
+        (r"^[ \t]*(?:template[ \t]*<[^>\n]*>[ \t]*)?(?:class|struct|union|enum(?:[ \t]+class)?|namespace)"
+         r"[ \t]+([A-Za-z_]\w*)", False),
+        (r"^[ \t]*#[ \t]*define[ \t]+([A-Za-z_]\w*)", False),
+        (_C_FUNCTION, True),
+    ],
+    "java": [
+        (r"^[ \t]*(?:[\w@]+[ \t]+)*(?:class|interface|enum|record)[ \t]+([A-Za-z_]\w*)", False),
+        (_C_FUNCTION, True),
+    ],
+    "csharp": [
+        (r"^[ \t]*(?:[\w\[\]]+[ \t]+)*(?:class|interface|enum|struct|record)[ \t]+([A-Za-z_]\w*)", False),
+        (_C_FUNCTION, True),
+    ],
+    "julia": [
+        (r"^[ \t]*(?:function|macro|struct|mutable[ \t]+struct|abstract[ \t]+type|primitive[ \t]+type|module)"
+         r"[ \t]+([A-Za-z_][\w!]*)", False),
+        (r"^[ \t]*([A-Za-z_][\w!]*)\([^)\n]*\)[ \t]*=(?!=)", False),
+    ],
+    "matlab": [
+        (r"^[ \t]*function[ \t]+(?:\[[^\]\n]*\][ \t]*=[ \t]*|\w+[ \t]*=[ \t]*)?([A-Za-z]\w*)", False),
+        (r"^[ \t]*classdef[ \t]+(?:\([^)\n]*\)[ \t]*)?([A-Za-z]\w*)", False),
+    ],
+}
+_COMPILED_PATTERNS = {
+    language: [(re.compile(pattern, re.MULTILINE), is_function) for pattern, is_function in patterns]
+    for language, patterns in SYMBOL_PATTERNS.items()
+}
+
+# Identifiers in a query that look like code rather than English: snake_case, camelCase or
+# PascalCase with an inner capital, qualified names, or names followed by "(".
+_QUERY_IDENTIFIER = re.compile(r"[A-Za-z_]\w*(?:(?:::|\.)[A-Za-z_]\w*)*(\()?")
+_BACKTICKED = re.compile(r"`([^`\n]+)`")
+
+
+def _has_body(text: str, end: int) -> bool:
+    """
+    True if the signature ending at `end` is followed by "{" before any ";" (a definition, not a declaration).
+    """
+    depth = 0
+    for pos in range(end, min(len(text), end + 1000)):
+        char = text[pos]
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth <= 0 and char == "{":
+            return True
+        elif depth <= 0 and char in ";}":
+            return False
+    return False
+
+
+def extract_symbols(text: str, language: str) -> List[str]:
+    """
+    Return the identifiers defined in text, in order of appearance, using the language's patterns.
+    Qualified C++ names ("Class::method") are indexed both qualified and by their last part.
+    """
+    symbols = []
+    seen = set()
+    for pattern, is_function in _COMPILED_PATTERNS.get(language, ()):
+        for match in pattern.finditer(text):
+            name = match.group(1)
+            if is_function and (name.split("::")[-1] in _C_KEYWORDS or not _has_body(text, match.end())):
+                continue
+            for symbol in (name, name.split("::")[-1].lstrip("~")):
+                if symbol not in seen:
+                    seen.add(symbol)
+                    symbols.append(symbol)
+    return symbols
+
+
+def symbol_rows(source: str, point_ids, chunks, language: str) -> list:
+    """
+    (symbol, source, point ID) rows for the identifiers defined in a file's chunks.
+    """
+    rows = []
+    for point_id, chunk in zip(point_ids, chunks):
+        rows.extend((symbol, source, point_id) for symbol in extract_symbols(chunk.page_content, language))
+    return rows
+
+
+def query_identifiers(query: str) -> List[str]:
+    """
+    Pick the identifiers worth looking up from a natural-language query.
+    Backticked spans always count; bare words only when they look like code.
+    """
+    identifiers = []
+    for span in _BACKTICKED.findall(query):
+        identifiers.extend(match.group(0).rstrip("(") for match in _QUERY_IDENTIFIER.finditer(span))
+    for match in _QUERY_IDENTIFIER.finditer(_BACKTICKED.sub(" ", query)):
+        word = match.group(0).rstrip("(")
+        if (match.group(1) or "_" in word.strip("_") or "::" in word or "." in word
+                or any(c.isupper() for c in word[1:]) and any(c.islower() for c in word)):
+            identifiers.append(word)
+    # Qualified names are also looked up by their last component.
+    expanded = []
+    for identifier in identifiers:
+        for candidate in (identifier, re.split(r"::|\.", identifier)[-1]):
+            if candidate not in expanded:
+                expanded.append(candidate)
+    return expanded
+
+
+class SymbolIndex:
+    """
+    SQLite table of (symbol, source, point ID) rows. Rows are replaced per source file, so re-splitting
+    a file drops the symbols it no longer defines. Safe to share between threads.
+    """
+
+    def __init__(self, index_file: str, batch_rows: int = 5000):
+        os.makedirs(os.path.dirname(os.path.abspath(index_file)), exist_ok=True)
+        self.index_file = index_file
+        self.batch_rows = batch_rows
+        self._pending_sources = []
+        self._pending_rows = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_file, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS symbols (name TEXT NOT NULL, source TEXT NOT NULL, point_id TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS symbols_name ON symbols(name COLLATE NOCASE)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS symbols_source ON symbols(source)")
+        self._conn.commit()
+
+    def add_source(self, source: str, point_ids, chunks, language: str):
+        """
+        Replace the symbols recorded for source with those defined in its chunks.
+        Writes are buffered and committed every batch_rows rows and on flush().
+        """
+        self.add_rows(source, symbol_rows(source, point_ids, chunks, language))
+
+    def add_rows(self, source: str, rows):
+        """
+        Like add_source, with rows already extracted by symbol_rows() (for example in a worker process).
+        """
+        with self._lock:
+            self._pending_sources.append(source)
+            self._pending_rows.extend(rows)
+            if len(self._pending_rows) >= self.batch_rows:
+                self._flush()
+
+    def remove_sources(self, sources):
+        with self._lock:
+            self._flush()
+            self._conn.executemany("DELETE FROM symbols WHERE source = ?", [(source,) for source in sources])
+            self._conn.commit()
+
+    def _flush(self):
+        if not self._pending_sources:
+            return
+        self._conn.executemany("DELETE FROM symbols WHERE source = ?", [(s,) for s in self._pending_sources])
+        self._conn.executemany("INSERT INTO symbols (name, source, point_id) VALUES (?, ?, ?)", self._pending_rows)
+        self._conn.commit()
+        self._pending_sources = []
+        self._pending_rows = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def lookup(self, name: str, limit: int = None) -> List[str]:
+        """
+        Point IDs of the chunks defining name; exact-case matches come before case-insensitive ones.
+        """
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                "SELECT DISTINCT point_id, name = ? AS exact FROM symbols WHERE name = ? COLLATE NOCASE"
+                " ORDER BY exact DESC, rowid LIMIT ?",
+                (name, name, -1 if limit is None else limit)
+            ).fetchall()
+        return [point_id for point_id, _ in rows]
+
+    def lookup_query(self, query: str, limit: int) -> List[str]:
+        """
+        Point IDs for the identifiers named in a query, in the order the identifiers appear.
+        """
+        point_ids = []
+        for identifier in query_identifiers(query):
+            for point_id in self.lookup(identifier, limit):
+                if point_id not in point_ids:
+                    point_ids.append(point_id)
+            if len(point_ids) >= limit:
+                break
+        return point_ids[:limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._flush()
+            symbols, rows, sources = self._conn.execute(
+                "SELECT COUNT(DISTINCT name), COUNT(*), COUNT(DISTINCT source) FROM symbols").fetchone()
+        return {"symbols": symbols, "rows": rows, "sources": sources}
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SymbolRetriever(BaseRetriever):
+    """
+    Retriever that answers identifier queries from a SymbolIndex and only falls back to vector search
+    when the query names no indexed symbol. With fuse=True, symbol hits are ranked first and the
+    remaining slots are filled from vector search.
+    """
+
+    retriever: BaseRetriever
+    symbol_index: Any
+    # Callable (point IDs, query_filter -> documents) fetching chunks by ID, and its optional async counterpart.
+    fetch: Any
+    afetch: Any = None
+    # Optional coroutine function (query, query_filter -> documents) used for vector search on the async path.
+    async_search: Any = None
+    k: int
+    fuse: bool = False
+    hits: int = 0
+    misses: int = 0
+
+    def _symbol_ids(self, query: str) -> List[str]:
+        point_ids = self.symbol_index.lookup_query(query, self.k)
+        record(symbol_hits=len(point_ids))
+        if point_ids:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return point_ids
+
+    def _merge(self, symbol_docs: List[Document], dense_docs: List[Document]) -> List[Document]:
+        ids = {doc.metadata.get("_id") for doc in symbol_docs}
+        merged = symbol_docs + [doc for doc in dense_docs if doc.metadata.get("_id") not in ids]
+        return merged[:self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None, query_filter=None) -> List[Document]:
+        point_ids = self._symbol_ids(query)
+        # Symbol hits outside query_filter are dropped by the fetch.
+        symbol_docs = self.fetch(point_ids, query_filter=query_filter) if point_ids else []
+        # Chunks can be indexed for a collection they were never pushed to; fall back if none came back.
+        if symbol_docs and not self.fuse:
+            return symbol_docs
+        return self._merge(symbol_docs, self.retriever.invoke(query, query_filter=query_filter))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None, query_filter=None) -> List[Document]:
+        point_ids = self._symbol_ids(query)
+        symbol_docs = []
+        if point_ids:
+            if self.afetch is not None:
+                symbol_docs = await self.afetch(point_ids, query_filter=query_filter)
+            else:
+                symbol_docs = self.fetch(point_ids, query_filter=query_filter)
+        if symbol_docs and not self.fuse:
+            return symbol_docs
+        if self.async_search is not None:
+            dense_docs = await self.async_search(query, query_filter=query_filter)
+        else:
+            dense_docs = await self.retriever.ainvoke(query, query_filter=query_filter)
+        return self._merge(symbol_docs, dense_docs)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the symbol index or look up identifiers in it.")
+    parser.add_argument("index_file", help="Path to the SQLite symbol index.")
+    parser.add_argument("--lookup", nargs="*", default=None, help="Identifiers (or a query) to look up.")
+    args = parser.parse_args()
+
+    with SymbolIndex(args.index_file) as index:
+        stats = index.stats()
+        print(f"{args.index_file}: {stats['symbols']} symbols in {stats['sources']} files ({stats['rows']} rows).")
+        for name in args.lookup or []:
+            print(f"{name}: {', '.join(index.lookup(name)) or 'not found'}")
+
+
+if __name__ == "__main__":
+    main()
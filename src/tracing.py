@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Lightweight tracing and metrics for the query and ingest paths.
+
+Stages are wrapped in spans (`with span("qdrant_search"): ...`). Spans nest through a context
+variable, so a query's retrieval, prompt construction and generation end up in one trace, also across
+asyncio tasks and asyncio.to_thread(). When a root span ends, the trace is appended to a JSONL log,
+and every span feeds per-stage latency histograms and counters (such as Ollama token counts) that can
+be rendered in the Prometheus text format.
+"""
+import argparse
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from user_interface.config import config
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond lookups to long generations.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_span = contextvars.ContextVar("codebaserag_span", default=None)
+
+
+class Span:
+    """One timed stage; children are the spans opened while it was current."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes", "children")
+
+    def __init__(self, name: str, parent=None, attributes: dict = None, start: float = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time() if start is None else start
+        self.duration = None
+        self.attributes = dict(attributes or {})
+        self.children = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def flatten(self, trace_start: float) -> list:
+        record = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start - trace_start) * 1000, 3),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+        }
+        if self.attributes:
+            record["attributes"] = self.attributes
+        records = [record]
+        for child in list(self.children):
+            records.extend(child.flatten(trace_start))
+        return records
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Metrics:
+    """
+    In-process registry of span latency histograms and named counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = defaultdict(float)
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def render_prometheus(self) -> str:
+        """
+        Render every histogram and counter in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP codebaserag_stage_duration_seconds Duration of traced query and ingest stages.",
+            "# TYPE codebaserag_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+                    lines.append(f'codebaserag_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'codebaserag_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} '
+                             f'{histogram["count"]}')
+                lines.append(f'codebaserag_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+                lines.append(f'codebaserag_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_log_lock = threading.Lock()
+_last_trace = None
+
+
+def tracing_enabled() -> bool:
+    return config.TRACING_ENABLED
+
+
+def _write_trace(root: Span):
+    if not config.TRACE_LOG_ENABLED:
+        return
+    record = {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "timestamp": root.start,
+        "duration_ms": round(root.duration * 1000, 3),
+        "spans": root.flatten(root.start),
+    }
+    line = json.dumps(record, default=str)
+    os.makedirs(os.path.dirname(os.path.abspath(config.DEFAULT_TRACE_LOG_FILE)), exist_ok=True)
+    with _log_lock:
+        with open(config.DEFAULT_TRACE_LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _finish(current: Span, parent):
+    metrics.observe(current.name, current.duration)
+    if parent is not None:
+        parent.children.append(current)
+    else:
+        global _last_trace
+        _last_trace = current
+        try:
+            _write_trace(current)
+        except OSError as e:
+            print("Error writing trace log:", e)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage as a child of the current span (or as a new trace) and yield the span,
+    so attributes can be added with span.set(...). Works across yields in (async) generators.
+    """
+    if not tracing_enabled():
+        yield _NOOP_SPAN
+        return
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    started = time.perf_counter()
+    _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.attributes["error"] = repr(e)
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        # Restore by value rather than with a token: a generator may be closed from another context.
+        _current_span.set(parent)
+        _finish(current, parent)
+
+
+def add_span(name: str, seconds: float, **attributes):
+    """
+    Record an already measured (for example, accumulated) stage as a child of the current span.
+    """
+    if not tracing_enabled():
+        return
+    parent = _current_span.get()
+    current = Span(name, parent, attributes, start=time.time() - seconds)
+    current.duration = seconds
+    _finish(current, parent)
+
+
+def record(**attributes):
+    """
+    Attach attributes to the current span, if any.
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def last_trace():
+    """
+    The most recently finished root span in this process, or None.
+    """
+    return _last_trace
+
+
+def format_trace(root: Span) -> str:
+    """
+    Indented per-stage breakdown of a trace, e.g. for printing after a query.
+    """
+    lines = []
+
+    def visit(current: Span, depth: int):
+        attributes = " ".join(f"{key}={value}" for key, value in current.attributes.items())
+        lines.append(f"{'  ' * depth}{current.name:<{24 - 2 * depth}s} {current.duration * 1000:9.1f}ms  {attributes}".rstrip())
+        for child in current.children:
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    return "\n".join(lines)
+
+
+def record_ollama_response(response):
+    """
+    Record Ollama's token counts and server-side durations (nanoseconds) on the current span and
+    in the token and duration counters.
+    """
+    if not tracing_enabled() or response is None:
+        return
+    get = response.get if hasattr(response, "get") else lambda key, default=None: getattr(response, key, default)
+    prompt_tokens = get("prompt_eval_count") or 0
+    completion_tokens = get("eval_count") or 0
+    durations = {phase: (get(f"{phase}_duration") or 0) / 1e9
+                 for phase in ("total", "load", "prompt_eval", "eval")}
+    record(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+           **{f"ollama_{phase}_s": round(seconds, 6) for phase, seconds in durations.items()})
+    if completion_tokens and durations["eval"]:
+        record(tokens_per_s=round(completion_tokens / durations["eval"], 2))
+    metrics.increment("codebaserag_llm_tokens_total", prompt_tokens, kind="prompt")
+    metrics.increment("codebaserag_llm_tokens_total", completion_tokens, kind="completion")
+    for phase in ("load", "prompt_eval", "eval"):
+        metrics.increment("codebaserag_ollama_duration_seconds_total", durations[phase], phase=phase)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """
+    Serve /metrics for Prometheus from a daemon thread and return the server.
+    """
+    # Imported here so that modules recording spans do not pay for the HTTP stack at startup.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def summarize_trace_log(trace_file: str, last: int = None) -> dict:
+    """
+    Per-span count, mean, p50 and p99 in milliseconds over a JSONL trace log.
+    """
+    with open(trace_file, "r", encoding="utf-8") as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    if last:
+        traces = traces[-last:]
+    durations = defaultdict(list)
+    for trace in traces:
+        for record in trace["spans"]:
+            durations[record["name"]].append(record["duration_ms"])
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values),
+            "p50_ms": values[len(values) // 2],
+            "p99_ms": values[min(len(values) - 1, int(len(values) * 0.99))],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-stage latency from a JSONL trace log.")
+    parser.add_argument("trace_file", nargs="?", default=config.DEFAULT_TRACE_LOG_FILE,
+                        help="Trace log to read (default from config).")
+    parser.add_argument("--last", type=int, default=None, help="Only use the last N traces.")
+    args = parser.parse_args()
+
+    summary = summarize_trace_log(args.trace_file, args.last)
+    print(f"{'stage':20s} {'count':>7s} {'mean':>10s} {'p50':>10s} {'p99':>10s}")
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]["mean_ms"] * item[1]["count"]):
+        print(f"{name:20s} {stats['count']:7d} {stats['mean_ms']:8.1f}ms {stats['p50_ms']:8.1f}ms "
+              f"{stats['p99_ms']:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Keep a collection in sync with a live working tree.
+
+The codebase is watched with inotify (through the optional watchdog package) or, without it, by
+polling file sizes and modification times. Events are collected into a pending set and released as
+one batch once the tree has been quiet for WATCH_DEBOUNCE_SECONDS (or the oldest change has waited
+WATCH_MAX_DELAY_SECONDS), so a burst such as a git checkout becomes a single batch. Only the files of
+a batch whose content hash changed are re-split, re-embedded and upserted, and the points of deleted
+files are removed, exactly as the incremental reindex does. Lag (first event to indexed) and
+throughput are printed per batch and exported as metrics.
+
+    python src/watch.py --src /path/to/codebase
+"""
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from user_interface.config import config
+from src.convert import SOURCE_EXTENSIONS, iter_source_files
+from src.embeddings import close_embeddings, get_embeddings
+from src.incremental import apply_changes
+from src.manifest import FileManifest
+from src.push_to_qdrant import ensure_collection
+from src.qdrant_utils import get_qdrant_client
+from src.query_cache import bump_collection_version
+from src.splitter import build_splitters
+from src.symbol_index import SymbolIndex
+from src.tracing import metrics, span, start_metrics_server
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # inotify watching is optional; polling is used without it
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class ChangeCollector:
+    """
+    Thread-safe set of changed paths. take() blocks until changes are pending and either no event
+    arrived for debounce seconds or the oldest pending change is max_delay seconds old.
+    """
+
+    def __init__(self, debounce: float, max_delay: float):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.events = 0
+        self._pending = set()
+        self._first_event = None
+        self._last_event = None
+        self._cond = threading.Condition()
+
+    def add(self, path: str, when: float = None):
+        now = time.monotonic()
+        with self._cond:
+            self._pending.add(path)
+            self.events += 1
+            self._last_event = now
+            if self._first_event is None:
+                self._first_event = now if when is None else when
+            self._cond.notify()
+
+    def take(self, stop: threading.Event):
+        """
+        Return (paths, monotonic time of the first event) of the next batch, or (set(), None) once stop is set.
+        """
+        with self._cond:
+            while not stop.is_set():
+                timeout = 1.0
+                if self._pending:
+                    now = time.monotonic()
+                    quiet = now - self._last_event
+                    waited = now - self._first_event
+                    if quiet >= self.debounce or waited >= self.max_delay:
+                        batch, first_event = self._pending, self._first_event
+                        self._pending, self._first_event = set(), None
+                        return batch, first_event
+                    timeout = min(self.debounce - quiet, self.max_delay - waited)
+                self._cond.wait(timeout)
+            return set(), None
+
+
+def snapshot(root: str, extensions=SOURCE_EXTENSIONS) -> dict:
+    """
+    Map every source file under root to its (size, mtime_ns), walking with os.scandir so each file
+    costs a single stat call.
+    """
+    files = {}
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(extensions):
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    # Deleted between listing and stat; the next poll sees it gone.
+                    continue
+    return files
+
+
+class PollingWatcher:
+    """
+    Detect changes by comparing snapshot()s taken every interval seconds.
+    """
+
+    def __init__(self, root: str, collector: ChangeCollector, interval: float):
+        self.root = root
+        self.collector = collector
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._previous = snapshot(self.root)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = snapshot(self.root)
+            for path, stat in current.items():
+                if self._previous.get(path) != stat:
+                    self.collector.add(path)
+            for path in self._previous.keys() - current.keys():
+                self.collector.add(path)
+            self._previous = current
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, collector: ChangeCollector):
+        super().__init__()
+        self.collector = collector
+
+    def on_any_event(self, event):
+        # A directory's own "modified" event only says its listing changed; its files report themselves.
+        if event.is_directory and event.event_type == "modified":
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            path = os.fsdecode(path)
+            if path and (event.is_directory or path.endswith(SOURCE_EXTENSIONS)):
+                self.collector.add(path)
+
+
+class InotifyWatcher:
+    """
+    Receive change events from the kernel (inotify on Linux) through watchdog.
+    """
+
+    def __init__(self, root: str, collector: ChangeCollector):
+        self._observer = Observer()
+        self._observer.schedule(_EventHandler(collector), root, recursive=True)
+
+    def start(self):
+        self._observer.start()
+
+    def stop(self):
+        self._observer.stop()
+        self._observer.join()
+
+
+def make_watcher(root: str, collector: ChangeCollector, backend: str = None, poll_interval: float = None):
+    backend = config.WATCH_BACKEND if backend is None else backend
+    poll_interval = config.WATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+    if backend not in ("auto", "inotify", "poll"):
+        raise ValueError(f"Unknown watch backend '{backend}' (expected auto, inotify or poll).")
+    if backend == "inotify" and Observer is None:
+        raise ImportError("The inotify watch backend requires the 'watchdog' package (pip install watchdog).")
+    if backend == "poll" or Observer is None:
+        return PollingWatcher(root, collector, poll_interval)
+    return InotifyWatcher(root, collector)
+
+
+def resolve_changes(manifest: FileManifest, root: str, paths):
+    """
+    Turn changed paths (files or directories, existing or gone) into (current, changed, removed):
+    the scanned manifest entries of the source files now present, the relative paths whose content
+    hash differs from the manifest, and the relative paths of indexed files that no longer exist.
+    """
+    files = set()
+    removed = set()
+    for path in paths:
+        rel_path = os.path.relpath(path, root)
+        if rel_path == ".." or rel_path.startswith(".." + os.sep):
+            continue
+        if os.path.isdir(path):
+            # A directory created or moved in: everything below it.
+            files.update(iter_source_files(path, SOURCE_EXTENSIONS))
+        elif os.path.isfile(path):
+            if path.endswith(SOURCE_EXTENSIONS):
+                files.add(path)
+        elif rel_path in manifest.entries:
+            removed.add(rel_path)
+        else:
+            # A directory deleted or moved away: every indexed file below it that is gone.
+            prefix = rel_path + os.sep
+            removed.update(entry for entry in manifest.entries
+                           if entry.startswith(prefix) and not os.path.exists(os.path.join(root, entry)))
+    current = manifest.scan(root, sorted(files))
+    changed = sorted(rel_path for rel_path, entry in current.items()
+                     if manifest.entries.get(rel_path, {}).get("sha256") != entry["sha256"])
+    # Touched but unchanged files: remember their new mtime so they are not hashed again.
+    for rel_path, entry in current.items():
+        if rel_path not in changed:
+            manifest.entries[rel_path] = entry
+    return current, changed, sorted(removed)
+
+
+class WatchStats:
+    """
+    Running totals of a watch session plus lag statistics over the most recent batches.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.started = time.monotonic()
+        self.batches = 0
+        self.files_indexed = 0
+        self.files_removed = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+        self.lags = deque(maxlen=window)
+
+    def record_batch(self, lag: float, seconds: float, indexed: int, removed: int, chunks: int):
+        self.batches += 1
+        self.files_indexed += indexed
+        self.files_removed += removed
+        self.chunks += chunks
+        self.busy_seconds += seconds
+        self.lags.append(lag)
+        metrics.observe("watch_lag", lag)
+        metrics.increment("codebaserag_watch_files_total", indexed, kind="indexed")
+        metrics.increment("codebaserag_watch_files_total", removed, kind="removed")
+        metrics.increment("codebaserag_watch_chunks_total", chunks)
+
+    def summary(self) -> dict:
+        lags = sorted(self.lags)
+        busy = max(self.busy_seconds, 1e-9)
+        return {
+            "batches": self.batches,
+            "files_indexed": self.files_indexed,
+            "files_removed": self.files_removed,
+            "chunks": self.chunks,
+            "lag_last_s": self.lags[-1] if self.lags else 0.0,
+            "lag_p50_s": lags[len(lags) // 2] if lags else 0.0,
+            "lag_max_s": lags[-1] if lags else 0.0,
+            "files_per_s": self.files_indexed / busy,
+            "chunks_per_s": self.chunks / busy,
+            "busy_fraction": self.busy_seconds / max(time.monotonic() - self.started, 1e-9),
+        }
+
+    def format(self) -> str:
+        s = self.summary()
+        return (f"{s['batches']} batches, {s['files_indexed']} files indexed, {s['files_removed']} removed, "
+                f"{s['chunks']} chunks; lag last {s['lag_last_s']:.1f}s, median {s['lag_p50_s']:.1f}s, "
+                f"max {s['lag_max_s']:.1f}s; {s['files_per_s']:.1f} files/s, {s['chunks_per_s']:.1f} chunks/s "
+                f"while indexing ({s['busy_fraction']:.0%} busy)")
+
+
+def watch_codebase(
+    codebase_path: str = None,
+    collection_name: str = None,
+    manifest_file: str = None,
+    host: str = None,
+    port: int = None,
+    backend: str = None,
+    debounce: float = None,
+    max_delay: float = None,
+    poll_interval: float = None,
+    files_per_batch: int = 200,
+    stop: threading.Event = None
+) -> WatchStats:
+    """
+    Bring the collection up to date, then re-index changes as they happen until stop is set or
+    the process is interrupted. Returns the session's WatchStats.
+    """
+    codebase_path = os.path.abspath(config.DEFAULT_CODEBASE_PATH if codebase_path is None else codebase_path)
+    collection_name = config.DEFAULT_COLLECTION_NAME if collection_name is None else collection_name
+    manifest_file = config.DEFAULT_MANIFEST_FILE if manifest_file is None else manifest_file
+    host = config.DEFAULT_QDRANT_HOST if host is None else host
+    port = config.DEFAULT_QDRANT_PORT if port is None else port
+    debounce = config.WATCH_DEBOUNCE_SECONDS if debounce is None else debounce
+    max_delay = config.WATCH_MAX_DELAY_SECONDS if max_delay is None else max_delay
+    stop = threading.Event() if stop is None else stop
+
+    embeddings = get_embeddings()
+    client = get_qdrant_client(host, port)
+    ensure_collection(client, collection_name, embeddings)
+    splitters = build_splitters(config.CHUNK_SIZE, config.CHUNK_OVERLAP, config.LANGUAGE_AWARE_SPLITTING)
+    symbol_index = SymbolIndex(config.DEFAULT_SYMBOL_INDEX_FILE) if config.SYMBOL_INDEX_ENABLED else None
+    manifest = FileManifest(manifest_file).load()
+    collector = ChangeCollector(debounce, max_delay)
+    watcher = make_watcher(codebase_path, collector, backend, poll_interval)
+    stats = WatchStats()
+
+    def sync(current, changed, removed) -> int:
+        chunks = apply_changes(client, collection_name, embeddings, splitters, symbol_index, manifest,
+                               codebase_path, current, changed, removed, files_per_batch)
+        if changed or removed:
+            # Invalidate cached query results for this collection.
+            bump_collection_version(collection_name)
+        return chunks
+
+    # Start watching before the catch-up scan so nothing changed during the scan is missed.
+    watcher.start()
+    print(f"Watching {codebase_path} for collection '{collection_name}' "
+          f"({type(watcher).__name__}, debounce {debounce}s). Press Ctrl+C to stop.")
+    try:
+        with span("watch_catch_up", collection=collection_name) as current_span:
+            current = manifest.scan(codebase_path, iter_source_files(codebase_path, SOURCE_EXTENSIONS))
+            changed, removed = manifest.diff(current)
+            current_span.set(changed=len(changed), removed=len(removed))
+            if changed or removed:
+                print(f"Catching up: {len(changed)} new or changed, {len(removed)} removed files.")
+                sync(current, changed, removed)
+
+        while not stop.is_set():
+            paths, first_event = collector.take(stop)
+            if not paths:
+                continue
+            started = time.monotonic()
+            try:
+                with span("watch_batch", collection=collection_name, events=len(paths)) as current_span:
+                    current, changed, removed = resolve_changes(manifest, codebase_path, paths)
+                    current_span.set(changed=len(changed), removed=len(removed))
+                    chunks = sync(current, changed, removed) if changed or removed else 0
+            except Exception as e:
+                # Keep the changes for the next batch (e.g. Qdrant restarting) instead of losing them.
+                print("Error indexing changes, retrying:", e)
+                for path in paths:
+                    collector.add(path, first_event)
+                stop.wait(max(debounce, 1.0))
+                continue
+            if not changed and not removed:
+                # Only touched: keep the refreshed mtimes so these files are not hashed again.
+                manifest.save()
+                continue
+            finished = time.monotonic()
+            stats.record_batch(finished - first_event, finished - started, len(changed), len(removed), chunks)
+            print(f"Indexed {len(changed)} changed and {len(removed)} removed files "
+                  f"in {finished - started:.1f}s ({finished - first_event:.1f}s after the first change).")
+    except KeyboardInterrupt:
+        print("\nStopping watch...")
+    finally:
+        watcher.stop()
+        if symbol_index is not None:
+            symbol_index.close()
+        close_embeddings(embeddings)
+        print(f"Watch summary: {stats.format()}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Watch the codebase and keep its collection in sync, re-indexing only changed files."
+    )
+    parser.add_argument("--src", default=config.DEFAULT_CODEBASE_PATH,
+                        help="Codebase directory (default from config).")
+    parser.add_argument("--collection_name", default=config.DEFAULT_COLLECTION_NAME,
+                        help="Name of the collection (default from config).")
+    parser.add_argument("--manifest", default=config.DEFAULT_MANIFEST_FILE,
+                        help="Path to the file-hash manifest shared with the incremental reindex (default from config).")
+    parser.add_argument("--host", default=None, help="Qdrant server host (default from config).")
+    parser.add_argument("--port", type=int, default=None, help="Qdrant server port (default from config).")
+    parser.add_argument("--backend", choices=["auto", "inotify", "poll"], default=None,
+                        help="Change detection: inotify (needs watchdog), poll, or auto (default from config).")
+    parser.add_argument("--debounce", type=float, default=None,
+                        help="Seconds without events before a batch is indexed (default from config).")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="Seconds between scans of the polling backend (default from config).")
+    parser.add_argument("--metrics-port", type=int, default=config.METRICS_PORT,
+                        help="Serve Prometheus metrics (lag, files, chunks, stage latencies) on this port (0 = off).")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    watch_codebase(args.src, args.collection_name, args.manifest, args.host, args.port,
+                   backend=args.backend, debounce=args.debounce, poll_interval=args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
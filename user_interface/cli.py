@@ -1,45 +1,18 @@
 #!/usr/bin/env python3
 import argparse
 from user_interface.config import config
-from qdrant_client import QdrantClient
-from langchain_qdrant import QdrantVectorStore
-from langchain.chains import RetrievalQA
-from src.embeddings import get_embeddings
-from src.llm import OllamaLLM
 
 
-def query(query: str, host: str, port: int, collection_name: str, model: str, suppress_output = False) -> str:
-    # Instantiate embeddings (with CUDA if available)
-    embeddings = get_embeddings(suppress_output=suppress_output)
-
-    # Create a Qdrant client pointing to your running server
-    client = QdrantClient(host=host, port=port)
-
-    # Create a QdrantVectorStore (no external pickled index)
-    qdrant_store = QdrantVectorStore(
-        client=client,
-        collection_name=collection_name,
-        embedding=embeddings
-    )
-
-    # Create a retriever from the vector store
-    retriever = qdrant_store.as_retriever(search_kwargs={"k": config.RETRIEVER_K})
-
-
-    # Get the custom LLM singleton instance using the model from config or command line.
-    llm = OllamaLLM.get_instance(model, verbose=not suppress_output)
-
-    # Build a RetrievalQA chain using the retriever and LLM.
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        return_source_documents=False
-    )
-
-    # Process the query using the new invoke method
-    qa_response = qa_chain.invoke({"query": query})
-    return qa_response["result"]
+def query(query: str, host: str, port: int, collection_name: str, model: str, suppress_output = False,
+          path=None, language=None, extension=None, symbol=None) -> str:
+    # The engine (embeddings, Qdrant client, retriever, LLM and chain) is built on the first query
+    # for this host/port/collection/model and reused afterwards.
+    # collection_name may also list several collections or globs; they are searched together.
+    from src.federated import get_engine
+    from src.qdrant_utils import build_filter
+    engine = get_engine(host, port, collection_name, model, suppress_output=suppress_output)
+    # Only chunks matching every given filter are searched (see src.qdrant_utils.build_filter).
+    return engine.ask(query, build_filter(path, language, extension, symbol))
 
 
 def main():
@@ -53,13 +26,40 @@ def main():
     parser.add_argument("--port", type=int, default=config.DEFAULT_QDRANT_PORT,
                         help="Qdrant server port (default from config).")
     parser.add_argument("--collection", default=config.DEFAULT_COLLECTION_NAME,
-                        help="Collection name (default from config).")
+                        help="Collection name, or comma-separated names and globs (e.g. 'svc-*') to search "
+                             "several collections at once (default from config).")
     parser.add_argument("--model", default=config.DEFAULT_LLM_MODEL,
                         help="LLM model to use (default from config).")
+    parser.add_argument("--path", default=None,
+                        help="Only search files under these directories or files, relative to the codebase "
+                             "(comma-separated).")
+    parser.add_argument("--language", default=None,
+                        help="Only search files of these languages, e.g. python,cpp (comma-separated).")
+    parser.add_argument("--extension", default=None,
+                        help="Only search files with these extensions, e.g. py,h (comma-separated).")
+    parser.add_argument("--symbol", default=None,
+                        help="Only search chunks defining these symbols (comma-separated).")
+    parser.add_argument("--trace", action="store_true",
+                        help="Print the time spent in each stage of the query.")
     args = parser.parse_args()
 
-    answer = query(args.query, args.host, args.port, args.collection, args.model)
-    print("Answer:", answer)
+    # Imported after argument parsing so --help and usage errors return immediately.
+    from src.federated import FederatedQueryEngine, get_engine
+    from src.qdrant_utils import build_filter
+    query_filter = build_filter(args.path, args.language, args.extension, args.symbol)
+    engine = get_engine(args.host, args.port, args.collection, args.model)
+    print("Answer: ", end="", flush=True)
+    for token in engine.stream(args.query, query_filter):
+        print(token, end="", flush=True)
+    print()
+    if engine.packer is not None:
+        print(engine.packer.format_last_report())
+    if isinstance(engine, FederatedQueryEngine):
+        print(engine.format_last_search())
+    if args.trace:
+        from src.tracing import format_trace, last_trace
+        if last_trace() is not None:
+            print(format_trace(last_trace()))
 
 
 if __name__ == "__main__":
@@ -1,38 +1,111 @@
 import configparser
 import logging
 import os
-import torch
 import ast
 from pydantic import BaseModel, Field, ValidationError
 
 
 class AppConfig(BaseModel):
-    DEFAULT_DEVICE: str = Field("cuda" if torch.cuda.is_available() else "cpu")
+    # "auto" picks cuda when available; torch is only imported once the device is actually needed.
+    DEFAULT_DEVICE: str = Field("auto")
     # Required fields
     DEFAULT_CODEBASE_PATH: str = Field(..., min_length=1)
     DEFAULT_QDRANT_HOST: str = Field("localhost")
     DEFAULT_QDRANT_PORT: int = Field(6333)
+    DEFAULT_QDRANT_GRPC_PORT: int = Field(6334)
     DEFAULT_COLLECTION_NAME: str = Field(..., min_length=1)
     DEFAULT_LLM_MODEL: str = Field(..., min_length=1)
     DEFAULT_QDRANT_STORAGE_FOLDER: str = Field(..., min_length=1)
+    # "server" talks to the Qdrant container; "local" embeds Qdrant on disk and "memory" in RAM (no Docker).
+    QDRANT_MODE: str = Field("server", description="Qdrant backend: 'server', 'local' or 'memory'")
+    DEFAULT_QDRANT_LOCAL_PATH: str = None
+    QDRANT_LOCAL_LOCK_TIMEOUT: float = Field(60.0, description="Seconds to wait for another process to release the local store")
 
     # Optional fields – will be computed if not provided.
     DEFAULT_CONVERTED_PATH: str = None
     DEFAULT_DOCS_PICKLE: str = None
     DEFAULT_CHUNKS_PICKLE: str = None
+    DEFAULT_DOCS_STORE: str = None
+    DEFAULT_CHUNKS_STORE: str = None
+    DEFAULT_MANIFEST_FILE: str = None
     DEFAULT_CONTAINER_ID_FILE: str = None
+    DEFAULT_EMBEDDING_CACHE_FILE: str = None
+    DEFAULT_QUERY_CACHE_FILE: str = None
+    DEFAULT_COLLECTION_VERSION_FOLDER: str = None
+    DEFAULT_SYMBOL_INDEX_FILE: str = None
+    DEFAULT_TRACE_LOG_FILE: str = None
     DEFAULT_GRADIO_SHARE: bool = Field(False)
     DEFAULT_GRADIO_SERVER_NAME: str = Field("0.0.0.0")
     DEFAULT_GRADIO_SERVER_PORT: int = Field(7860)
+    GRADIO_CONCURRENCY_LIMIT: int = Field(4, description="Maximum queries the Gradio app answers concurrently")
     DEFAULT_OLLAMA_HOST: str = Field("http://localhost:11434")
+    OLLAMA_KEEP_ALIVE: str = Field("30m", description="How long Ollama keeps the model loaded after a request")
+    OLLAMA_STARTUP_TIMEOUT: float = Field(30.0, description="Seconds to wait for a newly started Ollama server")
 
     # New fields for retrieval and splitting tuning:
     LANGUAGE_AWARE_SPLITTING: bool = Field(True, description="Enable language-aware splitting")
+    SPLIT_WORKERS: int = Field(0, description="Processes used by the split step (0 = one per CPU core, 1 = in-process)")
     CODEBASE_LANGUAGES: list[str] = Field(["cpp", "java", "python", "matlab", "csharp", "julia", "markdown"],
                                       description="List of languages in the codebase")
     CHUNK_SIZE: int = Field(1500, description="Chunk size (in characters) for splitting documents")
     CHUNK_OVERLAP: int = Field(150, description="Overlap (in characters) between chunks")
     RETRIEVER_K: int = Field(3, description="Number of chunks to retrieve during query")
+    QUERY_CACHE_SIZE: int = Field(256, description="Entries kept in the in-memory query embedding and result caches")
+    QUERY_CACHE_DISK: bool = Field(False, description="Also persist retrieval results to disk across restarts")
+    SYMBOL_INDEX_ENABLED: bool = Field(True, description="Index defined identifiers at split time and answer identifier queries from it")
+    CONTEXT_PACKING_ENABLED: bool = Field(True, description="Merge, dedup and trim retrieved chunks before the LLM call")
+    CONTEXT_TOKEN_BUDGET: int = Field(3000, description="Maximum estimated prompt tokens of retrieved context (0 = no limit)")
+    CONTEXT_SCORE_THRESHOLD: float = Field(0.0, description="Drop retrieved chunks scoring below this similarity (0 = keep all)")
+    CONTEXT_STRIP_COMMENTS: bool = Field(False, description="Remove full-line and block comments from the packed context")
+    CONTEXT_DEDUP_THRESHOLD: float = Field(0.9, description="Line-set similarity above which a chunk counts as a duplicate")
+    CONTEXT_CHARS_PER_TOKEN: float = Field(4.0, description="Characters per token used to estimate prompt size")
+    SYMBOL_INDEX_FUSION: bool = Field(False, description="Also fill remaining slots of identifier queries from vector search")
+    FEDERATED_SEARCH_TIMEOUT: float = Field(10.0, description="Seconds a collection may take in a multi-collection search (0 = no limit)")
+
+    # Ingest tuning:
+    INGEST_BATCH_SIZE: int = Field(1024, description="Number of chunks embedded and upserted per batch during ingest")
+    EMBED_BATCH_SIZE: int = Field(64, description="Number of length-sorted chunks sent to the embedding model at once")
+    UPSERT_BATCH_SIZE: int = Field(256, description="Number of points per Qdrant upsert request")
+    UPLOAD_WORKERS: int = Field(4, description="Number of concurrent Qdrant upload threads during ingest")
+    UPLOAD_QUEUE_SIZE: int = Field(8, description="Maximum upsert batches waiting for an upload thread")
+    WATCH_BACKEND: str = Field("auto", description="Watch mode change detection: 'auto', 'inotify' (needs watchdog) or 'poll'")
+    WATCH_DEBOUNCE_SECONDS: float = Field(2.0, description="Quiet time after the last file event before watch mode indexes a batch")
+    WATCH_MAX_DELAY_SECONDS: float = Field(30.0, description="Longest a change waits for the tree to go quiet in watch mode")
+    WATCH_POLL_INTERVAL: float = Field(5.0, description="Seconds between scans of the polling watch backend")
+    QDRANT_PREFER_GRPC: bool = Field(True, description="Talk to Qdrant over gRPC when its gRPC port is reachable")
+
+    # Collection storage and search tuning (applied when a collection is created):
+    QDRANT_QUANTIZATION: str = Field("none", description="Vector quantization: 'none', 'scalar' (int8) or 'binary'")
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = Field(True, description="Keep quantized vectors in RAM even if originals are on disk")
+    QDRANT_SEARCH_RESCORE: bool = Field(True, description="Rescore quantized search candidates with the original vectors")
+    QDRANT_SEARCH_OVERSAMPLING: float = Field(2.0, description="Candidates fetched per result before rescoring")
+    QDRANT_VECTORS_ON_DISK: bool = Field(False, description="Store original vectors on disk (memmap) instead of RAM")
+    QDRANT_PAYLOAD_ON_DISK: bool = Field(False, description="Store payloads (chunk text and metadata) on disk")
+    QDRANT_HNSW_M: int = Field(16, description="HNSW graph degree; lower uses less memory, higher improves recall")
+    QDRANT_HNSW_EF_CONSTRUCT: int = Field(100, description="HNSW build-time candidate list size")
+    QDRANT_HNSW_EF: int = Field(0, description="HNSW search-time candidate list size (0 = server default)")
+    CHUNK_STORE_COMPRESSION: str = Field("none", description="Text compression for chunk stores: 'none' or 'zstd'")
+    EMBEDDING_CACHE_ENABLED: bool = Field(True, description="Cache embedding vectors on disk, keyed by model and text hash")
+    EMBEDDING_CACHE_MAX_MB: int = Field(2048, description="Size cap of the embedding cache before LRU eviction")
+    EMBEDDING_BACKEND: str = Field("torch", description="Embedding backend: 'torch', 'torch-int8', 'onnx' or 'onnx-int8'")
+    EMBEDDING_MODEL_PATH: str = Field("", description="Local sentence-transformers model directory (empty = download all-mpnet-base-v2)")
+    EMBEDDING_ONNX_PATH: str = Field("", description="Directory of the ONNX export used by the onnx backends")
+    EMBEDDING_THREADS: int = Field(0, description="Intra-op threads of the embedding model (0 = library default)")
+    EMBEDDING_WORKERS: int = Field(1, description="Processes that embed documents (1 = in-process, 0 = one per CPU core)")
+
+    # Tracing and metrics:
+    TRACING_ENABLED: bool = Field(True, description="Time each query and ingest stage and collect Ollama token counts")
+    TRACE_LOG_ENABLED: bool = Field(True, description="Append one JSON line per query or ingest trace to the trace log")
+    METRICS_PORT: int = Field(0, description="Serve Prometheus metrics on this port from the Gradio app (0 = off)")
+
+    def resolve_device(self) -> str:
+        """
+        Return DEFAULT_DEVICE, probing torch for CUDA only when it is left on "auto".
+        """
+        if self.DEFAULT_DEVICE == "auto":
+            import torch
+            self.DEFAULT_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+        return self.DEFAULT_DEVICE
 
     def compute_optional(self):
             if self.DEFAULT_CODEBASE_PATH:
@@ -47,6 +120,12 @@ class AppConfig(BaseModel):
                     self.DEFAULT_DOCS_PICKLE = os.path.join(self.DEFAULT_CONVERTED_PATH, "docs.pkl")
                 if not self.DEFAULT_CHUNKS_PICKLE or not self.DEFAULT_CHUNKS_PICKLE.strip():
                     self.DEFAULT_CHUNKS_PICKLE = os.path.join(self.DEFAULT_CONVERTED_PATH, "chunks.pkl")
+                if not self.DEFAULT_DOCS_STORE or not self.DEFAULT_DOCS_STORE.strip():
+                    self.DEFAULT_DOCS_STORE = os.path.join(self.DEFAULT_CONVERTED_PATH, "docs.store")
+                if not self.DEFAULT_CHUNKS_STORE or not self.DEFAULT_CHUNKS_STORE.strip():
+                    self.DEFAULT_CHUNKS_STORE = os.path.join(self.DEFAULT_CONVERTED_PATH, "chunks.store")
+                if not self.DEFAULT_MANIFEST_FILE or not self.DEFAULT_MANIFEST_FILE.strip():
+                    self.DEFAULT_MANIFEST_FILE = os.path.join(self.DEFAULT_CONVERTED_PATH, "manifest.json")
             else:
                 raise ValueError("Invalid codebase path!")
 
@@ -56,6 +135,40 @@ class AppConfig(BaseModel):
                         os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
                         "qdrant_container_id.txt"
                     )
+                if not self.DEFAULT_EMBEDDING_CACHE_FILE or not self.DEFAULT_EMBEDDING_CACHE_FILE.strip():
+                    # Shared by every codebase and collection, so it lives next to the Qdrant storage.
+                    self.DEFAULT_EMBEDDING_CACHE_FILE = os.path.join(
+                        os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
+                        "embedding_cache.sqlite"
+                    )
+                if not self.DEFAULT_QUERY_CACHE_FILE or not self.DEFAULT_QUERY_CACHE_FILE.strip():
+                    self.DEFAULT_QUERY_CACHE_FILE = os.path.join(
+                        os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
+                        "query_cache.sqlite"
+                    )
+                if not self.DEFAULT_COLLECTION_VERSION_FOLDER or not self.DEFAULT_COLLECTION_VERSION_FOLDER.strip():
+                    # Push writes a new marker here for each collection; cached query results key on it.
+                    self.DEFAULT_COLLECTION_VERSION_FOLDER = os.path.join(
+                        os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
+                        "collection_versions"
+                    )
+                if not self.DEFAULT_QDRANT_LOCAL_PATH or not self.DEFAULT_QDRANT_LOCAL_PATH.strip():
+                    # Embedded storage uses a different on-disk format than the server, so it gets its own folder.
+                    self.DEFAULT_QDRANT_LOCAL_PATH = os.path.join(
+                        os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
+                        "qdrant_local"
+                    )
+                if not self.DEFAULT_SYMBOL_INDEX_FILE or not self.DEFAULT_SYMBOL_INDEX_FILE.strip():
+                    # Keyed by point ID, which does not depend on the collection, so one index serves all of them.
+                    self.DEFAULT_SYMBOL_INDEX_FILE = os.path.join(
+                        os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
+                        "symbol_index.sqlite"
+                    )
+                if not self.DEFAULT_TRACE_LOG_FILE or not self.DEFAULT_TRACE_LOG_FILE.strip():
+                    self.DEFAULT_TRACE_LOG_FILE = os.path.join(
+                        os.path.dirname(self.DEFAULT_QDRANT_STORAGE_FOLDER),
+                        "traces.jsonl"
+                    )
             else:
                 raise ValueError("Invalid Qdrant storage folder!")
 
@@ -93,16 +206,47 @@ def load_config_from_ini(ini_file: str = "config.ini") -> AppConfig:
         print(e)
         raise e
 
-# Load the configuration at import time from the default file.
-config = load_config_from_ini()
+class LazyConfig:
+    """
+    Stand-in for the AppConfig loaded from config.ini. The file is read on first attribute access,
+    so importing a module (or running --help) does not pay for it, and every module that imported
+    `config` sees a reload done by overwrite_config_ini().
+    """
+
+    def __init__(self, ini_file: str = "config.ini"):
+        object.__setattr__(self, "_ini_file", ini_file)
+        object.__setattr__(self, "_instance", None)
+
+    def _get(self) -> AppConfig:
+        if self._instance is None:
+            object.__setattr__(self, "_instance", load_config_from_ini(self._ini_file))
+        return self._instance
+
+    def _set(self, instance: AppConfig):
+        object.__setattr__(self, "_instance", instance)
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+
+# The configuration is loaded from the default file the first time it is used.
+config = LazyConfig()
+
+def available_cpus() -> int:
+    """
+    Number of CPU cores this process may run on; worker counts of 0 resolve to it.
+    """
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
 
 def overwrite_config_ini(ini_file: str):
     """
     Reload the configuration from a specified INI file and update the global `config`.
     Also, overwrite the default config.ini file with the new settings.
     """
-    global config
-    config = load_config_from_ini(ini_file)
+    config._set(load_config_from_ini(ini_file))
     # Write out the current configuration back to the default config.ini.
     parser = configparser.ConfigParser()
     parser.optionxform = str
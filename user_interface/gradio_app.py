@@ -1,12 +1,9 @@
 #!/usr/bin/env python3
+import asyncio
 import gradio as gr
 import subprocess
-from qdrant_client import QdrantClient
-from langchain_qdrant import QdrantVectorStore
-from langchain.chains import RetrievalQA
-from src.embeddings import get_embeddings
-from src.llm import OllamaLLM
 from user_interface.config import config
+from src.qdrant_utils import build_filter, get_qdrant_client
 
 def list_installed_models() -> list:
     """
@@ -24,7 +21,7 @@ def list_installed_models() -> list:
 
 def list_qdrant_collections(host: str = config.DEFAULT_QDRANT_HOST, port: int = config.DEFAULT_QDRANT_PORT) -> list:
     try:
-        client = QdrantClient(host=host, port=port)
+        client = get_qdrant_client(host, int(port))
         response = client.get_collections()
         # Try accessing the collections directly
         if hasattr(response, "result"):
@@ -51,34 +48,49 @@ def load_documents(folder_path: str,
     # For demonstration, we just return a confirmation message.
     return f"Documents from '{folder_path}' have been loaded and pushed to collection '{collection}' at {host}:{port}."
 
-def answer_query(query: str,
+async def answer_query(query: str,
                  host: str = config.DEFAULT_QDRANT_HOST,
                  port: int = config.DEFAULT_QDRANT_PORT,
-                 collection: str = config.DEFAULT_COLLECTION_NAME,
-                 model: str = config.DEFAULT_LLM_MODEL) -> str:
+                 collection = config.DEFAULT_COLLECTION_NAME,
+                 model: str = config.DEFAULT_LLM_MODEL,
+                 path: str = "",
+                 language: list = None):
     """
     Process a query using the RAG system:
-      - Connect to Qdrant using the given host, port, and collection.
-      - Build a retriever.
-      - Use the singleton LLM instance (with the provided model) to answer the query.
+      - Reuse (or build on first use) the QueryEngine for this host, port, collection and model.
+        Several collections (or glob patterns) are searched together and their results merged.
+      - Search only the given paths (comma-separated, relative to the codebase) and languages, if any.
+      - Stream the answer: each yield is the text generated so far, so Gradio updates as tokens arrive.
+    The handler is async, so concurrent users overlap retrieval and generation instead of queueing.
     """
-    embeddings = get_embeddings()
-    client = QdrantClient(host=host, port=port)
-    qdrant_store = QdrantVectorStore(
-        client=client,
-        collection_name=collection,
-        embedding=embeddings
-    )
-    retriever = qdrant_store.as_retriever(search_kwargs={"k": config.RETRIEVER_K})
-    llm = OllamaLLM.get_instance(model)
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        return_source_documents=False
-    )
-    qa_response = qa_chain.invoke({"query": query})
-    return qa_response["result"]
+    # Imported on first query so the UI comes up without loading torch and langchain.
+    from src.federated import get_engine
+    # Building an engine loads models; keep that off the event loop.
+    engine = await asyncio.to_thread(get_engine, host, int(port), collection_spec(collection), model)
+    answer = ""
+    async for token in engine.astream(query, build_filter(path=path, language=language)):
+        answer += token
+        yield answer
+
+def collection_spec(collection) -> str:
+    """
+    The dropdown's selection (one name or a list of names and glob patterns) as a comma-separated spec.
+    """
+    if isinstance(collection, (list, tuple)):
+        return ",".join(collection) or config.DEFAULT_COLLECTION_NAME
+    return collection or config.DEFAULT_COLLECTION_NAME
+
+def cache_stats(host: str = config.DEFAULT_QDRANT_HOST,
+                port: int = config.DEFAULT_QDRANT_PORT,
+                collection = config.DEFAULT_COLLECTION_NAME,
+                model: str = config.DEFAULT_LLM_MODEL) -> str:
+    """
+    Report the query cache hit rates of the engine serving the current selection and, for several
+    collections, the latency of each in the last query.
+    """
+    from src.federated import get_engine
+    engine = get_engine(host, int(port), collection_spec(collection), model)
+    return engine.format_cache_stats()
 
 def build_app():
     with gr.Blocks() as demo:
@@ -92,21 +104,38 @@ def build_app():
                     print("\n----\n")
                     print(list_qdrant_collections())
                     print("\n----\n")
-                    collection_dropdown = gr.Dropdown(label="Collection",
+                    # Select several collections, or type a glob such as "svc-*", to search them together.
+                    collection_dropdown = gr.Dropdown(label="Collections",
                                                       choices=list_qdrant_collections(),
-                                                      value=config.DEFAULT_COLLECTION_NAME)
+                                                      value=[config.DEFAULT_COLLECTION_NAME],
+                                                      multiselect=True,
+                                                      allow_custom_value=True)
                     model_dropdown = gr.Dropdown(label="LLM Model",
                                                  choices=list_installed_models(),
                                                  value=config.DEFAULT_LLM_MODEL)
+                    path_input = gr.Textbox(label="Path Filter",
+                                            placeholder="Directories or files to search, e.g. src/,docs/api.md")
+                    language_dropdown = gr.Dropdown(label="Language Filter", choices=config.CODEBASE_LANGUAGES,
+                                                    multiselect=True, value=[])
                     query_button = gr.Button("Ask Query")
                     # query_output = gr.Textbox(label="Answer")
                     query_output = gr.Code(label="Answer", language="markdown")
+                    stats_button = gr.Button("Show Cache Stats")
+                    stats_output = gr.Textbox(label="Cache Stats", lines=3)
                 query_button.click(fn=answer_query,
-                                   inputs=[query_input, host_input_q, port_input_q, collection_dropdown, model_dropdown],
-                                   outputs=query_output)
+                                   inputs=[query_input, host_input_q, port_input_q, collection_dropdown, model_dropdown,
+                                           path_input, language_dropdown],
+                                   outputs=query_output,
+                                   concurrency_limit=config.GRADIO_CONCURRENCY_LIMIT)
+                stats_button.click(fn=cache_stats,
+                                   inputs=[host_input_q, port_input_q, collection_dropdown, model_dropdown],
+                                   outputs=stats_output)
     return demo
 
 def launch_app():
+    if config.METRICS_PORT:
+        from src.tracing import start_metrics_server
+        start_metrics_server(config.METRICS_PORT)
     app = build_app()
     app.launch(
         share=config.DEFAULT_GRADIO_SHARE,